@@ -0,0 +1,185 @@
+"""
+Benchmark delle query critiche sul database reale.
+Mostra il piano di esecuzione (EXPLAIN) e il tempo medio di ogni query,
+e termina con codice 1 se una query non usa l'indice atteso o se un
+endpoint esegue più query del previsto.
+
+Utilizzo:
+    python -m backend.benchmark_query [--ripetizioni 200]
+"""
+
+import argparse
+import sys
+import time as orologio
+from types import SimpleNamespace
+
+from sqlalchemy import event, func, select, tuple_
+from sqlalchemy.orm import Session
+from backend.database import engine
+from backend.models import ConflittoPrenotazione, SlotOrario, Prenotazione, Utente
+from backend.models.enums import RuoloUtente, StatoPrenotazione
+from backend.services.conflitti_service import ConflittoService
+
+
+def spiega(conn, stmt) -> list[dict]:
+    """Esegue EXPLAIN sulla query compilata per il dialetto del motore."""
+    compilata = stmt.compile(dialect=engine.dialect,
+                             compile_kwargs={"render_postcompile": True})
+    righe = conn.exec_driver_sql(f"EXPLAIN {compilata}", compilata.params)
+    return [dict(r._mapping) for r in righe]
+
+
+def cronometra(conn, stmt, ripetizioni: int) -> float:
+    """Tempo medio di esecuzione in millisecondi."""
+    inizio = orologio.perf_counter()
+    for _ in range(ripetizioni):
+        conn.execute(stmt).all()
+    return (orologio.perf_counter() - inizio) * 1000 / ripetizioni
+
+
+def conta_query(conn, stmt) -> int:
+    """Numero di statement inviati al database per eseguire `stmt`."""
+    eseguite = []
+    ascolta = lambda *args, **kwargs: eseguite.append(1)
+    event.listen(conn, "before_cursor_execute", ascolta)
+    try:
+        conn.execute(stmt).all()
+    finally:
+        event.remove(conn, "before_cursor_execute", ascolta)
+    return len(eseguite)
+
+
+def verifica(conn, nome: str, stmt, tabella: str, indice: str, ripetizioni: int) -> bool:
+    """Stampa piano e tempi; True se `tabella` viene letta tramite `indice`."""
+    piano = spiega(conn, stmt)
+    print(f"\n── {nome} ──")
+    for riga in piano:
+        print(f"   {riga.get('table')}: type={riga.get('type')} key={riga.get('key')} "
+              f"rows={riga.get('rows')} extra={riga.get('Extra')}")
+    print(f"   Tempo medio: {cronometra(conn, stmt, ripetizioni):.2f} ms")
+
+    ok = any(
+        r.get("table") == tabella and r.get("key") == indice
+        and r.get("type") in ("range", "ref", "eq_ref")
+        for r in piano
+    )
+    print(f"   {'✓' if ok else '✗'} {tabella} via {indice}")
+    return ok
+
+
+def sonda_conflitti(conn, ripetizioni: int) -> bool:
+    """Ricerca slot candidati (ConflittoService) sull'indice coprente di slot_orari."""
+    campione = conn.execute(
+        select(SlotOrario.aula_id, SlotOrario.data)
+        .where(SlotOrario.annullato == False)
+        .limit(5)
+    ).all()
+    if not campione:
+        print("⚠️  Nessuno slot attivo: benchmark sonda conflitti saltato")
+        return True
+
+    stmt = (
+        select(
+            SlotOrario.id, SlotOrario.prenotazione_id, SlotOrario.aula_id,
+            SlotOrario.data, SlotOrario.ora_inizio, SlotOrario.ora_fine,
+        )
+        .join(Prenotazione, SlotOrario.prenotazione_id == Prenotazione.id)
+        .where(
+            tuple_(SlotOrario.aula_id, SlotOrario.data).in_([tuple(c) for c in campione]),
+            SlotOrario.annullato == False,
+            Prenotazione.stato.in_([
+                StatoPrenotazione.CONFERMATA,
+                StatoPrenotazione.IN_ATTESA,
+            ]),
+        )
+    )
+    return verifica(conn, "Sonda conflitti (aula_id, data, annullato)", stmt,
+                    "slot_orari", "ix_slot_orari_aula_data_annullato", ripetizioni)
+
+
+def lista_conflitti_operativo(conn, ripetizioni: int) -> bool:
+    """
+    GET /conflitti per l'OPERATIVO con più prenotazioni: una sola query
+    (EXISTS su richiedente_id, niente IN con gli ID) e prenotazioni lette
+    per chiave primaria.
+    """
+    operativo = conn.execute(
+        select(Prenotazione.richiedente_id)
+        .join(Utente, Prenotazione.richiedente_id == Utente.id)
+        .where(Utente.ruolo == RuoloUtente.OPERATIVO)
+        .group_by(Prenotazione.richiedente_id)
+        .order_by(func.count().desc())
+        .limit(1)
+    ).scalar()
+    if operativo is None:
+        print("⚠️  Nessun OPERATIVO con prenotazioni: benchmark lista conflitti saltato")
+        return True
+
+    utente = SimpleNamespace(id=operativo, ruolo=RuoloUtente.OPERATIVO)
+    stmt = ConflittoService.query_lista(utente).order_by(ConflittoPrenotazione.id).limit(100)
+    ok = verifica(conn, f"Lista conflitti OPERATIVO (utente {operativo})", stmt,
+                  "prenotazioni", "PRIMARY", ripetizioni)
+    query = conta_query(conn, stmt)
+    print(f"   {'✓' if query == 1 else '✗'} query eseguite: {query} (attese 1)")
+    return ok and query == 1
+
+
+# Letture del rilevamento batch, indipendenti dal numero di slot
+LETTURE_RILEVAMENTO = 4
+
+
+def rilevamento_conflitti(conn, ripetizioni: int) -> bool:
+    """
+    Rilevamento batch (ConflittoService.detect_and_record_conflicts) sulla
+    prenotazione con più slot attivi: le letture sono in numero costante
+    (candidati, coppie esistenti, conflitti creati, richiesta) qualunque sia
+    il numero di slot. La transazione viene annullata al termine.
+    """
+    pren_id, numero_slot = conn.execute(
+        select(SlotOrario.prenotazione_id, func.count())
+        .where(SlotOrario.annullato == False)
+        .group_by(SlotOrario.prenotazione_id)
+        .order_by(func.count().desc())
+        .limit(1)
+    ).first() or (None, 0)
+    if numero_slot < 2:
+        print("⚠️  Nessuna prenotazione con più slot: benchmark rilevamento saltato")
+        return True
+
+    letture = []
+
+    def ascolta(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("SELECT"):
+            letture.append(statement)
+
+    with Session(engine) as db:
+        prenotazione = db.get(Prenotazione, pren_id)
+        slots = [s for s in prenotazione.slots if not s.annullato]
+        event.listen(db.connection(), "before_cursor_execute", ascolta)
+        try:
+            ConflittoService.detect_and_record_conflicts(db, prenotazione, slots)
+        finally:
+            event.remove(db.connection(), "before_cursor_execute", ascolta)
+            db.rollback()
+
+    print(f"\n── Rilevamento conflitti (prenotazione {pren_id}, {numero_slot} slot) ──")
+    ok = len(letture) <= LETTURE_RILEVAMENTO
+    print(f"   {'✓' if ok else '✗'} letture eseguite: {len(letture)} "
+          f"(attese al massimo {LETTURE_RILEVAMENTO})")
+    return ok
+
+
+BENCHMARK = [sonda_conflitti, lista_conflitti_operativo, rilevamento_conflitti]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark query critiche")
+    parser.add_argument("--ripetizioni", type=int, default=200)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("BENCHMARK QUERY - ICE Planning Aule")
+    print("=" * 60)
+    with engine.connect() as conn:
+        esiti = [b(conn, args.ripetizioni) for b in BENCHMARK]
+    sys.exit(0 if all(esiti) else 1)
@@ -2,6 +2,7 @@
 Configurazione centralizzata dell'applicazione.
 Legge le variabili d'ambiente dal file .env
 """
+from datetime import date, time
 from pydantic_settings import BaseSettings
 from functools import lru_cache
 
@@ -13,6 +14,15 @@ class Settings(BaseSettings):
     secret_key: str = "chiave_di_fallback_solo_per_sviluppo"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 480
+    # Cache in memoria degli utenti autenticati (0 = disattivata)
+    cache_utenti_ttl_secondi: int = 60
+    cache_utenti_dimensione: int = 1024
+    # Costo bcrypt degli hash nuovi (gli hash con costo diverso vengono
+    # rigenerati al login), thread dedicati al calcolo degli hash e massimo
+    # di hash in attesa oltre il quale le richieste vengono respinte (0 = nessuno)
+    bcrypt_rounds: int = 12
+    bcrypt_workers: int = 2
+    bcrypt_limite_coda: int = 32
 
     # Configurazione Database (campi individuali da .env)
     db_host: str = "localhost"
@@ -20,24 +30,80 @@ class Settings(BaseSettings):
     db_name: str = "prenotazione_aule"
     db_user: str = "root"
     db_password: str = ""
+    # Pool connessioni, per ciascun motore (sincrono e asincrono, sul primario
+    # e su ogni replica): con un processo il massimo per server è
+    # 2 × (pool_size + max_overflow), da tenere sotto il max-connections di
+    # MySQL (50 in docker-compose) insieme agli script; in totale il processo
+    # apre fino a 2 × (1 + repliche) × (pool_size + max_overflow) connessioni
+    db_pool_size: int = 5
+    db_max_overflow: int = 5
+    db_pool_timeout: int = 30        # secondi di attesa di una connessione libera
+    db_pool_recycle: int = 1800      # secondi; sotto wait_timeout di MySQL
+    # True: ping a ogni checkout (connessioni cadute scartate subito);
+    # False: solo pool_recycle, un round-trip in meno per richiesta
+    db_pool_pre_ping: bool = True
+    # Repliche di sola lettura ('host' o 'host:porta', stesse credenziali):
+    # liste, calendario, statistiche e dettagli leggono da qui; dopo una
+    # scrittura l'utente legge dal primario per lettura_dopo_scrittura_secondi
+    db_repliche: list[str] = []
+    lettura_dopo_scrittura_secondi: int = 5
 
     # Informazioni applicazione
     app_name: str = "Sistema Prenotazione Aule"
     app_version: str = "1.0.0"
     debug: bool = True
 
+    # Orario di apertura delle aule (base per disponibilità e saturazione)
+    orario_apertura: time = time(8, 0)
+    orario_chiusura: time = time(20, 0)
+    # Giorni di apertura, isoweekday(): 1=lunedì … 7=domenica
+    giorni_apertura: list[int] = [1, 2, 3, 4, 5, 6]
+    # Calendario chiusure per le prenotazioni ricorrenti (salta_chiusure=true)
+    giorni_chiusura: list[date] = []
+    festivita_ricorrenti: list[str] = [  # 'MM-DD', festività nazionali a data fissa
+        "01-01", "01-06", "04-25", "05-01", "06-02",
+        "08-15", "11-01", "12-08", "12-25", "12-26",
+    ]
+    # Prenotazioni massive: giorni da oggi per cui creare subito gli slot.
+    # 0 = tutte le occorrenze materializzate alla creazione; con un valore
+    # positivo oltre l'orizzonte resta solo la regola (espansa su richiesta)
+    orizzonte_ricorrenze_giorni: int = 0
+
     # CORS — IP LAN del frontend (es. http://10.0.0.178:5173)
     # Lasciare vuoto in produzione e gestire tramite reverse proxy
     frontend_origin: str = ""
     cors_origins: str = ""
 
-    @property
-    def database_url(self) -> str:
+    def url_database(self, driver: str, host: str, porta: int) -> str:
         return (
-            f"mysql+pymysql://{self.db_user}:{self.db_password}"
-            f"@{self.db_host}:{self.db_port}/{self.db_name}"
+            f"mysql+{driver}://{self.db_user}:{self.db_password}"
+            f"@{host}:{porta}/{self.db_name}"
         )
 
+    @property
+    def database_url(self) -> str:
+        return self.url_database("pymysql", self.db_host, self.db_port)
+
+    @property
+    def database_url_async(self) -> str:
+        """Stesso database tramite driver asincrono (endpoint di lettura async)."""
+        return self.url_database("aiomysql", self.db_host, self.db_port)
+
+    def _host_repliche(self) -> list[tuple[str, int]]:
+        host = []
+        for voce in self.db_repliche:
+            nome, _, porta = voce.strip().partition(":")
+            host.append((nome, int(porta) if porta else self.db_port))
+        return host
+
+    @property
+    def database_url_repliche(self) -> list[str]:
+        return [self.url_database("pymysql", h, p) for h, p in self._host_repliche()]
+
+    @property
+    def database_url_repliche_async(self) -> list[str]:
+        return [self.url_database("aiomysql", h, p) for h, p in self._host_repliche()]
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
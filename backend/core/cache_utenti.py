@@ -0,0 +1,95 @@
+"""
+Cache in memoria degli utenti autenticati.
+get_utente_corrente verrebbe altrimenti eseguito con una query per ogni
+richiesta protetta: qui si conserva, per `sub` del token (email), una copia
+delle colonne dell'utente con scadenza (TTL) e limite di dimensione (LRU).
+password_hash non viene mai copiato in memoria: sull'istanza restituita resta
+non caricato e chi ne ha bisogno (login, cambio password) lo legge dal database.
+
+Le modifiche a un utente (dati, password, attivazione) invalidano la voce.
+La cache è per processo: con più worker le altre copie si allineano al più
+tardi alla scadenza del TTL.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from backend.config import settings
+from backend.models.utente import Utente
+
+COLONNE = [c.key for c in Utente.__table__.columns if c.key != "password_hash"]
+
+
+class CacheUtenti:
+    """Cache TTL/LRU thread-safe con contatori di hit, miss e invalidazioni."""
+
+    def __init__(self, ttl_secondi: float, dimensione_massima: int):
+        self.ttl_secondi = ttl_secondi
+        self.dimensione_massima = dimensione_massima
+        self._voci: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hit = 0
+        self.miss = 0
+        self.invalidazioni = 0
+
+    def leggi(self, db: Session, email: str) -> Optional[Utente]:
+        """
+        Utente associato alla sessione `db` senza query, se presente e non
+        scaduto; None altrimenti (il chiamante carica dal database e salva).
+        """
+        with self._lock:
+            voce = self._voci.get(email)
+            if voce is None or voce[0] < time.monotonic():
+                if voce is not None:
+                    del self._voci[email]
+                self.miss += 1
+                return None
+            self._voci.move_to_end(email)
+            self.hit += 1
+            valori = voce[1]
+
+        # Istanza detached ricostruita dalle colonne e agganciata alla
+        # sessione senza SELECT: modifiche e relazioni funzionano come sempre
+        utente = Utente(**valori)
+        make_transient_to_detached(utente)
+        return db.merge(utente, load=False)
+
+    def salva(self, utente: Utente) -> None:
+        if self.ttl_secondi <= 0:
+            return
+        valori = {k: getattr(utente, k) for k in COLONNE}
+        with self._lock:
+            self._voci[utente.email] = (time.monotonic() + self.ttl_secondi, valori)
+            self._voci.move_to_end(utente.email)
+            while len(self._voci) > self.dimensione_massima:
+                self._voci.popitem(last=False)
+
+    def invalida(self, *email: str) -> None:
+        """Rimuove le voci indicate (es. email vecchia e nuova dopo una modifica)."""
+        with self._lock:
+            for e in email:
+                if e and self._voci.pop(e, None) is not None:
+                    self.invalidazioni += 1
+
+    def svuota(self) -> None:
+        with self._lock:
+            self._voci.clear()
+
+    def statistiche(self) -> dict:
+        with self._lock:
+            richieste = self.hit + self.miss
+            return {
+                "voci":          len(self._voci),
+                "hit":           self.hit,
+                "miss":          self.miss,
+                "hit_ratio":     round(self.hit / richieste, 3) if richieste else 0.0,
+                "invalidazioni": self.invalidazioni,
+                "ttl_secondi":   self.ttl_secondi,
+            }
+
+
+cache_utenti = CacheUtenti(settings.cache_utenti_ttl_secondi, settings.cache_utenti_dimensione)
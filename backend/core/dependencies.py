@@ -8,6 +8,7 @@ from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from backend.database import get_db
 from backend.core.security import decodifica_token
+from backend.core.cache_utenti import cache_utenti
 from backend.core.permissions import PermissionChecker
 from backend.models.utente import Utente
 from backend.models.enums import RuoloUtente
@@ -44,10 +45,13 @@ def get_utente_corrente(
     if email is None:
         raise credenziali_exception
 
-    # Cerca l'utente nel database
-    utente = db.query(Utente).filter(Utente.email == email).first()
+    # Cerca l'utente in cache, altrimenti nel database
+    utente = cache_utenti.leggi(db, email)
     if utente is None:
-        raise credenziali_exception
+        utente = db.query(Utente).filter(Utente.email == email).first()
+        if utente is None:
+            raise credenziali_exception
+        cache_utenti.salva(utente)
 
     # Verifica che l'account sia attivo
     if not utente.attivo:
@@ -0,0 +1,67 @@
+"""
+Pool di connessioni con telemetria.
+QueuePool (motore sincrono) e AsyncAdaptedQueuePool (motore asincrono)
+misurano l'attesa di ogni checkout e contano i timeout, così da poter
+dimensionare pool_size / max_overflow rispetto al max-connections di MySQL.
+"""
+
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+class _TelemetriaCheckout:
+    """Mixin: misura _do_get, cioè l'attesa di una connessione dal pool."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # dispose() ricrea il pool: i contatori ripartono da zero
+        self._contatori = {
+            "lock": threading.Lock(), "checkout": 0, "timeout": 0,
+            "attesa_totale": 0.0, "attesa_massima": 0.0, "in_uso_massimo": 0,
+        }
+
+    def _do_get(self):
+        telemetria = self._contatori
+        inizio = time.perf_counter()
+        try:
+            connessione = super()._do_get()
+        except PoolTimeoutError:
+            with telemetria["lock"]:
+                telemetria["timeout"] += 1
+            raise
+        attesa = time.perf_counter() - inizio
+        with telemetria["lock"]:
+            telemetria["checkout"] += 1
+            telemetria["attesa_totale"] += attesa
+            telemetria["attesa_massima"] = max(telemetria["attesa_massima"], attesa)
+            telemetria["in_uso_massimo"] = max(telemetria["in_uso_massimo"], self.checkedout())
+        return connessione
+
+    def statistiche(self) -> dict:
+        telemetria = self._contatori
+        with telemetria["lock"]:
+            checkout = telemetria["checkout"]
+            return {
+                "pool_size":         self.size(),
+                "max_overflow":      self._max_overflow,
+                "in_uso":            self.checkedout(),
+                "in_uso_massimo":    telemetria["in_uso_massimo"],
+                "libere":            self.checkedin(),
+                "overflow":          max(0, self.overflow()),
+                "checkout":          checkout,
+                "timeout":           telemetria["timeout"],
+                "attesa_media_ms":   round(1000 * telemetria["attesa_totale"] / checkout, 3)
+                                     if checkout else 0.0,
+                "attesa_massima_ms": round(1000 * telemetria["attesa_massima"], 3),
+            }
+
+
+class PoolMisurato(_TelemetriaCheckout, QueuePool):
+    """QueuePool con telemetria (motore sincrono)."""
+
+
+class PoolAsyncMisurato(_TelemetriaCheckout, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool con telemetria (motore asincrono)."""
@@ -1,26 +1,110 @@
 """
 Gestione della sicurezza: hashing password e generazione/verifica token JWT.
 Usa bcrypt direttamente (senza passlib) per compatibilità con bcrypt >= 4.0.
+
+Gli hash bcrypt vengono calcolati su un pool di thread dedicato e di
+dimensione fissa (bcrypt_workers): una raffica di login non occupa il
+threadpool condiviso delle richieste e il carico CPU resta limitato.
+Anche la coda è limitata (bcrypt_limite_coda): oltre il limite il lavoro
+viene rifiutato con PoolHashSaturo invece di accumulare attese.
 """
 
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Callable, Optional, TypeVar
 import bcrypt
 from jose import JWTError, jwt
 from backend.config import settings
 
-
-def hash_password(password: str) -> str:
+T = TypeVar("T")
+
+
+class PoolHashSaturo(RuntimeError):
+    """Coda del pool bcrypt piena: la richiesta va ritentata più tardi."""
+
+
+class PoolHash:
+    """Esecutore dedicato agli hash bcrypt con contatori di coda e attesa."""
+
+    def __init__(self, workers: int, limite_coda: int = 0):
+        self.workers = max(1, workers)
+        self.limite_coda = max(0, limite_coda)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                            thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self.in_coda = 0
+        self.in_esecuzione = 0
+        self.coda_massima = 0
+        self.completati = 0
+        self.rifiutati = 0
+        self.attesa_totale = 0.0
+        self.attesa_massima = 0.0
+
+    def _esegui(self, funzione: Callable[..., T], args: tuple, accodato: float) -> T:
+        attesa = time.monotonic() - accodato
+        with self._lock:
+            self.in_coda -= 1
+            self.in_esecuzione += 1
+            self.attesa_totale += attesa
+            self.attesa_massima = max(self.attesa_massima, attesa)
+        try:
+            return funzione(*args)
+        finally:
+            with self._lock:
+                self.in_esecuzione -= 1
+                self.completati += 1
+
+    def sottometti(self, funzione: Callable[..., T], *args) -> Future:
+        with self._lock:
+            if self.limite_coda and self.in_coda >= self.limite_coda:
+                self.rifiutati += 1
+                raise PoolHashSaturo(f"{self.in_coda} hash bcrypt già in coda")
+            self.in_coda += 1
+            self.coda_massima = max(self.coda_massima, self.in_coda)
+        return self._executor.submit(self._esegui, funzione, args, time.monotonic())
+
+    def esegui(self, funzione: Callable[..., T], *args) -> T:
+        """Esegue sul pool e attende il risultato (codice sincrono e script)."""
+        return self.sottometti(funzione, *args).result()
+
+    async def esegui_async(self, funzione: Callable[..., T], *args) -> T:
+        """Esegue sul pool senza bloccare l'event loop."""
+        return await asyncio.wrap_future(self.sottometti(funzione, *args))
+
+    def statistiche(self) -> dict:
+        with self._lock:
+            return {
+                "workers":           self.workers,
+                "limite_coda":       self.limite_coda,
+                "in_coda":           self.in_coda,
+                "in_esecuzione":     self.in_esecuzione,
+                "coda_massima":      self.coda_massima,
+                "completati":        self.completati,
+                "rifiutati":         self.rifiutati,
+                "attesa_media_ms":   round(1000 * self.attesa_totale / self.completati, 2)
+                                     if self.completati else 0.0,
+                "attesa_massima_ms": round(1000 * self.attesa_massima, 2),
+                "bcrypt_rounds":     settings.bcrypt_rounds,
+            }
+
+
+pool_hash = PoolHash(settings.bcrypt_workers, settings.bcrypt_limite_coda)
+
+
+def _calcola_hash(password: str) -> str:
     """
-    Genera l'hash bcrypt di una password in chiaro.
+    Genera l'hash bcrypt di una password in chiaro al costo configurato.
     Codifica la stringa in bytes prima di passarla a bcrypt.
     """
     password_bytes = password.encode("utf-8")
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=settings.bcrypt_rounds)
     return bcrypt.hashpw(password_bytes, salt).decode("utf-8")
 
 
-def verifica_password(password_chiaro: str, password_hash: str) -> bool:
+def _confronta(password_chiaro: str, password_hash: str) -> bool:
     """
     Confronta una password in chiaro con il suo hash bcrypt.
     Entrambi i valori vengono codificati in bytes per la verifica.
@@ -34,6 +118,37 @@ def verifica_password(password_chiaro: str, password_hash: str) -> bool:
         return False
 
 
+def hash_password(password: str) -> str:
+    """Hash bcrypt della password, calcolato sul pool dedicato."""
+    return pool_hash.esegui(_calcola_hash, password)
+
+
+def verifica_password(password_chiaro: str, password_hash: str) -> bool:
+    """Verifica bcrypt sul pool dedicato (attende il risultato)."""
+    return pool_hash.esegui(_confronta, password_chiaro, password_hash)
+
+
+async def hash_password_async(password: str) -> str:
+    """Come hash_password, da attendere negli handler async."""
+    return await pool_hash.esegui_async(_calcola_hash, password)
+
+
+async def verifica_password_async(password_chiaro: str, password_hash: str) -> bool:
+    """Come verifica_password, da attendere negli handler async."""
+    return await pool_hash.esegui_async(_confronta, password_chiaro, password_hash)
+
+
+def richiede_rehash(password_hash: str) -> bool:
+    """
+    True se l'hash è stato generato con un costo diverso da bcrypt_rounds
+    (formato '$2b$12$...'): al prossimo login corretto va rigenerato.
+    """
+    try:
+        return int(password_hash.split("$")[2]) != settings.bcrypt_rounds
+    except (IndexError, ValueError):
+        return True
+
+
 def _ora_utc() -> datetime:
     """Restituisce datetime UTC naive (senza tzinfo) compatibile con jose/JWT."""
     return datetime.now(timezone.utc).replace(tzinfo=None)
@@ -1,23 +1,77 @@
 """
 Configurazione della connessione al database tramite SQLAlchemy.
 Gestisce il motore, la sessione e la base dichiarativa dei modelli.
+
+Due motori sullo stesso database:
+- sincrono (pymysql): endpoint di scrittura, servizi e script
+  (rigenera_conflitti, ricostruisci_occupazione, seed);
+- asincrono (aiomysql): endpoint di lettura `async def`, che non occupano
+  un thread del threadpool mentre attendono il database.
+
+Con db_repliche configurate gli endpoint di sola lettura usano
+get_db_lettura / get_async_db_lettura: le SELECT vanno a una replica, le
+scritture (e tutto ciò che segue nella stessa sessione) al primario, e un
+utente che ha appena scritto legge dal primario per qualche secondo.
 """
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+import itertools
+import threading
+import time
+from typing import Optional
+
+from fastapi import Request
+from sqlalchemy import Enum, Select, String, create_engine, event, inspect, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
+from sqlalchemy.sql.dml import UpdateBase
 from backend.config import settings
+from backend.core.pool_db import PoolAsyncMisurato, PoolMisurato
+from backend.core.security import decodifica_token
+
+# Opzioni di connessione comuni a pymysql e aiomysql
+CONNECT_ARGS = {
+    "charset": "utf8mb4",
+    "init_command": "SET sql_mode='STRICT_TRANS_TABLES'",
+}
+
+
+# Dimensionamento del pool da configurazione, uguale per i due motori
+OPZIONI_POOL = {
+    "pool_size":     settings.db_pool_size,
+    "max_overflow":  settings.db_max_overflow,
+    "pool_timeout":  settings.db_pool_timeout,
+    "pool_recycle":  settings.db_pool_recycle,
+    "pool_pre_ping": settings.db_pool_pre_ping,
+}
 
 
 # ── Creazione del motore SQLAlchemy ──────────────────────────────────────────
 engine = create_engine(
     settings.database_url,
-    pool_pre_ping=True,
-    connect_args={
-        "charset": "utf8mb4",
-        "init_command": "SET sql_mode='STRICT_TRANS_TABLES'",
-    },
+    poolclass=PoolMisurato,
+    connect_args=CONNECT_ARGS,
+    **OPZIONI_POOL,
+)
+
+async_engine = create_async_engine(
+    settings.database_url_async,
+    poolclass=PoolAsyncMisurato,
+    connect_args=CONNECT_ARGS,
+    **OPZIONI_POOL,
 )
 
+# Repliche di lettura (vuote se db_repliche non è configurato)
+engine_repliche = [
+    create_engine(url, poolclass=PoolMisurato, connect_args=CONNECT_ARGS, **OPZIONI_POOL)
+    for url in settings.database_url_repliche
+]
+async_engine_repliche = [
+    create_async_engine(url, poolclass=PoolAsyncMisurato, connect_args=CONNECT_ARGS,
+                        **OPZIONI_POOL)
+    for url in settings.database_url_repliche_async
+]
+_turno_repliche = itertools.cycle(range(len(engine_repliche)))
+
 
 # ── Factory della sessione ────────────────────────────────────────────────────
 SessionLocal = sessionmaker(
@@ -26,6 +80,100 @@ SessionLocal = sessionmaker(
     bind=engine,
 )
 
+# expire_on_commit=False: dopo il commit gli oggetti restano leggibili senza
+# nuove query (il lazy load implicito non è disponibile con AsyncSession)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+
+class SessioneLettura(Session):
+    """
+    Sessione instradata: SELECT sulla replica, scritture e SELECT … FOR
+    UPDATE sul primario. Dopo la prima scrittura la sessione resta sul
+    primario, così legge ciò che ha appena scritto (es. espandi_regole).
+    I motori sono in info["primario"] e info["replica"]; info["scrittura"]
+    è impostato dalle DML esplicite e, per il flush dell'ORM, da before_flush.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.info.get("scrittura") or isinstance(clause, UpdateBase):
+            self.info["scrittura"] = True
+            return self.info["primario"]
+        if isinstance(clause, Select) and clause._for_update_arg is not None:
+            return self.info["primario"]
+        return self.info["replica"]
+
+
+@event.listens_for(SessioneLettura, "before_flush")
+def _flush_sul_primario(session, flush_context, instances):
+    session.info["scrittura"] = True
+
+
+SessionLetturaLocal = sessionmaker(
+    class_=SessioneLettura,
+    autocommit=False,
+    autoflush=False,
+)
+
+AsyncSessionLetturaLocal = async_sessionmaker(
+    sync_session_class=SessioneLettura,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+
+class RegistroScritture:
+    """
+    Istante dell'ultima scrittura riuscita per utente (sub del token).
+    Per il processo corrente: con più worker la finestra vale per le
+    richieste servite dallo stesso processo.
+    """
+
+    def __init__(self, finestra_secondi: float):
+        self.finestra_secondi = finestra_secondi
+        self._ultime: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def chiave(request: Request) -> Optional[str]:
+        intestazione = request.headers.get("authorization", "")
+        if not intestazione.lower().startswith("bearer "):
+            return None
+        payload = decodifica_token(intestazione[7:])
+        return payload.get("sub") if payload else None
+
+    def registra(self, request: Request) -> None:
+        chiave = self.chiave(request)
+        if chiave is None:
+            return
+        ora = time.monotonic()
+        with self._lock:
+            self._ultime[chiave] = ora
+            if len(self._ultime) > 10_000:
+                limite = ora - self.finestra_secondi
+                self._ultime = {k: t for k, t in self._ultime.items() if t >= limite}
+
+    def recente(self, request: Request) -> bool:
+        chiave = self.chiave(request)
+        if chiave is None:
+            return False
+        with self._lock:
+            ultima = self._ultime.get(chiave)
+        return ultima is not None and time.monotonic() - ultima < self.finestra_secondi
+
+
+registro_scritture = RegistroScritture(settings.lettura_dopo_scrittura_secondi)
+
+
+def _indice_replica(request: Request) -> Optional[int]:
+    """Replica da usare (a rotazione), None se la richiesta va al primario."""
+    if not engine_repliche or registro_scritture.recente(request):
+        return None
+    return next(_turno_repliche)
+
 
 # ── Base dichiarativa per i modelli ORM ──────────────────────────────────────
 class Base(DeclarativeBase):
@@ -45,6 +193,112 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """
+    Dependency per gli handler `async def`: una AsyncSession per richiesta.
+    Le relazioni vanno caricate esplicitamente (selectinload); il codice
+    sincrono dei servizi si riusa con `await db.run_sync(funzione, ...)`.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_db_lettura(request: Request):
+    """
+    Come get_db, per gli endpoint di sola lettura: con repliche configurate
+    la sessione legge da una replica (vedi SessioneLettura).
+    """
+    indice = _indice_replica(request)
+    if indice is None:
+        yield from get_db()
+        return
+    db = SessionLetturaLocal(info={"primario": engine, "replica": engine_repliche[indice]})
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db_lettura(request: Request):
+    """Come get_async_db, con instradamento sulle repliche come get_db_lettura."""
+    indice = _indice_replica(request)
+    if indice is None:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+    async with AsyncSessionLetturaLocal(info={
+        "primario": async_engine.sync_engine,
+        "replica":  async_engine_repliche[indice].sync_engine,
+    }) as db:
+        yield db
+
+
+def statistiche_pool() -> dict:
+    """Stato e telemetria dei pool di connessioni dei motori."""
+    return {
+        "sincrono":  engine.pool.statistiche(),
+        "asincrono": async_engine.pool.statistiche(),
+        "repliche": [
+            {"sincrono": e.pool.statistiche(), "asincrono": a.pool.statistiche()}
+            for e, a in zip(engine_repliche, async_engine_repliche)
+        ],
+    }
+
+
 def crea_tabelle():
     """Crea tutte le tabelle nel database se non esistono già."""
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+    crea_indici_mancanti()
+    allinea_colonne_enum()
+
+
+def crea_indici_mancanti():
+    """
+    Migrazione idempotente degli indici.
+    create_all() non aggiunge indici a tabelle già esistenti: qui si
+    confrontano gli indici dichiarati nei modelli con quelli presenti nel DB
+    e si creano solo quelli mancanti (su MySQL 8 l'aggiunta di un indice
+    secondario InnoDB è online, senza bloccare le scritture).
+    """
+    ispettore = inspect(engine)
+    tabelle_esistenti = set(ispettore.get_table_names())
+    for tabella in Base.metadata.sorted_tables:
+        if tabella.name not in tabelle_esistenti:
+            continue
+        presenti = {i["name"] for i in ispettore.get_indexes(tabella.name)}
+        for indice in tabella.indexes:
+            if indice.name not in presenti:
+                print(f"🛠️  Creazione indice {indice.name} su {tabella.name}")
+                indice.create(bind=engine)
+
+
+def allinea_colonne_enum():
+    """
+    Migrazione idempotente dei valori ENUM (solo MySQL).
+    create_all() non modifica colonne esistenti: se un Enum dei modelli ha
+    valori assenti dalla colonna ENUM del DB, la colonna viene ridefinita con
+    l'elenco completo (aggiungere valori in coda non riscrive la tabella).
+    """
+    if engine.dialect.name != "mysql":
+        return
+    ispettore = inspect(engine)
+    tabelle_esistenti = set(ispettore.get_table_names())
+    for tabella in Base.metadata.sorted_tables:
+        if tabella.name not in tabelle_esistenti:
+            continue
+        colonne_db = {c["name"]: c for c in ispettore.get_columns(tabella.name)}
+        for colonna in tabella.columns:
+            if not isinstance(colonna.type, Enum) or colonna.name not in colonne_db:
+                continue
+            presenti = set(getattr(colonne_db[colonna.name]["type"], "enums", None) or ())
+            if set(colonna.type.enums) <= presenti:
+                continue
+            print(f"🛠️  Aggiornamento valori ENUM di {tabella.name}.{colonna.name}")
+            definizione = colonna.type.compile(dialect=engine.dialect)
+            definizione += " NULL" if colonna.nullable else " NOT NULL"
+            if colonna.comment:
+                definizione += " COMMENT " + String().literal_processor(engine.dialect)(colonna.comment)
+            with engine.begin() as conn:
+                conn.execute(text(
+                    f"ALTER TABLE `{tabella.name}` MODIFY COLUMN `{colonna.name}` {definizione}"
+                ))
@@ -3,22 +3,39 @@ Entry point dell'applicazione FastAPI.
 Configura il server, i router e il middleware CORS.
 """
 from contextlib import asynccontextmanager
-from datetime import datetime, timezone
-from fastapi import FastAPI
+from datetime import date, datetime, timedelta, timezone
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from backend.config import settings
-from backend.database import crea_tabelle
+from backend.core.security import PoolHashSaturo
+from backend.database import (async_engine, async_engine_repliche, crea_tabelle,
+                              registro_scritture, SessionLocal)
+from backend.services.occupazione_service import inizializza_occupazione
+from backend.services.regole_service import espandi_regole
 # Import di tutti i router
-from backend.routers import auth, utenti, sedi, aule, prenotazioni, conflitti, corsi, docenti
+from backend.routers import auth, utenti, sedi, aule, prenotazioni, conflitti, corsi, docenti, calendario, statistiche, sistema
 # ── Lifespan (sostituisce il deprecato @app.on_event) ────────────────────────
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Inizializza il database all'avvio dell'applicazione."""
     crea_tabelle()
+    db = SessionLocal()
+    try:
+        inizializza_occupazione(db)
+        # Porta le regole ricorrenti all'orizzonte configurato
+        if settings.orizzonte_ricorrenze_giorni > 0:
+            espandi_regole(db, date.today() + timedelta(days=settings.orizzonte_ricorrenze_giorni))
+            db.commit()
+    finally:
+        db.close()
     print(f"✅ {settings.app_name} v{settings.app_version} avviato")
     print(f"📚 Documentazione: http://localhost:8000/api/docs")
     yield
-    # Cleanup all'arresto (se necessario in futuro)
+    # Chiude le connessioni dei motori asincroni all'arresto
+    await async_engine.dispose()
+    for motore in async_engine_repliche:
+        await motore.dispose()
 # ── Creazione dell'app FastAPI ────────────────────────────────────────────────
 app = FastAPI(
     title=settings.app_name,
@@ -46,7 +63,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+# ── Lettura dopo scrittura (solo con repliche) ───────────────────────────────
+# Una scrittura riuscita sposta sul primario le letture dello stesso utente
+# per lettura_dopo_scrittura_secondi, finché le repliche non si allineano
+if settings.db_repliche:
+    @app.middleware("http")
+    async def registra_scritture(request: Request, call_next):
+        risposta = await call_next(request)
+        if request.method not in ("GET", "HEAD", "OPTIONS") and risposta.status_code < 400:
+            registro_scritture.registra(request)
+        return risposta
+# ── Pool bcrypt saturo: 503 invece di accodare altri hash ─────────────────────
+@app.exception_handler(PoolHashSaturo)
+async def pool_hash_saturo(request: Request, exc: PoolHashSaturo):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Servizio momentaneamente sovraccarico, riprovare"},
+        headers={"Retry-After": "1"},
+    )
 # ── Registrazione dei router con prefisso API versioned ───────────────────────
 PREFIX = "/api/v1"
 app.include_router(auth.router,         prefix=PREFIX)
@@ -57,6 +93,9 @@ app.include_router(prenotazioni.router, prefix=PREFIX)
 app.include_router(conflitti.router,    prefix=PREFIX)
 app.include_router(corsi.router,        prefix=PREFIX)
 app.include_router(docenti.router,      prefix=PREFIX)
+app.include_router(calendario.router,   prefix=PREFIX)
+app.include_router(statistiche.router,  prefix=PREFIX)
+app.include_router(sistema.router,      prefix=PREFIX)
 
 @app.get("/", summary="Health check")
 def root():
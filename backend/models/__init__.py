@@ -28,6 +28,8 @@ from backend.models.prenotazione import (
 from backend.models.attrezzatura import Attrezzatura, RichiestaAttrezzatura
 from backend.models.catalogo     import Catalogo
 from backend.models.conflitto    import ConflittoPrenotazione
+from backend.models.occupazione  import OccupazioneGiornaliera
+from backend.models.regola_ricorrenza import RegolaRicorrenza
 
 __all__ = [
     # Enum
@@ -45,6 +47,7 @@ __all__ = [
     "SlotOrario",
     "Prenotazione", "PrenotazioneSingola", "PrenotazioneMassiva",
     "RichiestaPrenotazione", "ConflittoPrenotazione",
+    "OccupazioneGiornaliera", "RegolaRicorrenza",
     "Attrezzatura", "RichiestaAttrezzatura",
     "Catalogo",
 ]
\ No newline at end of file
@@ -2,7 +2,7 @@
 Modello ConflittoPrenotazione - Sistema rilevamento automatico conflitti
 """
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum as SQLEnum, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, Enum as SQLEnum, Boolean
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 
@@ -16,6 +16,12 @@ class ConflittoPrenotazione(Base):
     """
     
     __tablename__ = "conflitti_prenotazione"
+    __table_args__ = (
+        # Conflitti attivi di una prenotazione, per lato della coppia
+        # (lista OPERATIVO, ricalcolo flag ha_conflitti)
+        Index("ix_conflitti_stato_pren1", "stato_risoluzione", "prenotazione_id_1"),
+        Index("ix_conflitti_stato_pren2", "stato_risoluzione", "prenotazione_id_2"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     
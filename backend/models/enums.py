@@ -69,6 +69,7 @@ class StatoRisoluzioneConflitto(str, Enum):
     RISOLTO_MANTENUTA_1          = "RISOLTO_MANTENUTA_1"
     RISOLTO_MANTENUTA_2          = "RISOLTO_MANTENUTA_2"
     RISOLTO_ELIMINATE_ENTRAMBE   = "RISOLTO_ELIMINATE_ENTRAMBE"
+    CHIUSO_AUTOMATICAMENTE       = "CHIUSO_AUTOMATICAMENTE"     # sovrapposizione non più presente
 
 
 # ── Corsi ─────────────────────────────────────────────────────────────────────
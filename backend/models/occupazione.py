@@ -0,0 +1,29 @@
+"""
+Modello ORM del riepilogo giornaliero di occupazione delle aule.
+Tabella derivata da slot_orari, mantenuta incrementalmente dalle scritture
+(vedi services/occupazione_service.py) e ricostruibile con
+`python -m backend.ricostruisci_occupazione`.
+"""
+
+from sqlalchemy import Column, Integer, Date, ForeignKey
+from backend.database import Base
+
+
+class OccupazioneGiornaliera(Base):
+    """
+    Minuti prenotati e numero di slot confermati per aula e giorno.
+    Un giorno rimasto senza slot resta con i valori a zero.
+    """
+
+    __tablename__ = "occupazione_giornaliera"
+
+    # ── Colonne ──────────────────────────────────────────────────────────────
+    aula_id           = Column(Integer, ForeignKey("aule.id"), primary_key=True)
+    data              = Column(Date, primary_key=True, index=True)
+    minuti_prenotati  = Column(Integer, nullable=False, default=0)
+    numero_slot       = Column(Integer, nullable=False, default=0)
+    picco_concorrenza = Column(Integer, nullable=False, default=0,
+                               comment="Massimo numero di slot contemporanei nel giorno")
+
+    def __repr__(self) -> str:
+        return f"<Occupazione aula={self.aula_id} {self.data}: {self.minuti_prenotati} min>"
@@ -6,7 +6,7 @@ Include anche il modello RichiestaPrenotazione e Conflitto.
 
 from datetime import datetime
 from sqlalchemy import (Column, Integer, String, DateTime, ForeignKey, Text,
-                         Enum as SAEnum, Boolean, Date)
+                         Enum as SAEnum, Boolean, Date, Index)
 from sqlalchemy.orm import relationship
 from backend.database import Base
 from backend.models.enums import (StatoPrenotazione, StatoRichiesta,
@@ -38,6 +38,11 @@ class Prenotazione(Base):
         "polymorphic_identity": None,
     }
 
+    __table_args__ = (
+        # Paginazione keyset di GET /prenotazioni
+        Index("ix_prenotazioni_data_creazione_id", "data_creazione", "id"),
+    )
+
     # Relazioni — aula/corso rimossi, ora sono sullo slot
     richiedente = relationship("Utente", back_populates="prenotazioni_richieste",
                                foreign_keys=[richiedente_id])
@@ -45,6 +50,8 @@ class Prenotazione(Base):
                                cascade="all, delete-orphan")
     richiesta   = relationship("RichiestaPrenotazione", back_populates="prenotazione",
                                uselist=False)
+    regola      = relationship("RegolaRicorrenza", back_populates="prenotazione",
+                               uselist=False, cascade="all, delete-orphan")
     attrezzature_richieste = relationship("RichiestaAttrezzatura",
                                           back_populates="prenotazione",
                                           cascade="all, delete-orphan")
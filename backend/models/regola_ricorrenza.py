@@ -0,0 +1,35 @@
+"""
+Modello ORM della regola di una prenotazione massiva memorizzata in forma
+compatta. Con orizzonte_ricorrenze_giorni > 0 gli slot vengono creati solo
+fino a `materializzata_fino`; le occorrenze successive sono calcolate in
+memoria dalle letture e materializzate quando una scrittura le raggiunge
+(vedi services/regole_service.py).
+"""
+
+from sqlalchemy import Column, Integer, Date, Time, Text, Boolean, ForeignKey
+from sqlalchemy.orm import relationship
+from backend.database import Base
+
+
+class RegolaRicorrenza(Base):
+    """Dati dello slot tipo e limite di materializzazione di una prenotazione massiva."""
+
+    __tablename__ = "regole_ricorrenza"
+
+    # ── Colonne ──────────────────────────────────────────────────────────────
+    prenotazione_id     = Column(Integer, ForeignKey("prenotazioni.id"), primary_key=True)
+    aula_id             = Column(Integer, ForeignKey("aule.id"),    nullable=False)
+    corso_id            = Column(Integer, ForeignKey("corsi.id"),   nullable=False)
+    docente_id          = Column(Integer, ForeignKey("docenti.id"), nullable=True)
+    note                = Column(Text, nullable=True)
+    ora_inizio          = Column(Time, nullable=False)
+    ora_fine            = Column(Time, nullable=False)
+    salta_chiusure      = Column(Boolean, default=False, nullable=False)
+    materializzata_fino = Column(Date, nullable=False, index=True,
+                                 comment="Ultimo giorno per cui gli slot esistono in slot_orari")
+
+    # ── Relazioni ────────────────────────────────────────────────────────────
+    prenotazione = relationship("Prenotazione", back_populates="regola")
+
+    def __repr__(self) -> str:
+        return f"<Regola pren={self.prenotazione_id} fino al {self.materializzata_fino}>"
@@ -21,6 +21,10 @@ class SlotOrario(Base):
     __table_args__ = (
         Index("ix_slot_orari_prenotazione_data", "prenotazione_id", "data"),
         Index("ix_slot_docente", "docente_id"),  # ← AGGIUNTO
+        # Indice coprente per le ricerche di conflitti e disponibilità:
+        # aula + giorno + slot attivi, orari letti direttamente dall'indice
+        Index("ix_slot_orari_aula_data_annullato",
+              "aula_id", "data", "annullato", "ora_inizio", "ora_fine"),
     )
     
     prenotazione = relationship("Prenotazione", back_populates="slots")
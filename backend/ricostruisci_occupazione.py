@@ -0,0 +1,32 @@
+"""
+Script per ricostruire il riepilogo occupazione_giornaliera da slot_orari.
+Da eseguire dopo il primo deploy della tabella o dopo interventi manuali
+sul database.
+
+Utilizzo:
+    python -m backend.ricostruisci_occupazione [--dal 2026-01-01] [--al 2026-12-31]
+"""
+
+import argparse
+from datetime import date
+
+from backend.database import SessionLocal, crea_tabelle
+from backend.services.occupazione_service import ricostruisci_occupazione
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ricostruzione riepilogo occupazione aule")
+    parser.add_argument("--dal", type=date.fromisoformat, help="Data iniziale (YYYY-MM-DD)")
+    parser.add_argument("--al", type=date.fromisoformat, help="Data finale (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("RICOSTRUZIONE OCCUPAZIONE - ICE Planning Aule")
+    print("=" * 60)
+    crea_tabelle()
+    db = SessionLocal()
+    try:
+        scritte = ricostruisci_occupazione(db, dal=args.dal, al=args.al)
+        print(f"✅ Righe scritte: {scritte}")
+    finally:
+        db.close()
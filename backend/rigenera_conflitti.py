@@ -1,20 +1,33 @@
 """
 Script per rigenerare TUTTI i conflitti tra slot.
 Da eseguire quando il rilevamento automatico ha lasciato buchi.
+
+Utilizzo:
+    python -m backend.rigenera_conflitti
+    python -m backend.rigenera_conflitti --riconcilia [--dry-run]
+    python -m backend.rigenera_conflitti --streaming [--riconcilia] [--dry-run]
+        [--dal 2026-01-01] [--al 2026-12-31] [--sede 1] [--batch 500]
+
+La riconciliazione usa sempre la lettura in streaming: --riconcilia da
+solo equivale a --streaming --riconcilia.
 """
 
-from sqlalchemy.orm import Session
-from backend.database import SessionLocal
-from backend.models import SlotOrario, ConflittoPrenotazione, Prenotazione
-from backend.models.enums import StatoPrenotazione, TipoConflitto
-from datetime import time
+import argparse
+from collections import defaultdict
+from datetime import date
+from itertools import groupby
+from typing import Optional
 
+from sqlalchemy import select, delete, insert, update, or_, func
+from sqlalchemy.orm import Session
+from backend.database import SessionLocal, engine
+from backend.models import SlotOrario, ConflittoPrenotazione, Prenotazione, Aula
+from backend.models.enums import (StatoPrenotazione, TipoConflitto,
+                                  StatoRisoluzioneConflitto)
+from backend.services.conflitti_service import ConflittoService, adesso_utc
+from backend.services.intervalli import da_riga, trova_sovrapposizioni
 
-def check_time_overlap(start1: time, end1: time, start2: time, end2: time) -> bool:
-    """Verifica sovrapposizione oraria."""
-    def to_min(t: time) -> int:
-        return t.hour * 60 + t.minute
-    return to_min(start1) < to_min(end2) and to_min(start2) < to_min(end1)
+STATI_ATTIVI = [StatoPrenotazione.CONFERMATA, StatoPrenotazione.IN_ATTESA]
 
 
 def rigenera_tutti_i_conflitti():
@@ -22,7 +35,8 @@ def rigenera_tutti_i_conflitti():
     Rigenera TUTTI i conflitti da zero.
     1. Elimina tutti i conflitti NON risolti
     2. Scansiona tutti gli slot attivi
-    3. Per ogni gruppo di slot sovrapposti, crea TUTTE le coppie di conflitti
+    3. Per ogni gruppo (aula, data), crea le coppie realmente sovrapposte
+       con un passaggio sweep-line
     """
     db: Session = SessionLocal()
     
@@ -36,7 +50,10 @@ def rigenera_tutti_i_conflitti():
         # Carica tutti gli slot attivi, confermati o in attesa
         print("\n📊 Caricamento slot attivi...")
         slot_attivi = (
-            db.query(SlotOrario)
+            db.query(
+                SlotOrario.id, SlotOrario.prenotazione_id, SlotOrario.aula_id,
+                SlotOrario.data, SlotOrario.ora_inizio, SlotOrario.ora_fine,
+            )
             .join(Prenotazione, SlotOrario.prenotazione_id == Prenotazione.id)
             .filter(
                 SlotOrario.annullato == False,
@@ -49,62 +66,39 @@ def rigenera_tutti_i_conflitti():
         )
         print(f"   ✓ Trovati {len(slot_attivi)} slot attivi")
         
-        # Raggruppa per (aula_id, data)
+        # Raggruppa per (aula_id, data), convertendo gli orari in minuti una volta sola
         print("\n🔍 Raggruppamento per aula e data...")
-        gruppi = {}
+        gruppi = defaultdict(list)
         for slot in slot_attivi:
-            key = (slot.aula_id, slot.data)
-            if key not in gruppi:
-                gruppi[key] = []
-            gruppi[key].append(slot)
+            gruppi[(slot.aula_id, slot.data)].append(da_riga(slot))
         
         print(f"   ✓ Creati {len(gruppi)} gruppi (aula + data)")
         
-        # Per ogni gruppo, trova tutte le coppie in conflitto
+        # Per ogni gruppo, sweep-line: emette solo le coppie che si sovrappongono
         print("\n⚔️  Rilevamento conflitti...")
         conflitti_creati = 0
         
-        for (aula_id, data), slots in gruppi.items():
+        for slots in gruppi.values():
             if len(slots) < 2:
                 continue  # Nessun conflitto possibile
             
-            # Genera tutte le coppie possibili
-            for i in range(len(slots)):
-                for j in range(i + 1, len(slots)):
-                    slot1 = slots[i]
-                    slot2 = slots[j]
-                    
-                    # Verifica sovrapposizione oraria
-                    if not check_time_overlap(
-                        slot1.ora_inizio, slot1.ora_fine,
-                        slot2.ora_inizio, slot2.ora_fine
-                    ):
-                        continue
-                    
-                    # Conflitto trovato! Crea record
-                    # Ordina per ID slot (minore sempre come slot_id_1)
-                    s1 = min(slot1.id, slot2.id)
-                    s2 = max(slot1.id, slot2.id)
-                    
-                    # Ordina per ID prenotazione
-                    if slot1.prenotazione_id < slot2.prenotazione_id:
-                        p1, p2 = slot1.prenotazione_id, slot2.prenotazione_id
-                        sid1, sid2 = slot1.id, slot2.id
-                    else:
-                        p1, p2 = slot2.prenotazione_id, slot1.prenotazione_id
-                        sid1, sid2 = slot2.id, slot1.id
-                    
-                    conflitto = ConflittoPrenotazione(
-                        prenotazione_id_1=p1,
-                        prenotazione_id_2=p2,
-                        slot_id_1=sid1,
-                        slot_id_2=sid2,
-                        tipo_conflitto=TipoConflitto.OVERLAP_ORARIO,
-                    )
-                    db.add(conflitto)
-                    conflitti_creati += 1
+            for slot1, slot2 in trova_sovrapposizioni(slots):
+                # Ordina per ID prenotazione (a parità, per ID slot)
+                if (slot1.prenotazione_id, slot1.id) > (slot2.prenotazione_id, slot2.id):
+                    slot1, slot2 = slot2, slot1
+                
+                conflitto = ConflittoPrenotazione(
+                    prenotazione_id_1=slot1.prenotazione_id,
+                    prenotazione_id_2=slot2.prenotazione_id,
+                    slot_id_1=slot1.id,
+                    slot_id_2=slot2.id,
+                    tipo_conflitto=TipoConflitto.OVERLAP_ORARIO,
+                )
+                db.add(conflitto)
+                conflitti_creati += 1
         
         print(f"   ✓ Creati {conflitti_creati} nuovi conflitti")
+        db.flush()
         
         # Aggiorna flag ha_conflitti sulle prenotazioni
         print("\n🚩 Aggiornamento flag conflitti sulle prenotazioni...")
@@ -145,8 +139,268 @@ def rigenera_tutti_i_conflitti():
         db.close()
 
 
+# ── Modalità streaming ────────────────────────────────────────────────────────
+
+def _filtro_ambito(dal: Optional[date], al: Optional[date], sede_id: Optional[int]) -> list:
+    """Condizioni su SlotOrario per limitare la rigenerazione a date e sede."""
+    condizioni = []
+    if dal:
+        condizioni.append(SlotOrario.data >= dal)
+    if al:
+        condizioni.append(SlotOrario.data <= al)
+    if sede_id:
+        condizioni.append(SlotOrario.aula_id.in_(
+            select(Aula.id).where(Aula.sede_id == sede_id)
+        ))
+    return condizioni
+
+
+def _riga_conflitto(slot1, slot2) -> dict:
+    """Riga pronta per l'INSERT multiplo, ordinata per ID prenotazione."""
+    if (slot1.prenotazione_id, slot1.id) > (slot2.prenotazione_id, slot2.id):
+        slot1, slot2 = slot2, slot1
+    return {
+        "prenotazione_id_1": slot1.prenotazione_id,
+        "prenotazione_id_2": slot2.prenotazione_id,
+        "slot_id_1": slot1.id,
+        "slot_id_2": slot2.id,
+        "tipo_conflitto": TipoConflitto.OVERLAP_ORARIO,
+    }
+
+
+def _chiusura_riconciliazione() -> dict:
+    """Valori con cui la riconciliazione chiude un conflitto non più valido."""
+    return {
+        "stato_risoluzione": StatoRisoluzioneConflitto.CHIUSO_AUTOMATICAMENTE,
+        "risolto_il": adesso_utc(),
+        "note_risoluzione": "Chiuso automaticamente dalla riconciliazione",
+    }
+
+
+def _finestre_aula_giorno(righe):
+    """
+    Raggruppa uno stream di righe ordinate per (aula_id, data) in finestre,
+    tenendo in memoria una sola finestra alla volta.
+    """
+    for chiave, gruppo in groupby(righe, key=lambda r: (r.aula_id, r.data)):
+        yield chiave, [da_riga(r) for r in gruppo]
+
+
+def rigenera_conflitti_streaming(
+    dal: Optional[date] = None,
+    al: Optional[date] = None,
+    sede_id: Optional[int] = None,
+    dry_run: bool = False,
+    dimensione_batch: int = 500,
+    riconcilia: bool = False,
+):
+    """
+    Rigenera i conflitti leggendo gli slot in streaming, una finestra
+    (aula, data) alla volta, con memoria limitata.
+
+    - Lettura: cursore lato server (stream_results + yield_per) su una
+      connessione dedicata, righe ordinate per (aula_id, data)
+    - Scrittura: ogni batch di circa `dimensione_batch` slot sostituisce i
+      conflitti non risolti di quegli slot e viene committato a sé
+    - riconcilia: invece di eliminare e reinserire, confronta le coppie
+      calcolate con quelle attive memorizzate; inserisce solo le mancanti e
+      chiude solo le obsolete (id e rilevato_il dei conflitti validi restano)
+    - Flag: ha_conflitti_attivi / ha_conflitti con UPDATE set-based finali
+    - dry_run: nessuna scrittura, stampa solo i conteggi
+    """
+    ambito = _filtro_ambito(dal, al, sede_id)
+    db: Session = SessionLocal()
+    lettura = engine.connect().execution_options(
+        stream_results=True, yield_per=dimensione_batch
+    )
+
+    totale_slot = totale_finestre = totale_inseriti = totale_rimossi = 0
+    totale_invariati = 0
+    batch_slot_ids: list[int] = []
+    batch_righe: list[dict] = []
+
+    def riconcilia_batch(conflitti_batch):
+        nonlocal totale_inseriti, totale_rimossi, totale_invariati
+        desiderate = {
+            (min(r["slot_id_1"], r["slot_id_2"]), max(r["slot_id_1"], r["slot_id_2"])): r
+            for r in batch_righe
+        }
+        presenti = set()
+        da_chiudere = []
+        for conflitto_id, s1, s2 in db.execute(
+            select(
+                ConflittoPrenotazione.id,
+                ConflittoPrenotazione.slot_id_1,
+                ConflittoPrenotazione.slot_id_2,
+            ).where(*conflitti_batch)
+        ):
+            chiave = (min(s1, s2), max(s1, s2))
+            if chiave in desiderate and chiave not in presenti:
+                presenti.add(chiave)
+            else:
+                da_chiudere.append(conflitto_id)   # obsoleto o duplicato
+        mancanti = [r for k, r in desiderate.items() if k not in presenti]
+
+        if not dry_run:
+            if da_chiudere:
+                db.execute(
+                    update(ConflittoPrenotazione)
+                    .where(ConflittoPrenotazione.id.in_(da_chiudere))
+                    .values(**_chiusura_riconciliazione())
+                    .execution_options(synchronize_session=False)
+                )
+            if mancanti:
+                db.execute(insert(ConflittoPrenotazione), mancanti)
+            db.commit()
+        totale_rimossi += len(da_chiudere)
+        totale_inseriti += len(mancanti)
+        totale_invariati += len(presenti)
+
+    def scrivi_batch():
+        nonlocal totale_inseriti, totale_rimossi
+        conflitti_batch = (
+            ConflittoPrenotazione.stato_risoluzione == None,
+            or_(
+                ConflittoPrenotazione.slot_id_1.in_(batch_slot_ids),
+                ConflittoPrenotazione.slot_id_2.in_(batch_slot_ids),
+            ),
+        )
+        if riconcilia:
+            riconcilia_batch(conflitti_batch)
+        elif dry_run:
+            totale_rimossi += db.scalar(
+                select(func.count(ConflittoPrenotazione.id)).where(*conflitti_batch)
+            )
+        else:
+            totale_rimossi += db.execute(
+                delete(ConflittoPrenotazione).where(*conflitti_batch)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if batch_righe:
+                db.execute(insert(ConflittoPrenotazione), batch_righe)
+            db.commit()
+        if not riconcilia:
+            totale_inseriti += len(batch_righe)
+        batch_slot_ids.clear()
+        batch_righe.clear()
+
+    try:
+        # Conflitti attivi su slot annullati o prenotazioni non più attive:
+        # non compaiono nello stream, vanno rimossi (o chiusi) a parte
+        slot_non_attivi = (
+            select(SlotOrario.id)
+            .join(Prenotazione, SlotOrario.prenotazione_id == Prenotazione.id)
+            .where(or_(
+                SlotOrario.annullato == True,
+                Prenotazione.stato.notin_(STATI_ATTIVI),
+            ))
+        )
+        obsoleti = (
+            ConflittoPrenotazione.stato_risoluzione == None,
+            or_(
+                ConflittoPrenotazione.slot_id_1.in_(slot_non_attivi),
+                ConflittoPrenotazione.slot_id_2.in_(slot_non_attivi),
+            ),
+            ConflittoPrenotazione.slot_id_1.in_(select(SlotOrario.id).where(*ambito)),
+        )
+        if dry_run:
+            totale_rimossi += db.scalar(
+                select(func.count(ConflittoPrenotazione.id)).where(*obsoleti)
+            )
+        elif riconcilia:
+            totale_rimossi += db.execute(
+                update(ConflittoPrenotazione).where(*obsoleti)
+                .values(**_chiusura_riconciliazione())
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.commit()
+        else:
+            totale_rimossi += db.execute(
+                delete(ConflittoPrenotazione).where(*obsoleti)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.commit()
+
+        print("📡 Lettura slot attivi in streaming...")
+        righe = lettura.execute(
+            select(
+                SlotOrario.id, SlotOrario.prenotazione_id, SlotOrario.aula_id,
+                SlotOrario.data, SlotOrario.ora_inizio, SlotOrario.ora_fine,
+            )
+            .join(Prenotazione, SlotOrario.prenotazione_id == Prenotazione.id)
+            .where(
+                SlotOrario.annullato == False,
+                Prenotazione.stato.in_(STATI_ATTIVI),
+                *ambito,
+            )
+            .order_by(SlotOrario.aula_id, SlotOrario.data, SlotOrario.ora_inizio)
+        )
+
+        for _, slots in _finestre_aula_giorno(righe):
+            totale_finestre += 1
+            totale_slot += len(slots)
+            batch_slot_ids.extend(s.id for s in slots)
+            batch_righe.extend(
+                _riga_conflitto(a, b) for a, b in trova_sovrapposizioni(slots)
+            )
+            if len(batch_slot_ids) >= dimensione_batch:
+                scrivi_batch()
+        if batch_slot_ids:
+            scrivi_batch()
+
+        if not dry_run:
+            print("🚩 Aggiornamento flag conflitti (set-based)...")
+            ConflittoService.ricalcola_flag_conflitti(
+                db, select(SlotOrario.prenotazione_id).where(*ambito)
+            )
+            db.commit()
+
+        prefisso = "[DRY-RUN] " if dry_run else ""
+        print(f"\n📈 {prefisso}Riepilogo:")
+        print(f"   • Slot analizzati: {totale_slot} in {totale_finestre} finestre aula/giorno")
+        if riconcilia:
+            print(f"   • Conflitti invariati: {totale_invariati}")
+            print(f"   • Conflitti obsoleti chiusi: {totale_rimossi}")
+        else:
+            print(f"   • Conflitti non risolti rimossi: {totale_rimossi}")
+        print(f"   • Conflitti inseriti: {totale_inseriti}")
+
+    except Exception as e:
+        print(f"\n❌ Errore: {e}")
+        db.rollback()
+        raise
+    finally:
+        lettura.close()
+        db.close()
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rigenerazione conflitti tra slot")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Lettura in streaming e commit a batch (basso uso di memoria)")
+    parser.add_argument("--riconcilia", action="store_true",
+                        help="Inserisce le coppie mancanti e chiude le obsolete "
+                             "(attiva la lettura in streaming)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Con --streaming o --riconcilia: non scrive, mostra i conteggi")
+    parser.add_argument("--dal", type=date.fromisoformat, help="Data iniziale (YYYY-MM-DD)")
+    parser.add_argument("--al", type=date.fromisoformat, help="Data finale (YYYY-MM-DD)")
+    parser.add_argument("--sede", type=int, help="Limita alla sede indicata")
+    parser.add_argument("--batch", type=int, default=500, help="Slot per batch di commit")
+    args = parser.parse_args()
+    # La riconciliazione esiste solo nel motore in streaming
+    args.streaming = args.streaming or args.riconcilia
+    if not args.streaming and (args.dry_run or args.dal or args.al or args.sede):
+        parser.error("--dry-run, --dal, --al e --sede richiedono --streaming o --riconcilia")
+
     print("=" * 60)
     print("RIGENERAZIONE CONFLITTI - ICE Planning Aule")
     print("=" * 60)
-    rigenera_tutti_i_conflitti()
\ No newline at end of file
+    if args.streaming:
+        rigenera_conflitti_streaming(
+            dal=args.dal, al=args.al, sede_id=args.sede,
+            dry_run=args.dry_run, dimensione_batch=args.batch,
+            riconcilia=args.riconcilia,
+        )
+    else:
+        rigenera_tutti_i_conflitti()
@@ -1,10 +1,12 @@
 """Router per la gestione delle aule."""
 
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional
-from backend.database import get_db
+from backend.database import get_async_db_lettura, get_db
 from backend.core.dependencies import get_utente_corrente, verifica_permesso
 from backend.core.dependencies import get_utente_corrente, require_coordinamento  # ← AGGIUNTO
 from backend.models.aula import Aula
@@ -40,16 +42,16 @@ class AulaUpdate(BaseModel):
 
 
 @router.get("/", response_model=list[AulaSchema], summary="Lista aule")
-def lista_aule(
+async def lista_aule(
     sede_id: Optional[int] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db_lettura),
     _: Utente = Depends(get_utente_corrente)
 ):
     """Restituisce le aule, opzionalmente filtrate per sede."""
-    query = db.query(Aula)
+    query = select(Aula)
     if sede_id:
-        query = query.filter(Aula.sede_id == sede_id)
-    return query.all()
+        query = query.where(Aula.sede_id == sede_id)
+    return (await db.scalars(query)).all()
 
 
 @router.post("/", response_model=AulaSchema, status_code=201, summary="Crea aula")
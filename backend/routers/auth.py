@@ -4,11 +4,14 @@ Router per l'autenticazione: login e informazioni sull'utente corrente.
 
 from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from backend.database import get_db
-from backend.core.security import verifica_password, crea_access_token
+from backend.core.security import (crea_access_token, hash_password_async,
+                                   richiede_rehash, verifica_password_async)
 from backend.core.dependencies import get_utente_corrente
+from backend.core.cache_utenti import cache_utenti
 from backend.models.utente import Utente
 from backend.schemas.auth import TokenResponse
 from backend.schemas.utente import UtenteRisposta
@@ -16,8 +19,17 @@ from backend.schemas.utente import UtenteRisposta
 router = APIRouter(prefix="/auth", tags=["Autenticazione"])
 
 
+def _cerca_utente(db: Session, email: str):
+    return db.query(Utente).filter(Utente.email == email).first()
+
+
+def _salva_accesso(db: Session, utente: Utente) -> None:
+    db.commit()
+    db.refresh(utente)
+
+
 @router.post("/login", response_model=TokenResponse, summary="Login utente")
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
@@ -25,12 +37,15 @@ def login(
     Autentica un utente e restituisce un token JWT.
     - **username**: email dell'utente
     - **password**: password in chiaro
+
+    Handler async: le query girano nel threadpool, bcrypt sul pool dedicato
+    (core.security), così i login in attesa non occupano thread.
     """
     # Cerca l'utente per email
-    utente = db.query(Utente).filter(Utente.email == form_data.username).first()
+    utente = await run_in_threadpool(_cerca_utente, db, form_data.username)
 
     # Verifica credenziali (messaggio generico per sicurezza)
-    if not utente or not verifica_password(form_data.password, utente.password_hash):
+    if not utente or not await verifica_password_async(form_data.password, utente.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email o password non corretti",
@@ -43,9 +58,13 @@ def login(
             detail="Account disattivato"
         )
 
-    # Aggiorna l'ultimo accesso
+    # Aggiorna l'ultimo accesso; se bcrypt_rounds è cambiato rigenera l'hash
+    # ora che la password in chiaro è disponibile e verificata
     utente.ultimo_accesso = datetime.utcnow()
-    db.commit()
+    if richiede_rehash(utente.password_hash):
+        utente.password_hash = await hash_password_async(form_data.password)
+    await run_in_threadpool(_salva_accesso, db, utente)
+    cache_utenti.invalida(utente.email)
 
     # Genera il token JWT con email e ruolo nel payload
     token = crea_access_token(dati={
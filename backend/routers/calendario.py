@@ -0,0 +1,60 @@
+"""
+Router per il feed del calendario.
+Restituisce gli slot di una finestra di date già uniti ad aule, corsi e
+docenti, in formato compatto (colonne + righe) oppure NDJSON.
+"""
+
+import json
+from datetime import date
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from backend.database import get_db_lettura
+from backend.core.dependencies import get_utente_corrente
+from backend.models.utente import Utente
+from backend.models.enums import StatoPrenotazione
+from backend.services.calendario_service import (COLONNE, righe_calendario,
+                                                  stream_righe_calendario)
+
+router = APIRouter(prefix="/calendario", tags=["Calendario"])
+
+
+@router.get("/", summary="Feed slot per il calendario")
+def feed_calendario(
+    data_dal: date,
+    data_al:  date,
+    sede_id:  Optional[int] = None,
+    aula_id:  Optional[int] = None,
+    stato:    Optional[list[StatoPrenotazione]] = Query(None),
+    formato:  Literal["compatto", "ndjson"] = "compatto",
+    db:       Session = Depends(get_db_lettura),
+    utente:   Utente  = Depends(get_utente_corrente),
+):
+    """
+    Slot non annullati tra data_dal e data_al, ordinati per data, ora di
+    inizio e aula. Ogni riga riporta nome aula, codice/titolo corso e nome
+    docente, e `ha_conflitti` se lo slot è in un conflitto aperto. Le
+    occorrenze da regola non ancora materializzate hanno `slot_id` null.
+
+    - `formato=compatto` (default): `{"colonne": [...], "righe": [[...], ...]}`
+    - `formato=ndjson`: un oggetto JSON per riga (application/x-ndjson)
+    """
+    try:
+        if formato == "ndjson":
+            righe = stream_righe_calendario(db, data_dal, data_al, sede_id, aula_id, stato)
+        else:
+            righe = righe_calendario(db, data_dal, data_al, sede_id, aula_id, stato)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if formato == "ndjson":
+        # La sessione della dipendenza resta aperta fino alla fine della risposta
+        def genera():
+            for riga in righe:
+                yield json.dumps(dict(zip(COLONNE, riga)), ensure_ascii=False) + "\n"
+        return StreamingResponse(genera(), media_type="application/x-ndjson")
+
+    return {"colonne": COLONNE, "righe": righe}
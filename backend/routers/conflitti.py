@@ -2,75 +2,102 @@
 Router per la gestione dei conflitti tra prenotazioni.
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+import base64
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
 from typing import Optional
 
-from backend.database import get_db
+from backend.database import get_async_db_lettura, get_db, get_db_lettura
 from backend.core.dependencies import get_utente_corrente, require_coordinamento
 from backend.models.utente import Utente
 from backend.models.conflitto import ConflittoPrenotazione
-from backend.services.conflitti_service import ConflittoService
-from backend.models.enums import RuoloUtente, StatoRisoluzioneConflitto
+from backend.services.conflitti_service import (CAMPI_SLOT_ESPANSI, ESPANSIONI_CONFLITTI,
+                                                ConflittoService)
+from backend.schemas.prenotazione import RisoluzioneBloccoInput
 
 router = APIRouter(prefix="/conflitti", tags=["Conflitti"])
 
 
+def _codifica_cursore(conflitto_id: int) -> str:
+    """Cursore opaco di paginazione keyset sull'id del conflitto."""
+    return base64.urlsafe_b64encode(str(conflitto_id).encode()).decode()
+
+
+def _decodifica_cursore(cursore: str) -> int:
+    try:
+        return int(base64.urlsafe_b64decode(cursore.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Cursore di paginazione non valido")
+
+
+def _slot_espanso(m, lato: int, espansioni: set[str]) -> dict:
+    """Slot di un lato del conflitto dalle colonne di espandi_query_lista."""
+    slot = {c: m[f"{c}_{lato}"] for c in CAMPI_SLOT_ESPANSI}
+    slot.update({
+        "richiedente_id":              m[f"richiedente_id_{lato}"],
+        "richiedente":                 " ".join(filter(None, (m[f"richiedente_nome_{lato}"],
+                                                              m[f"richiedente_cognome_{lato}"]))) or None,
+        "data_creazione_prenotazione": m[f"data_creazione_prenotazione_{lato}"],
+        "docente":                     " ".join(filter(None, (m[f"docente_nome_{lato}"],
+                                                              m[f"docente_cognome_{lato}"]))) or None,
+    })
+    if "aule" in espansioni:
+        slot["aula"] = ({"id": slot["aula_id"], "nome": m[f"aula_nome_{lato}"],
+                         "sede_id": m[f"aula_sede_id_{lato}"]}
+                        if slot["aula_id"] is not None else None)
+    if "corsi" in espansioni:
+        slot["corso"] = ({"id": slot["corso_id"], "codice": m[f"corso_codice_{lato}"],
+                          "titolo": m[f"corso_titolo_{lato}"]}
+                         if slot["corso_id"] is not None else None)
+    return slot
+
+
 @router.get("/", summary="Lista conflitti")
-def lista_conflitti(
+async def lista_conflitti(
+    response: Response,
     sede_id: Optional[int] = None,
     solo_attivi: bool = True,
-    db: Session = Depends(get_db),
+    limite: Optional[int] = Query(None, ge=1, le=500),
+    cursore: Optional[str] = None,
+    expand: Optional[str] = Query(None, description="slots,aule,corsi separati da virgola"),
+    db: AsyncSession = Depends(get_async_db_lettura),
     utente: Utente = Depends(get_utente_corrente)
 ):
-    from backend.models.prenotazione import Prenotazione
-    from backend.models.aula import Aula
-
-    print(f"DEBUG: utente.id={utente.id} ruolo={utente.ruolo} solo_attivi={solo_attivi}")
-
-    if solo_attivi:
-        query = db.query(ConflittoPrenotazione).filter(
-            ConflittoPrenotazione.stato_risoluzione == None
-        )
-    else:
-        query = db.query(ConflittoPrenotazione)
-
-    if sede_id and utente.ruolo == RuoloUtente.COORDINAMENTO:
-        from backend.models.slot_orario import SlotOrario
-        query = (
-            query
-            .join(SlotOrario, ConflittoPrenotazione.slot_id_1 == SlotOrario.id)
-            .join(Aula, SlotOrario.aula_id == Aula.id)
-            .filter(Aula.sede_id == sede_id)
-        )
-
-    if utente.ruolo == RuoloUtente.OPERATIVO:
-        mie_pren_ids = [
-            r[0] for r in db.query(Prenotazione.id).filter(
-                Prenotazione.richiedente_id == utente.id
-            ).all()
-        ]
-        print(f"DEBUG OPERATIVO: mie_pren_ids={mie_pren_ids}")
-
-        tutti = db.query(ConflittoPrenotazione).filter(
-            ConflittoPrenotazione.stato_risoluzione == None
-        ).all()
-        print(f"DEBUG: tutti conflitti attivi={[(c.id, c.prenotazione_id_1, c.prenotazione_id_2) for c in tutti]}")
-
-        query = query.filter(
-            or_(
-                ConflittoPrenotazione.prenotazione_id_1.in_(mie_pren_ids),
-                ConflittoPrenotazione.prenotazione_id_2.in_(mie_pren_ids),
-            )
-        )
-        print(f"DEBUG: conflitti dopo filtro={query.count()}")
-
-    conflitti = query.all()
-    print(f"DEBUG: conflitti restituiti={len(conflitti)}")
-
-    return [
-        {
+    """
+    Conflitti visibili all'utente in ordine di id, con una sola query
+    (vedi ConflittoService.query_lista).
+    Con `limite` la risposta contiene al massimo `limite` elementi e, se ce
+    ne sono altri, l'header `X-Next-Cursor` da ripassare come `cursore`.
+    Con `expand` ogni conflitto include `slot_1` e `slot_2` (orari, docente,
+    richiedente; `aule` e `corsi` aggiungono aula e corso) nella stessa query.
+    """
+    espansioni = set()
+    if expand:
+        espansioni = {e.strip() for e in expand.split(",") if e.strip()}
+        sconosciute = espansioni - set(ESPANSIONI_CONFLITTI)
+        if sconosciute:
+            raise HTTPException(status_code=400,
+                                detail=f"Espansioni non valide: {', '.join(sorted(sconosciute))}")
+
+    query = ConflittoService.query_lista(utente, sede_id, solo_attivi)
+    if cursore:
+        query = query.where(ConflittoPrenotazione.id > _decodifica_cursore(cursore))
+    query = query.order_by(ConflittoPrenotazione.id)
+    if espansioni:
+        query = ConflittoService.espandi_query_lista(query, espansioni)
+    if limite:
+        query = query.limit(limite + 1)
+
+    righe = (await db.execute(query)).all()
+    if limite and len(righe) > limite:
+        righe = righe[:limite]
+        response.headers["X-Next-Cursor"] = _codifica_cursore(righe[-1][0].id)
+
+    risultato = []
+    for riga in righe:
+        c = riga[0]
+        conflitto = {
             "id": c.id,
             "prenotazione_id_1": c.prenotazione_id_1,
             "prenotazione_id_2": c.prenotazione_id_2,
@@ -81,46 +108,31 @@ def lista_conflitti(
             "rilevato_il": c.rilevato_il,
             "risolto_il": c.risolto_il,
         }
-        for c in conflitti
-    ]
+        if espansioni:
+            conflitto["slot_1"] = _slot_espanso(riga._mapping, 1, espansioni)
+            conflitto["slot_2"] = _slot_espanso(riga._mapping, 2, espansioni)
+        risultato.append(conflitto)
+    return risultato
 
 
 @router.get("/stats/summary", summary="Statistiche conflitti")
 def statistiche_conflitti(
     sede_id: Optional[int] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db_lettura),
     utente: Utente = Depends(require_coordinamento)
 ):
-    query = db.query(ConflittoPrenotazione)
-
-    if sede_id:
-        from backend.models.slot_orario import SlotOrario
-        from backend.models.aula import Aula
-        query = (
-            query
-            .join(SlotOrario, ConflittoPrenotazione.slot_id_1 == SlotOrario.id)
-            .join(Aula, SlotOrario.aula_id == Aula.id)
-            .filter(Aula.sede_id == sede_id)
-        )
-
-    totali = query.count()
-    attivi = query.filter(
-        ConflittoPrenotazione.stato_risoluzione == None
-    ).count()
-    risolti = totali - attivi
-
-    return {
-        "totali": totali,
-        "attivi": attivi,
-        "risolti": risolti,
-        "percentuale_risolti": (risolti / totali * 100) if totali > 0 else 0
-    }
+    """
+    Totali, ripartizioni per sede, aula, tipo, esito e settimana di
+    rilevamento e percentili della latenza di risoluzione, calcolati con
+    un'unica query aggregata (vedi ConflittoService.statistiche).
+    """
+    return ConflittoService.statistiche(db, sede_id)
 
 
 @router.get("/{conflitto_id}", summary="Dettaglio conflitto")
 def dettaglio_conflitto(
     conflitto_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db_lettura),
     utente: Utente = Depends(require_coordinamento)
 ):
     conflitto = db.query(ConflittoPrenotazione).filter(
@@ -172,4 +184,25 @@ def risolvi_conflitto(
         }
     except ValueError as e:
         db.rollback()
-        raise HTTPException(400, str(e))
\ No newline at end of file
+        raise HTTPException(400, str(e))
+
+@router.post("/risolvi", summary="Risolvi conflitti in blocco")
+def risolvi_conflitti_in_blocco(
+    dati: RisoluzioneBloccoInput,
+    db: Session = Depends(get_db),
+    utente: Utente = Depends(require_coordinamento)
+):
+    """
+    Applica in un'unica transazione un elenco di decisioni (conflitto_id,
+    azione) oppure una politica (mantieni_meno_recente,
+    mantieni_corso_prioritario) ai conflitti attivi di una sede/periodo
+    (obbligatori la sede o entrambe le date). Un conflitto ripetuto in
+    `azioni` dà 400. In caso di errore nessun conflitto viene risolto.
+    """
+    try:
+        esito = ConflittoService.risolvi_in_blocco(db, utente.id, dati)
+        db.commit()
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(400, str(e))
+    return {"ok": True, **esito}
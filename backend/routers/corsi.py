@@ -4,10 +4,12 @@ Tutti gli utenti autenticati possono consultare i corsi.
 """
 
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Optional
 
-from backend.database import get_db
+from backend.database import get_async_db_lettura, get_db_lettura
 from backend.core.dependencies import get_utente_corrente
 from backend.models.utente import Utente
 from backend.models.corso import Corso
@@ -16,24 +18,24 @@ router = APIRouter(prefix="/corsi", tags=["Corsi"])
 
 
 @router.get("/", summary="Lista corsi")
-def lista_corsi(
+async def lista_corsi(
     sede_id:  Optional[int]  = None,
     attivo:   Optional[bool] = None,
-    db:       Session        = Depends(get_db),
+    db:       AsyncSession   = Depends(get_async_db_lettura),
     utente:   Utente         = Depends(get_utente_corrente),
 ):
     """
     Restituisce la lista dei corsi.
     Filtri opzionali: sede_id, attivo.
     """
-    query = db.query(Corso)
+    query = select(Corso)
 
     if sede_id is not None:
-        query = query.filter(Corso.sede_id == sede_id)
+        query = query.where(Corso.sede_id == sede_id)
     if attivo is not None:
-        query = query.filter(Corso.attivo == attivo)
+        query = query.where(Corso.attivo == attivo)
 
-    corsi = query.order_by(Corso.data_inizio_corso.desc()).all()
+    corsi = (await db.scalars(query.order_by(Corso.data_inizio_corso.desc()))).all()
 
     return [
         {
@@ -54,7 +56,7 @@ def lista_corsi(
 @router.get("/{corso_id}", summary="Dettaglio corso")
 def dettaglio_corso(
     corso_id: int,
-    db:       Session = Depends(get_db),
+    db:       Session = Depends(get_db_lettura),
     utente:   Utente  = Depends(get_utente_corrente),
 ):
     """Dettaglio completo di un corso."""
@@ -3,8 +3,10 @@ Router API per la gestione dei docenti.
 """
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from backend.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from backend.database import get_async_db_lettura, get_db_lettura
 from backend.models.docente import Docente
 from backend.models.sede import Sede
 from backend.schemas.docente import DocenteSchema
@@ -14,10 +16,10 @@ router = APIRouter(prefix="/docenti", tags=["Docenti"])
 
 
 @router.get("/", response_model=List[DocenteSchema])
-def get_docenti(
+async def get_docenti(
     sede_id: Optional[int] = Query(None, description="Filtra docenti per sede"),
     attivi: bool = Query(True, description="Mostra solo docenti attivi"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db_lettura),
     current_user = Depends(get_utente_corrente)
 ):
     """
@@ -26,21 +28,22 @@ def get_docenti(
     - **sede_id**: Filtra docenti che operano nella sede specificata
     - **attivi**: Se True mostra solo docenti con ore_di_incarico > ore_svolte
     """
-    query = db.query(Docente)
+    # Le sedi del docente fanno parte della risposta: caricate in blocco
+    query = select(Docente).options(selectinload(Docente.sedi))
     
     # Filtro per sede (tramite relazione many-to-many docente_sedi)
     if sede_id:
-        query = query.join(Docente.sedi).filter(Sede.id == sede_id)
+        query = query.join(Docente.sedi).where(Sede.id == sede_id)
     
     # Filtro per docenti attivi (hanno ancora ore disponibili)
     if attivi:
-        query = query.filter(
+        query = query.where(
             (Docente.ore_di_incarico == None) | 
             (Docente.ore_di_incarico > Docente.ore_svolte)
         )
     
     # Ordina per cognome, nome
-    docenti = query.order_by(Docente.cognome, Docente.nome).all()
+    docenti = (await db.scalars(query.order_by(Docente.cognome, Docente.nome))).all()
     
     return docenti
 
@@ -48,7 +51,7 @@ def get_docenti(
 @router.get("/{docente_id}", response_model=DocenteSchema)
 def get_docente(
     docente_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db_lettura),
     current_user = Depends(get_utente_corrente)
 ):
     """
@@ -2,12 +2,15 @@
 Router per la gestione delle prenotazioni aule - Sistema 2 RUOLI
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_
+import base64
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import and_, or_, select
 from sqlalchemy.exc import IntegrityError  # ← AGGIUNTO
 from pydantic import BaseModel
-from backend.database import get_db
+from backend.database import get_async_db_lettura, get_db, get_db_lettura
 from backend.core.dependencies import get_utente_corrente, verifica_permesso
 from backend.models.utente import Utente
 from backend.models.prenotazione import Prenotazione, RichiestaPrenotazione
@@ -18,15 +21,23 @@ from backend.models.enums import StatoPrenotazione, StatoRichiesta, RuoloUtente,
 from backend.schemas.prenotazione import (
     PrenotazioneSingolaInput,
     PrenotazioneMassivaInput,
-    PrenotazioneRisposta
+    PrenotazioneRisposta,
+    PrenotazioneCreataRisposta,
+    ConflittoRilevato,
+    RichiestaEmbedded,
+    SlotOrarioSchema,
 )
+from backend.services.anteprima_service import calcola_anteprima
 from backend.services.booking_service import (
     crea_prenotazione_singola,
     crea_prenotazione_massiva
 )
-from backend.services.conflitti_service import ConflittoService
+from backend.services.conflitti_service import ConflittoService, adesso_utc
+from backend.services.disponibilita_service import aule_della_sede, calcola_slot_liberi
+from backend.services.occupazione_service import aggiorna_occupazione, blocca_aule, chiavi_slot
+from backend.services.regole_service import espandi_regole, ha_occorrenze_future
 from datetime import date, time, datetime, timezone
-from typing import Optional
+from typing import Optional, Union
 
 router = APIRouter(prefix="/prenotazioni", tags=["Prenotazioni"])
 
@@ -40,7 +51,21 @@ class SlotModificaInput(BaseModel):
     note:       Optional[str]  = None
 
 
-@router.post("/singola", response_model=PrenotazioneRisposta, status_code=201,
+def _risposta_creazione(
+    prenotazione: Prenotazione,
+    conflitti: list[ConflittoRilevato],
+) -> PrenotazioneCreataRisposta:
+    """Prenotazione appena creata con i conflitti rilevati, senza riletture."""
+    risposta = PrenotazioneCreataRisposta.model_validate(prenotazione)
+    risposta.conflitti_rilevati = conflitti
+    risposta.prenotazioni_in_conflitto = sorted({
+        c.prenotazione_id_2 if c.prenotazione_id_1 == prenotazione.id else c.prenotazione_id_1
+        for c in conflitti
+    } - {prenotazione.id})
+    return risposta
+
+
+@router.post("/singola", response_model=PrenotazioneCreataRisposta, status_code=201,
              summary="Crea prenotazione singola")
 def nuova_prenotazione_singola(
     dati: PrenotazioneSingolaInput,
@@ -58,9 +83,11 @@ def nuova_prenotazione_singola(
             data_gestione=datetime.now(timezone.utc)
         )
         db.add(richiesta)
+        # Serializzati prima del commit, che scadrebbe gli oggetti
+        rilevati = [ConflittoRilevato.model_validate(c) for c in conflitti]
         db.commit()
         db.refresh(prenotazione)
-        return prenotazione
+        return _risposta_creazione(prenotazione, rilevati)
     except IntegrityError as e:
         db.rollback()
         error_msg = str(e.orig) if hasattr(e, 'orig') else str(e)
@@ -89,7 +116,7 @@ def nuova_prenotazione_singola(
         raise
 
 
-@router.post("/massiva", response_model=PrenotazioneRisposta, status_code=201,
+@router.post("/massiva", response_model=PrenotazioneCreataRisposta, status_code=201,
              summary="Crea Prenotazione massiva")
 def nuova_prenotazione_massiva(
     dati: PrenotazioneMassivaInput,
@@ -97,8 +124,8 @@ def nuova_prenotazione_massiva(
     utente: Utente = Depends(verifica_permesso("prenotazione:richiedere"))
 ):
     try:
-        prenotazione, _ = crea_prenotazione_massiva(db, dati, utente)
-        conflitti = ConflittoService.detect_and_record_conflicts(db, prenotazione)
+        prenotazione, slots = crea_prenotazione_massiva(db, dati, utente)
+        conflitti = ConflittoService.detect_and_record_conflicts(db, prenotazione, slots)
         richiesta = RichiestaPrenotazione(
             prenotazione_id=prenotazione.id,
             stato=StatoRichiesta.APPROVATA,
@@ -107,9 +134,11 @@ def nuova_prenotazione_massiva(
             data_gestione=datetime.now(timezone.utc)
         )
         db.add(richiesta)
+        # Serializzati prima del commit, che scadrebbe gli oggetti
+        rilevati = [ConflittoRilevato.model_validate(c) for c in conflitti]
         db.commit()
         db.refresh(prenotazione)
-        return prenotazione
+        return _risposta_creazione(prenotazione, rilevati)
     except IntegrityError as e:
         db.rollback()
         error_msg = str(e.orig) if hasattr(e, 'orig') else str(e)
@@ -138,78 +167,191 @@ def nuova_prenotazione_massiva(
         raise
 
 
+@router.post("/anteprima", summary="Anteprima conflitti senza salvare")
+def anteprima_prenotazione(
+    dati: Union[PrenotazioneMassivaInput, PrenotazioneSingolaInput],
+    db: Session = Depends(get_db),
+    _: Utente = Depends(verifica_permesso("prenotazione:richiedere"))
+):
+    """
+    Verifica una prenotazione singola o massiva (stesso payload della
+    creazione) senza scrivere nulla: per ogni data riporta gli slot in
+    conflitto e, dove serve, orari liberi nella stessa aula e aule libere
+    della stessa sede allo stesso orario.
+    """
+    return calcola_anteprima(db, dati)
+
+
+@router.get("/slot-liberi", summary="Slot liberi per più aule o per sede")
+async def slot_liberi_aule(
+    data_dal: date,
+    data_al: date,
+    aula_id: Optional[list[int]] = Query(None),
+    sede_id: Optional[int] = None,
+    durata_minima: int = Query(0, ge=0, description="Durata minima in minuti"),
+    ora_apertura: Optional[time] = None,
+    ora_chiusura: Optional[time] = None,
+    db: AsyncSession = Depends(get_async_db_lettura),
+    _: Utente = Depends(verifica_permesso("aula:vedere_slot_liberi"))
+):
+    """
+    Intervalli liberi per giorno di più aule (`aula_id` ripetibile) o di
+    tutte le aule attive di una sede. Orario di apertura da configurazione,
+    sovrascrivibile con ora_apertura / ora_chiusura.
+    """
+    aula_ids = list(dict.fromkeys(aula_id or []))
+    if sede_id:
+        aula_ids += [a for a in await db.run_sync(aule_della_sede, sede_id) if a not in aula_ids]
+    if not aula_ids:
+        raise HTTPException(status_code=400, detail="Indicare almeno un'aula o una sede")
+    try:
+        return await db.run_sync(calcola_slot_liberi, aula_ids, data_dal, data_al,
+                                 durata_minima, ora_apertura, ora_chiusura)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/slot-liberi/{aula_id}", summary="Slot liberi per aula")
-def slot_liberi(
+async def slot_liberi(
     aula_id: int,
     data_dal: date,
     data_al: date,
-    db: Session = Depends(get_db),
+    durata_minima: int = Query(0, ge=0, description="Durata minima in minuti"),
+    ora_apertura: Optional[time] = None,
+    ora_chiusura: Optional[time] = None,
+    db: AsyncSession = Depends(get_async_db_lettura),
     _: Utente = Depends(verifica_permesso("aula:vedere_slot_liberi"))
 ):
-    slot_occupati = (
-        db.query(SlotOrario)
-        .join(Prenotazione)
-        .filter(
-            SlotOrario.aula_id == aula_id,
-            Prenotazione.stato.in_([
-                StatoPrenotazione.CONFERMATA,
-                StatoPrenotazione.IN_ATTESA,
-                StatoPrenotazione.CONFLITTO,
-            ]),
-            SlotOrario.data >= data_dal,
-            SlotOrario.data <= data_al,
-            SlotOrario.annullato == False,
-        )
-        .all()
-    )
-    return [{
-        "data": s.data,
-        "ora_inizio": s.ora_inizio,
-        "ora_fine": s.ora_fine,
-        "prenotazione_id": s.prenotazione_id,
-    } for s in slot_occupati]
+    """Intervalli liberi per giorno: [{"data", "liberi": [["08:00", "10:00"], ...]}]."""
+    try:
+        giorni = await db.run_sync(calcola_slot_liberi, [aula_id], data_dal, data_al,
+                                   durata_minima, ora_apertura, ora_chiusura)
+        return giorni[0]["giorni"]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+CAMPI_PRENOTAZIONE = list(PrenotazioneRisposta.model_fields)
 
 
-@router.get("/", response_model=list[PrenotazioneRisposta],
-            summary="Lista prenotazioni")
-def lista_prenotazioni(
+def _codifica_cursore(p: Prenotazione) -> str:
+    """Cursore opaco di paginazione keyset su (data_creazione, id)."""
+    grezzo = f"{p.data_creazione.isoformat()}|{p.id}"
+    return base64.urlsafe_b64encode(grezzo.encode()).decode()
+
+
+def _decodifica_cursore(cursore: str) -> tuple[datetime, int]:
+    try:
+        data_creazione, pren_id = base64.urlsafe_b64decode(cursore.encode()).decode().split("|")
+        return datetime.fromisoformat(data_creazione), int(pren_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Cursore di paginazione non valido")
+
+
+def _proietta(p: Prenotazione, campi: set[str]) -> dict:
+    """Serializza solo i campi richiesti, senza toccare relazioni escluse."""
+    dati = {}
+    for campo in (c for c in CAMPI_PRENOTAZIONE if c in campi):
+        if campo == "slots":
+            dati["slots"] = [SlotOrarioSchema.model_validate(s) for s in p.slots]
+        elif campo == "richiesta":
+            dati["richiesta"] = (RichiestaEmbedded.model_validate(p.richiesta)
+                                 if p.richiesta else None)
+        else:
+            dati[campo] = getattr(p, campo)
+    return jsonable_encoder(dati)
+
+
+@router.get("/", summary="Lista prenotazioni",
+            responses={200: {"model": list[PrenotazioneRisposta]}})
+async def lista_prenotazioni(
+    response: Response,
     sede_id:  Optional[int]              = None,
     corso_id: Optional[int]              = None,
     stato:    Optional[StatoPrenotazione] = None,
     data_dal: Optional[date]             = None,
     data_al:  Optional[date]             = None,
-    db: Session = Depends(get_db),
+    limite:   int                        = Query(100, ge=1, le=500),
+    cursore:  Optional[str]              = None,
+    fields:   Optional[str]              = Query(None, description="Campi separati da virgola"),
+    include_slots: bool                  = True,
+    solo_slot_nel_range: bool            = Query(False, description="Limita gli slot inclusi a data_dal/data_al"),
+    db: AsyncSession = Depends(get_async_db_lettura),
     utente: Utente = Depends(get_utente_corrente)
 ):
-    query = db.query(Prenotazione).options(
-        joinedload(Prenotazione.richiesta),
-        joinedload(Prenotazione.slots),
-    )
+    """
+    Lista prenotazioni ordinate per data di creazione (più recenti prima).
+
+    - Paginazione keyset: la risposta contiene al massimo `limite`
+      elementi (100 se non indicato) e, se ce ne sono altri, l'header
+      `X-Next-Cursor` da ripassare come `cursore` per la pagina successiva
+    - Proiezione: `fields=id,stato,slots` e `include_slots=false` riducono
+      il payload; le relazioni escluse non vengono caricate
+    - `solo_slot_nel_range=true` include solo gli slot tra data_dal e data_al
+    """
+    campi = set(CAMPI_PRENOTAZIONE)
+    if fields:
+        campi = {f.strip() for f in fields.split(",") if f.strip()}
+        sconosciuti = campi - set(CAMPI_PRENOTAZIONE)
+        if sconosciuti:
+            raise HTTPException(status_code=400,
+                                detail=f"Campi non validi: {', '.join(sorted(sconosciuti))}")
+    if not include_slots:
+        campi = campi - {"slots"}
+
+    opzioni = []
+    if "richiesta" in campi:
+        opzioni.append(selectinload(Prenotazione.richiesta))
+    if "slots" in campi:
+        relazione_slot = Prenotazione.slots
+        if solo_slot_nel_range and (data_dal or data_al):
+            criteri = []
+            if data_dal:
+                criteri.append(SlotOrario.data >= data_dal)
+            if data_al:
+                criteri.append(SlotOrario.data <= data_al)
+            relazione_slot = Prenotazione.slots.and_(*criteri)
+        opzioni.append(selectinload(relazione_slot))
+    query = select(Prenotazione).options(*opzioni)
 
     if stato:
-        query = query.filter(Prenotazione.stato == stato)
+        query = query.where(Prenotazione.stato == stato)
 
     if sede_id or corso_id or data_dal or data_al:
-        slot_subq = db.query(SlotOrario.prenotazione_id)
+        slot_subq = select(SlotOrario.prenotazione_id)
         if sede_id:
             slot_subq = slot_subq.join(Aula, SlotOrario.aula_id == Aula.id)\
-                                  .filter(Aula.sede_id == sede_id)
+                                  .where(Aula.sede_id == sede_id)
         if corso_id:
-            slot_subq = slot_subq.filter(SlotOrario.corso_id == corso_id)
+            slot_subq = slot_subq.where(SlotOrario.corso_id == corso_id)
         if data_dal:
-            slot_subq = slot_subq.filter(SlotOrario.data >= data_dal)
+            slot_subq = slot_subq.where(SlotOrario.data >= data_dal)
         if data_al:
-            slot_subq = slot_subq.filter(SlotOrario.data <= data_al)
-        query = query.filter(Prenotazione.id.in_(slot_subq))
+            slot_subq = slot_subq.where(SlotOrario.data <= data_al)
+        query = query.where(Prenotazione.id.in_(slot_subq))
+
+    if cursore:
+        data_creazione, pren_id = _decodifica_cursore(cursore)
+        query = query.where(or_(
+            Prenotazione.data_creazione < data_creazione,
+            and_(Prenotazione.data_creazione == data_creazione,
+                 Prenotazione.id < pren_id),
+        ))
+
+    query = query.order_by(Prenotazione.data_creazione.desc(), Prenotazione.id.desc())
+    prenotazioni = (await db.scalars(query.limit(limite + 1))).all()
+    if len(prenotazioni) > limite:
+        prenotazioni = prenotazioni[:limite]
+        response.headers["X-Next-Cursor"] = _codifica_cursore(prenotazioni[-1])
 
-    return query.order_by(Prenotazione.data_creazione.desc()).all()
+    return [_proietta(p, campi) for p in prenotazioni]
 
 
 @router.get("/{prenotazione_id}", response_model=PrenotazioneRisposta,
             summary="Dettaglio prenotazione")
 def dettaglio_prenotazione(
     prenotazione_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db_lettura),
     utente: Utente = Depends(get_utente_corrente)
 ):
     p = (
@@ -245,9 +387,12 @@ def elimina_prenotazione(
     richiesta = db.query(RichiestaPrenotazione).filter(
         RichiestaPrenotazione.prenotazione_id == prenotazione_id
     ).first()
+    chiavi = chiavi_slot(prenotazione.slots)
+    blocca_aule(db, (aula_id for aula_id, _ in chiavi))
     if richiesta:
         db.delete(richiesta)
     db.delete(prenotazione)
+    aggiorna_occupazione(db, chiavi)
     db.commit()
     return {"message": f"Prenotazione {prenotazione_id} eliminata con successo"}
 
@@ -287,6 +432,8 @@ def modifica_slot(
     if slot.annullato:
         raise HTTPException(status_code=400, detail="Impossibile modificare uno slot annullato")
 
+    blocca_aule(db, {slot.aula_id, dati.aula_id or slot.aula_id})
+    chiavi = {(slot.aula_id, slot.data)}
     if dati.aula_id    is not None: slot.aula_id    = dati.aula_id
     if dati.corso_id   is not None: slot.corso_id   = dati.corso_id
     if dati.note       is not None: slot.note       = dati.note
@@ -295,6 +442,8 @@ def modifica_slot(
     if dati.ora_fine   is not None: slot.ora_fine   = dati.ora_fine
 
     db.flush()
+    chiavi.add((slot.aula_id, slot.data))
+    aggiorna_occupazione(db, chiavi)
 
     # Chiudi i conflitti esistenti su questo slot prima di ricalcolare
     conflitti_esistenti = db.query(ConflittoPrenotazione).filter(
@@ -313,11 +462,12 @@ def modifica_slot(
             else cf.prenotazione_id_1
         )
         altre_pren_ids.add(altra_id)
-        cf.stato_risoluzione = StatoRisoluzioneConflitto.RISOLTO_MANTENUTA_1
-        cf.risolto_il = datetime.now(timezone.utc)
+        cf.stato_risoluzione = StatoRisoluzioneConflitto.CHIUSO_AUTOMATICAMENTE
+        cf.risolto_il = adesso_utc()
         cf.note_risoluzione = "Chiuso automaticamente per modifica slot"
 
     db.flush()
+    espandi_regole(db, slot.data, [slot.aula_id])
 
     # ── CHIAVE: expire_all + re-fetch ─────────────────────────────────────────
     # joinedload cacha i relationship in memoria — dopo flush() i valori
@@ -332,13 +482,10 @@ def modifica_slot(
         .first()
     )
 
-    # Ricalcola conflitti con i nuovi dati dello slot
-    conflitti = ConflittoService.detect_and_record_conflicts(db, prenotazione)
-    if prenotazione.richiesta:
-        prenotazione.richiesta.ha_conflitti = len(conflitti) > 0
-
-    for altra_pren_id in altre_pren_ids:
-        ConflittoService._aggiorna_flag_conflitti(db, altra_pren_id)
+    # Ricalcola conflitti con i nuovi dati dello slot, poi i flag di questa
+    # prenotazione e delle altre coinvolte in un solo passaggio
+    ConflittoService.detect_and_record_conflicts(db, prenotazione)
+    ConflittoService.ricalcola_flag_conflitti(db, altre_pren_ids | {prenotazione_id})
 
     db.commit()
     db.refresh(prenotazione)
@@ -375,8 +522,10 @@ def annulla_slot(
     if slot.annullato:
         raise HTTPException(status_code=400, detail="Slot già annullato")
 
+    blocca_aule(db, [slot.aula_id])
     slot.annullato = True
     db.flush()
+    aggiorna_occupazione(db, {(slot.aula_id, slot.data)})
 
     # ← RACCOGLI CONFLITTI UNICI e altre prenotazioni coinvolte
     conflitti_slot = db.query(ConflittoPrenotazione).filter(
@@ -406,29 +555,24 @@ def annulla_slot(
         )
         altre_pren_ids.add(altra_id)
         
-        # Risolvi il conflitto
-        cf.stato_risoluzione = (
-            StatoRisoluzioneConflitto.RISOLTO_MANTENUTA_2
-            if cf.slot_id_1 == slot_id
-            else StatoRisoluzioneConflitto.RISOLTO_MANTENUTA_1
-        )
-        cf.risolto_il = datetime.now(timezone.utc)
+        # Chiudi il conflitto: lo slot annullato non occupa più l'aula
+        cf.stato_risoluzione = StatoRisoluzioneConflitto.CHIUSO_AUTOMATICAMENTE
+        cf.risolto_il = adesso_utc()
+        cf.note_risoluzione = "Chiuso automaticamente per annullamento slot"
 
     # ← FLUSH UNA SOLA VOLTA dopo aver processato tutti i conflitti
     db.flush()
 
-    # ← AGGIORNA FLAG CONFLITTI PER LE ALTRE PRENOTAZIONI
-    for altra_pren_id in altre_pren_ids:
-        ConflittoService._aggiorna_flag_conflitti(db, altra_pren_id)
-
     slot_attivi = [s for s in prenotazione.slots if not s.annullato]
 
-    if not slot_attivi:
+    # Con una regola ancora da espandere la prenotazione ha altre occorrenze
+    if not slot_attivi and not ha_occorrenze_future(prenotazione):
         richiesta = db.query(RichiestaPrenotazione).filter(
             RichiestaPrenotazione.prenotazione_id == prenotazione_id
         ).first()
         if richiesta:
             db.delete(richiesta)
+        ConflittoService.ricalcola_flag_conflitti(db, altre_pren_ids)
         db.delete(prenotazione)
         db.commit()
         return {
@@ -436,9 +580,9 @@ def annulla_slot(
             "prenotazione_eliminata": True,
         }
 
-    conflitti = ConflittoService.detect_and_record_conflicts(db, prenotazione)
-    if prenotazione.richiesta:
-        prenotazione.richiesta.ha_conflitti = len(conflitti) > 0
+    # Flag di questa prenotazione e delle altre coinvolte in un solo passaggio
+    ConflittoService.detect_and_record_conflicts(db, prenotazione)
+    ConflittoService.ricalcola_flag_conflitti(db, altre_pren_ids | {prenotazione_id})
 
     db.commit()
     return {
@@ -1,10 +1,12 @@
 """Router per la gestione delle sedi."""
 
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Optional
 from pydantic import BaseModel
-from backend.database import get_db
+from backend.database import get_async_db_lettura, get_db, get_db_lettura
 from backend.core.dependencies import get_utente_corrente, require_coordinamento
 from backend.models.sede import Sede
 from backend.models.utente import Utente
@@ -38,18 +40,18 @@ class SedeUpdate(BaseModel):
 
 
 @router.get("/", response_model=list[SedeSchema], summary="Lista sedi")
-def lista_sedi(
-    db: Session = Depends(get_db),
+async def lista_sedi(
+    db: AsyncSession = Depends(get_async_db_lettura),
     _: Utente = Depends(get_utente_corrente)
 ):
     """Restituisce tutte le sedi attive."""
-    return db.query(Sede).filter(Sede.attiva == 1).all()
+    return (await db.scalars(select(Sede).where(Sede.attiva == 1))).all()
 
 
 @router.get("/{sede_id}", response_model=SedeSchema, summary="Dettaglio sede")
 def dettaglio_sede(
     sede_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_db_lettura),
     _: Utente = Depends(get_utente_corrente)
 ):
     sede = db.query(Sede).filter(Sede.id == sede_id).first()
@@ -0,0 +1,26 @@
+"""
+Router per le metriche interne del backend (solo Coordinamento).
+"""
+
+from fastapi import APIRouter, Depends
+
+from backend.core.cache_utenti import cache_utenti
+from backend.core.dependencies import require_coordinamento
+from backend.core.security import pool_hash
+from backend.database import statistiche_pool
+from backend.models.utente import Utente
+
+router = APIRouter(prefix="/sistema", tags=["Sistema"])
+
+
+@router.get("/metriche", summary="Metriche di processo")
+def metriche(_: Utente = Depends(require_coordinamento)):
+    """
+    Contatori del processo che risponde: cache utenti, pool bcrypt e pool di
+    connessioni (in uso, overflow, attese e timeout del checkout).
+    """
+    return {
+        "cache_utenti": cache_utenti.statistiche(),
+        "pool_hash":    pool_hash.statistiche(),
+        "pool_db":      statistiche_pool(),
+    }
@@ -0,0 +1,43 @@
+"""
+Router per le statistiche di utilizzo delle aule.
+Le aggregazioni sono calcolate dal database: la risposta contiene solo
+una riga per gruppo, anche per finestre di un intero anno.
+"""
+
+from datetime import date
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from backend.database import get_db_lettura
+from backend.core.dependencies import get_utente_corrente
+from backend.models.utente import Utente
+from backend.models.enums import StatoPrenotazione
+from backend.services.statistiche_service import calcola_saturazione
+
+router = APIRouter(prefix="/statistiche", tags=["Statistiche"])
+
+
+@router.get("/saturazione", summary="Saturazione aule")
+def saturazione(
+    data_dal: date,
+    data_al:  date,
+    gruppo:   Literal["sede", "aula", "giorno", "settimana", "mese"] = "aula",
+    sede_id:  Optional[int] = None,
+    aula_id:  Optional[int] = None,
+    stato:    Optional[list[StatoPrenotazione]] = Query(None, description="Default: confermata"),
+    db:       Session = Depends(get_db_lettura),
+    utente:   Utente  = Depends(get_utente_corrente),
+):
+    """
+    Minuti prenotati, percentuale dell'orario di apertura utilizzata e
+    picco di slot contemporanei, raggruppati per sede, aula, giorno,
+    settimana (chiave = lunedì) o mese (chiave = AAAA-MM). Include le
+    occorrenze delle regole ricorrenti non ancora materializzate.
+    """
+    try:
+        righe = calcola_saturazione(db, data_dal, data_al, gruppo, sede_id, aula_id, stato)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"gruppo": gruppo, "data_dal": data_dal, "data_al": data_al, "righe": righe}
@@ -1,12 +1,14 @@
 """Router per la gestione degli utenti (solo Coordinamento)."""
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import Optional
 from pydantic import BaseModel, EmailStr
 from backend.database import get_db
-from backend.core.security import hash_password, verifica_password
+from backend.core.security import hash_password_async, verifica_password_async
 from backend.core.dependencies import require_coordinamento, get_utente_corrente
+from backend.core.cache_utenti import cache_utenti
 from backend.models.utente import Utente
 from backend.models.enums import RuoloUtente
 from backend.schemas.utente import UtenteCrea, UtenteRisposta
@@ -28,6 +30,19 @@ class CambioPasswordInput(BaseModel):
     nuova_password: str
     conferma_password: str
 
+
+def _cerca_per_email(db: Session, email: str) -> Optional[Utente]:
+    return db.query(Utente).filter(Utente.email == email).first()
+
+
+def _cerca_per_id(db: Session, utente_id: int) -> Optional[Utente]:
+    return db.query(Utente).filter(Utente.id == utente_id).first()
+
+
+def _salva(db: Session, utente: Utente) -> None:
+    db.commit()
+    db.refresh(utente)
+
 @router.get("/", response_model=list[UtenteRisposta], summary="Lista utenti")
 def lista_utenti(
     db: Session = Depends(get_db),
@@ -39,13 +54,16 @@ def lista_utenti(
 
 @router.post("/", response_model=UtenteRisposta, status_code=201,
              summary="Crea utente")
-def crea_utente(
+async def crea_utente(
     dati: UtenteCrea,
     db: Session = Depends(get_db),
     _: Utente = Depends(require_coordinamento)
 ):
-    """Crea un nuovo utente nel sistema (solo COORDINAMENTO)."""
-    esistente = db.query(Utente).filter(Utente.email == dati.email).first()
+    """
+    Crea un nuovo utente nel sistema (solo COORDINAMENTO).
+    Hash sul pool bcrypt, query e commit nel threadpool.
+    """
+    esistente = await run_in_threadpool(_cerca_per_email, db, dati.email)
     if esistente:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
@@ -56,24 +74,28 @@ def crea_utente(
         nome=dati.nome,
         cognome=dati.cognome,
         email=dati.email,
-        password_hash=hash_password(dati.password),
+        password_hash=await hash_password_async(dati.password),
         ruolo=dati.ruolo,
         sede_id=dati.sede_id,
         attivo=True,
     )
     db.add(utente)
-    db.commit()
-    db.refresh(utente)
+    await run_in_threadpool(_salva, db, utente)
     return utente
 
 @router.patch("/me/password", status_code=200, summary="Cambia la propria password")
-def cambia_password(
+async def cambia_password(
     dati: CambioPasswordInput,
     db: Session = Depends(get_db),
     utente: Utente = Depends(get_utente_corrente)
 ):
-    """Permette a qualsiasi utente autenticato di cambiare la propria password."""
-    if not verifica_password(dati.password_attuale, utente.password_hash):
+    """
+    Permette a qualsiasi utente autenticato di cambiare la propria password.
+    Verifica e nuovo hash sul pool bcrypt, commit nel threadpool.
+    L'hash attuale si rilegge dal database: la cache utenti non lo conserva.
+    """
+    await run_in_threadpool(db.refresh, utente, ["password_hash"])
+    if not await verifica_password_async(dati.password_attuale, utente.password_hash):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Password attuale non corretta"
@@ -88,12 +110,14 @@ def cambia_password(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="La nuova password deve essere di almeno 8 caratteri"
         )
-    utente.password_hash = hash_password(dati.nuova_password)
-    db.commit()
+    email = utente.email
+    utente.password_hash = await hash_password_async(dati.nuova_password)
+    await run_in_threadpool(db.commit)
+    cache_utenti.invalida(email)
     return {"detail": "Password aggiornata con successo"}
 
 @router.patch("/{utente_id}", response_model=UtenteRisposta, summary="Modifica utente")
-def modifica_utente(
+async def modifica_utente(
     utente_id: int,
     dati: UtenteModifica,
     db: Session = Depends(get_db),
@@ -102,14 +126,15 @@ def modifica_utente(
     """
     Aggiorna i dati di un utente esistente. Solo COORDINAMENTO.
     Tutti i campi sono opzionali — vengono aggiornati solo quelli presenti.
+    Hash sul pool bcrypt, query e commit nel threadpool.
     """
-    utente = db.query(Utente).filter(Utente.id == utente_id).first()
+    utente = await run_in_threadpool(_cerca_per_id, db, utente_id)
     if not utente:
         raise HTTPException(status_code=404, detail="Utente non trovato")
 
     # Verifica unicità email se viene cambiata
     if dati.email and dati.email != utente.email:
-        if db.query(Utente).filter(Utente.email == dati.email).first():
+        if await run_in_threadpool(_cerca_per_email, db, dati.email):
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
                 detail=f"Email '{dati.email}' già registrata"
@@ -117,6 +142,7 @@ def modifica_utente(
 
     # Usa model_dump(exclude_unset=True) per distinguere tra "campo non fornito" e "campo null"
     dati_dict = dati.model_dump(exclude_unset=True)
+    email_precedente = utente.email
 
     if 'nome' in dati_dict:
         utente.nome = dati.nome
@@ -129,10 +155,10 @@ def modifica_utente(
     if 'sede_id' in dati_dict:
         utente.sede_id = dati.sede_id
     if 'password' in dati_dict:
-        utente.password_hash = hash_password(dati.password)
+        utente.password_hash = await hash_password_async(dati.password)
 
-    db.commit()
-    db.refresh(utente)
+    await run_in_threadpool(_salva, db, utente)
+    cache_utenti.invalida(utente.email, email_precedente)
     return utente
 
 
@@ -162,6 +188,7 @@ def disattiva_utente(
 
     utente.attivo = False
     db.commit()
+    cache_utenti.invalida(utente.email)
     return {"detail": f"Utente '{utente.email}' disattivato con successo"}
 
 
@@ -183,4 +210,5 @@ def riattiva_utente(
 
     utente.attivo = True
     db.commit()
+    cache_utenti.invalida(utente.email)
     return {"detail": f"Utente '{utente.email}' riattivato con successo"}
\ No newline at end of file
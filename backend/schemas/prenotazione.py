@@ -1,9 +1,9 @@
 """Schema Pydantic per la gestione delle prenotazioni."""
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
 from datetime import date, time, datetime
-from typing import Optional, List
+from typing import Literal, Optional, List
 from backend.models.enums import (StatoPrenotazione, TipoPrenotazione,
-                                   TipoRicorrenza, StatoRichiesta)
+                                   TipoRicorrenza, StatoRichiesta, TipoConflitto)
 
 class SlotOrarioSchema(BaseModel):
     """Schema di risposta per un docente."""
@@ -46,7 +46,9 @@ class PrenotazioneMassivaInput(BaseModel):
     ora_inizio:      time
     ora_fine:        time
     tipo_ricorrenza: TipoRicorrenza
-    giorni_settimana: List[int]
+    giorni_settimana: List[int] = []
+    intervallo:      int = Field(1, ge=1, le=52)
+    salta_chiusure:  bool = False
     note:            Optional[str] = None
     
     @field_validator("giorni_settimana")
@@ -56,6 +58,13 @@ class PrenotazioneMassivaInput(BaseModel):
             raise ValueError("I giorni della settimana devono essere tra 1 (lunedì) e 7 (domenica)")
         return sorted(set(v))
 
+    @model_validator(mode="after")
+    def giorni_per_ricorrenza_settimanale(self):
+        if (self.tipo_ricorrenza in (TipoRicorrenza.SETTIMANALE, TipoRicorrenza.BISETTIMANALE)
+                and not self.giorni_settimana):
+            raise ValueError("Indicare almeno un giorno della settimana")
+        return self
+
 
 class RichiestaEmbedded(BaseModel):
     id:            int
@@ -82,6 +91,64 @@ class PrenotazioneRisposta(BaseModel):
         from_attributes = True
 
 
+class ConflittoRilevato(BaseModel):
+    """Conflitto registrato alla creazione di una prenotazione."""
+    id:                int
+    tipo_conflitto:    TipoConflitto
+    prenotazione_id_1: int
+    prenotazione_id_2: int
+    slot_id_1:         int
+    slot_id_2:         int
+
+    class Config:
+        from_attributes = True
+
+
+class RisoluzioneConflittoInput(BaseModel):
+    """Singola decisione di una risoluzione in blocco."""
+    conflitto_id: int
+    azione:       Literal["mantieni_1", "mantieni_2", "elimina_entrambe"]
+
+
+class RisoluzioneBloccoInput(BaseModel):
+    """
+    Risoluzione in blocco: un elenco di decisioni esplicite (`azioni`) oppure
+    una `politica` applicata ai conflitti attivi della sede/periodo indicati
+    (obbligatori almeno la sede o entrambe le date).
+    - mantieni_meno_recente:      resta la prenotazione creata per prima
+    - mantieni_corso_prioritario: resta lo slot del corso che compare prima
+      in `corsi_prioritari`; a parità vale mantieni_meno_recente
+    """
+    azioni:           Optional[List[RisoluzioneConflittoInput]] = Field(None, max_length=2000)
+    politica:         Optional[Literal["mantieni_meno_recente", "mantieni_corso_prioritario"]] = None
+    sede_id:          Optional[int] = None
+    data_dal:         Optional[date] = None
+    data_al:          Optional[date] = None
+    corsi_prioritari: List[int] = []
+    note:             Optional[str] = None
+
+    @model_validator(mode="after")
+    def azioni_o_politica(self):
+        if (self.azioni is None) == (self.politica is None):
+            raise ValueError("Indicare le azioni oppure una politica")
+        if self.politica and not (self.sede_id or (self.data_dal and self.data_al)):
+            raise ValueError("Con una politica indicare la sede o il periodo (data_dal e data_al)")
+        if self.politica == "mantieni_corso_prioritario" and not self.corsi_prioritari:
+            raise ValueError("Indicare i corsi prioritari")
+        if self.data_dal and self.data_al and self.data_al < self.data_dal:
+            raise ValueError("data_al deve essere successiva o uguale a data_dal")
+        return self
+
+
+class PrenotazioneCreataRisposta(PrenotazioneRisposta):
+    """
+    Risposta di creazione: la prenotazione più i conflitti appena rilevati
+    e gli ID delle altre prenotazioni coinvolte.
+    """
+    conflitti_rilevati:        List[ConflittoRilevato] = []
+    prenotazioni_in_conflitto: List[int] = []
+
+
 class RichiestaPrenotazioneRisposta(BaseModel):
     id:              int
     prenotazione_id: int
@@ -0,0 +1,148 @@
+"""
+Servizio Anteprima - verifica di una prenotazione senza salvarla.
+Espande le date come farebbe la creazione, confronta gli slot ipotetici con
+quelli esistenti (stesso motore sweep-line del rilevamento conflitti) e per
+ogni data in conflitto propone orari liberi nella stessa aula e aule libere
+della stessa sede. Nessuna scrittura sul database.
+"""
+
+from collections import defaultdict
+from datetime import date
+from typing import Union
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from backend.config import settings
+from backend.models import Aula, Prenotazione, SlotOrario
+from backend.models.enums import StatoPrenotazione, TipoPrenotazione
+from backend.schemas.prenotazione import PrenotazioneMassivaInput, PrenotazioneSingolaInput
+from backend.services.booking_service import genera_date_ricorrenza
+from backend.services.disponibilita_service import aule_della_sede, occupazione_con_regole
+from backend.services.intervalli import (IntervalloSlot, a_minuti, da_minuti, da_riga,
+                                         sottrai_intervalli, trova_sovrapposizioni)
+from backend.services.regole_service import occorrenze_virtuali
+from backend.services.ricorrenze import CalendarioChiusure
+
+# Stati considerati dal rilevamento conflitti (come detect_and_record_conflicts)
+STATI_CONFLITTO = [StatoPrenotazione.CONFERMATA, StatoPrenotazione.IN_ATTESA]
+
+# Segnaposto dello slot ipotetico: gli ID reali sono sempre positivi
+ID_ANTEPRIMA = -1
+
+
+def _slot_esistenti(db: Session, aula_id: int, date_richieste: list[date]) -> list[IntervalloSlot]:
+    """Slot attivi (materializzati e da regola) dell'aula nelle date indicate."""
+    righe = (
+        db.query(SlotOrario.id, SlotOrario.prenotazione_id, SlotOrario.aula_id,
+                 SlotOrario.data, SlotOrario.ora_inizio, SlotOrario.ora_fine)
+        .join(Prenotazione, SlotOrario.prenotazione_id == Prenotazione.id)
+        .filter(
+            tuple_(SlotOrario.aula_id, SlotOrario.data).in_([(aula_id, d) for d in date_richieste]),
+            SlotOrario.annullato == False,
+            Prenotazione.stato.in_(STATI_CONFLITTO),
+        )
+        .all()
+    )
+    richieste = set(date_richieste)
+    virtuali = occorrenze_virtuali(db, [aula_id], min(date_richieste), max(date_richieste),
+                                   STATI_CONFLITTO)
+    return [da_riga(r) for r in righe] + [v for v in virtuali if v.data in richieste]
+
+
+def calcola_anteprima(
+    db: Session,
+    dati: Union[PrenotazioneSingolaInput, PrenotazioneMassivaInput],
+) -> dict:
+    """
+    Esito della verifica per ogni data della prenotazione richiesta.
+
+    Returns:
+        {"tipo", "aula_id", "date_totali", "date_in_conflitto",
+         "date": [{"data", "ora_inizio", "ora_fine",
+                   "conflitti": [{"slot_id", "prenotazione_id", "ora_inizio", "ora_fine"}],
+                   "orari_liberi": [["08:00", "09:00"], ...],   # stessa aula, durata ≥ richiesta
+                   "aule_libere": [aula_id, ...]}]}             # stessa sede, stesso orario
+        Per le date senza conflitti orari_liberi e aule_libere sono vuoti.
+    """
+    if isinstance(dati, PrenotazioneMassivaInput):
+        tipo = TipoPrenotazione.MASSIVA
+        ora_inizio, ora_fine = dati.ora_inizio, dati.ora_fine
+        date_richieste = genera_date_ricorrenza(
+            dati.data_inizio,
+            dati.data_fine,
+            dati.tipo_ricorrenza,
+            dati.giorni_settimana,
+            dati.intervallo,
+            CalendarioChiusure.da_impostazioni() if dati.salta_chiusure else None,
+        )
+    else:
+        tipo = TipoPrenotazione.SINGOLA
+        ora_inizio, ora_fine = dati.slot.ora_inizio, dati.slot.ora_fine
+        date_richieste = [dati.slot.data]
+
+    inizio, fine = a_minuti(ora_inizio), a_minuti(ora_fine)
+    risultato = {
+        "tipo":              tipo,
+        "aula_id":           dati.aula_id,
+        "date_totali":       len(date_richieste),
+        "date_in_conflitto": 0,
+        "date":              [],
+    }
+    if not date_richieste:
+        return risultato
+
+    # ── Sovrapposizioni: un gruppo sweep-line per giorno ─────────────────────
+    per_giorno: dict[date, list[IntervalloSlot]] = defaultdict(list)
+    for s in _slot_esistenti(db, dati.aula_id, date_richieste):
+        per_giorno[s.data].append(s)
+
+    conflitti: dict[date, list[IntervalloSlot]] = {}
+    for giorno in date_richieste:
+        ipotetico = IntervalloSlot(ID_ANTEPRIMA, ID_ANTEPRIMA, dati.aula_id, giorno, inizio, fine)
+        trovati = [
+            b if a.id == ID_ANTEPRIMA else a
+            for a, b in trova_sovrapposizioni(per_giorno.get(giorno, []) + [ipotetico])
+            if ID_ANTEPRIMA in (a.id, b.id)
+        ]
+        if trovati:
+            conflitti[giorno] = sorted(trovati, key=lambda s: (s.inizio, s.prenotazione_id))
+
+    # ── Alternative per le sole date in conflitto ────────────────────────────
+    occupati, altre_aule = {}, []
+    if conflitti:
+        sede_id = db.query(Aula.sede_id).filter(Aula.id == dati.aula_id).scalar()
+        altre_aule = [a for a in aule_della_sede(db, sede_id) if a != dati.aula_id] if sede_id else []
+        occupati = occupazione_con_regole(db, [dati.aula_id] + altre_aule,
+                                          min(conflitti), max(conflitti))
+    apertura = a_minuti(settings.orario_apertura)
+    chiusura = a_minuti(settings.orario_chiusura)
+
+    for giorno in date_richieste:
+        trovati = conflitti.get(giorno, [])
+        orari_liberi, aule_libere = [], []
+        if trovati:
+            orari_liberi = [
+                [da_minuti(i), da_minuti(f)]
+                for i, f in sottrai_intervalli(apertura, chiusura,
+                                               occupati.get((dati.aula_id, giorno), []),
+                                               fine - inizio)
+            ]
+            aule_libere = [
+                a for a in altre_aule
+                if all(f <= inizio or i >= fine for i, f in occupati.get((a, giorno), []))
+            ]
+        risultato["date"].append({
+            "data":       giorno,
+            "ora_inizio": da_minuti(inizio),
+            "ora_fine":   da_minuti(fine),
+            "conflitti": [
+                {"slot_id": s.id or None, "prenotazione_id": s.prenotazione_id,
+                 "ora_inizio": da_minuti(s.inizio), "ora_fine": da_minuti(s.fine)}
+                for s in trovati
+            ],
+            "orari_liberi": orari_liberi,
+            "aule_libere":  aule_libere,
+        })
+    risultato["date_in_conflitto"] = len(conflitti)
+    return risultato
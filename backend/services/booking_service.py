@@ -2,14 +2,21 @@
 Servizio principale per la gestione delle prenotazioni - Sistema 2 RUOLI
 """
 
-from datetime import date, timedelta
+from datetime import date
+from typing import Container, Optional
 from sqlalchemy.orm import Session
 from backend.models.prenotazione import (Prenotazione, PrenotazioneSingola,
                                           PrenotazioneMassiva, RichiestaPrenotazione)
+from backend.models.regola_ricorrenza import RegolaRicorrenza
 from backend.models.slot_orario import SlotOrario
 from backend.models.utente import Utente
 from backend.models.enums import (StatoPrenotazione, StatoRichiesta, TipoRicorrenza)
 from backend.schemas.prenotazione import (PrenotazioneSingolaInput, PrenotazioneMassivaInput)
+from backend.services.intervalli import IntervalloSlot
+from backend.services.ricorrenze import CalendarioChiusure, itera_date_ricorrenza
+from backend.services.occupazione_service import aggiorna_occupazione, blocca_aule
+from backend.services.regole_service import (espandi_regole, inserisci_occorrenze,
+                                             limite_materializzazione)
 
 
 def crea_prenotazione_singola(
@@ -17,12 +24,14 @@ def crea_prenotazione_singola(
     dati: PrenotazioneSingolaInput,
     utente: Utente
 ) -> tuple[PrenotazioneSingola, None]:
+    blocca_aule(db, [dati.aula_id])
     prenotazione = PrenotazioneSingola(
         richiedente_id=utente.id,
         stato=StatoPrenotazione.CONFERMATA,
     )
     db.add(prenotazione)
     db.flush()
+    espandi_regole(db, dati.slot.data, [dati.aula_id])
 
     slot = SlotOrario(
         prenotazione_id=prenotazione.id,
@@ -36,6 +45,7 @@ def crea_prenotazione_singola(
     )
     db.add(slot)
     db.flush()
+    aggiorna_occupazione(db, {(dati.aula_id, dati.slot.data)})
     return prenotazione, None
 
 
@@ -44,43 +54,46 @@ def genera_date_ricorrenza(
     data_fine: date,
     tipo: TipoRicorrenza,
     giorni_settimana: list[int],
+    intervallo: int = 1,
+    chiusure: Optional[Container[date]] = None,
 ) -> list[date]:
     """
     Genera tutte le date di una prenotazione ricorrente.
-    isoweekday(): 1=lunedì … 7=domenica
-    
-    SETTIMANALE: ogni settimana nei giorni specificati
-    BISETTIMANALE: settimane alterne nei giorni specificati
+    Versione materializzata di itera_date_ricorrenza (services/ricorrenze.py).
     """
-    date_generate = []
-    corrente = data_inizio
-
-    while corrente <= data_fine:
-        if corrente.isoweekday() in giorni_settimana:
-            date_generate.append(corrente)
-        corrente += timedelta(days=1)
-
-    # Filtro bisettimanale: mantieni solo settimane pari rispetto alla prima
-    if tipo == TipoRicorrenza.BISETTIMANALE:
-        prima_settimana = data_inizio.isocalendar()[1]
-        date_generate = [
-            d for d in date_generate
-            if (d.isocalendar()[1] - prima_settimana) % 2 == 0
-        ]
-
-    return date_generate
+    return list(itera_date_ricorrenza(
+        data_inizio, data_fine, tipo, giorni_settimana, intervallo, chiusure,
+    ))
 
 
 def crea_prenotazione_massiva(
     db: Session,
     dati: PrenotazioneMassivaInput,
     utente: Utente
-) -> tuple[PrenotazioneMassiva, None]:
+) -> tuple[PrenotazioneMassiva, list[IntervalloSlot]]:
     """
-    Crea una prenotazione massiva generando tutti gli slot ricorrenti.
+    Crea una prenotazione massiva generando gli slot ricorrenti.
     Sistema 2 ruoli: stato CONFERMATA immediato.
+
+    Gli slot sono inseriti con un unico INSERT multiplo (executemany) e gli
+    ID generati riletti con una sola query: restituisce anche gli slot come
+    IntervalloSlot, da passare direttamente al rilevamento conflitti.
+
+    Con orizzonte_ricorrenze_giorni > 0 gli slot oltre l'orizzonte non
+    vengono creati: resta la regola, espansa da regole_service quando
+    serve (i relativi conflitti emergono in quel momento).
     """
-    
+    blocca_aule(db, [dati.aula_id])
+    limite = limite_materializzazione(dati.data_inizio, dati.data_fine)
+    modello = {
+        "aula_id":    dati.aula_id,
+        "corso_id":   dati.corso_id,
+        "docente_id": dati.docente_id,
+        "note":       dati.note,
+        "ora_inizio": dati.ora_inizio,
+        "ora_fine":   dati.ora_fine,
+    }
+
     prenotazione = PrenotazioneMassiva(
         richiedente_id=utente.id,
         stato=StatoPrenotazione.CONFERMATA,
@@ -88,32 +101,29 @@ def crea_prenotazione_massiva(
         giorni_settimana=",".join(map(str, dati.giorni_settimana)),
         data_inizio_range=dati.data_inizio,
         data_fine_range=dati.data_fine,
+        intervallo=dati.intervallo,
     )
+    if limite < dati.data_fine:
+        prenotazione.regola = RegolaRicorrenza(
+            **modello, salta_chiusure=dati.salta_chiusure, materializzata_fino=limite,
+        )
     db.add(prenotazione)
     db.flush()
 
+    # Le regole esistenti vanno espanse almeno fin dove arrivano i nuovi slot
+    espandi_regole(db, limite, [dati.aula_id])
+
     date_ricorrenti = genera_date_ricorrenza(
         dati.data_inizio,
-        dati.data_fine,
+        limite,
         dati.tipo_ricorrenza,
         dati.giorni_settimana,
+        dati.intervallo,
+        CalendarioChiusure.da_impostazioni() if dati.salta_chiusure else None,
     )
-    
-    # Deduplica date (previene slot duplicati)
-    date_ricorrenti = sorted(set(date_ricorrenti))
+    if not date_ricorrenti:
+        return prenotazione, []
 
-    for d in date_ricorrenti:
-        slot = SlotOrario(
-            prenotazione_id=prenotazione.id,
-            aula_id=dati.aula_id,
-            corso_id=dati.corso_id,
-            docente_id=dati.docente_id,  # ← AGGIUNTO
-            note=dati.note,
-            data=d,
-            ora_inizio=dati.ora_inizio,
-            ora_fine=dati.ora_fine,
-        )
-        db.add(slot)
-
-    db.flush()
-    return prenotazione, None
\ No newline at end of file
+    slots = inserisci_occorrenze(db, prenotazione.id, modello, date_ricorrenti)
+    aggiorna_occupazione(db, {(dati.aula_id, d) for d in date_ricorrenti})
+    return prenotazione, slots
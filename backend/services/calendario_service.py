@@ -0,0 +1,183 @@
+"""
+Servizio Calendario - feed piatto degli slot per la visualizzazione.
+Una sola query su slot_orari già unita ad aule, corsi, docenti e
+prenotazioni: il client riceve righe pronte da disegnare, ordinate per
+data, ora di inizio e aula. Le occorrenze delle regole ricorrenti non
+ancora materializzate sono calcolate in memoria (slot_id null) e fuse in
+ordine con le righe degli slot. Per il formato NDJSON le righe degli slot
+si leggono a lotti da un cursore lato server.
+"""
+
+import heapq
+from datetime import date
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy import Select, exists, or_, select
+from sqlalchemy.orm import Session
+
+from backend.models import (Aula, ConflittoPrenotazione, Corso, Docente, Prenotazione,
+                            RegolaRicorrenza, SlotOrario)
+from backend.models.enums import StatoPrenotazione
+from backend.services.disponibilita_service import MAX_GIORNI
+from backend.services.regole_service import filtro_regole_da_calcolare, occorrenze_nel_periodo
+
+COLONNE = [
+    "slot_id", "prenotazione_id", "stato", "data", "ora_inizio", "ora_fine",
+    "aula_id", "aula_nome", "sede_id",
+    "corso_id", "corso_codice", "corso_titolo",
+    "docente_id", "docente_nome", "note", "ha_conflitti",
+]
+
+# Righe lette per volta dal cursore lato server in stream_righe_calendario
+LOTTO_STREAMING = 500
+
+
+def _ha_conflitti_attivi():
+    """EXISTS correlato: lo slot compare in un conflitto non ancora risolto."""
+    return exists().where(
+        ConflittoPrenotazione.stato_risoluzione == None,
+        or_(ConflittoPrenotazione.slot_id_1 == SlotOrario.id,
+            ConflittoPrenotazione.slot_id_2 == SlotOrario.id),
+    )
+
+
+def query_calendario(
+    data_dal: date,
+    data_al: date,
+    sede_id: Optional[int] = None,
+    aula_id: Optional[int] = None,
+    stati: Optional[list[StatoPrenotazione]] = None,
+) -> Select:
+    """
+    SELECT degli slot non annullati nella finestra richiesta, con le colonne
+    nell'ordine di COLONNE. Solleva ValueError se l'intervallo non è valido.
+    """
+    if data_al < data_dal:
+        raise ValueError("data_al deve essere successiva o uguale a data_dal")
+    if (data_al - data_dal).days >= MAX_GIORNI:
+        raise ValueError(f"Intervallo massimo consentito: {MAX_GIORNI} giorni")
+
+    stmt = (
+        select(
+            SlotOrario.id, SlotOrario.prenotazione_id, Prenotazione.stato,
+            SlotOrario.data, SlotOrario.ora_inizio, SlotOrario.ora_fine,
+            SlotOrario.aula_id, Aula.nome, Aula.sede_id,
+            SlotOrario.corso_id, Corso.codice, Corso.titolo,
+            SlotOrario.docente_id,
+            Docente.cognome + " " + Docente.nome,
+            SlotOrario.note,
+            _ha_conflitti_attivi(),
+        )
+        .join(Prenotazione, SlotOrario.prenotazione_id == Prenotazione.id)
+        .join(Aula, SlotOrario.aula_id == Aula.id)
+        .join(Corso, SlotOrario.corso_id == Corso.id)
+        .outerjoin(Docente, SlotOrario.docente_id == Docente.id)
+        .where(
+            SlotOrario.data >= data_dal,
+            SlotOrario.data <= data_al,
+            SlotOrario.annullato == False,
+        )
+        .order_by(SlotOrario.data, SlotOrario.ora_inizio, SlotOrario.aula_id, SlotOrario.id)
+    )
+    if aula_id:
+        stmt = stmt.where(SlotOrario.aula_id == aula_id)
+    if sede_id:
+        stmt = stmt.where(Aula.sede_id == sede_id)
+    if stati:
+        stmt = stmt.where(Prenotazione.stato.in_(stati))
+    return stmt
+
+
+def _serializza(r) -> list:
+    """Riga della SELECT con valori serializzabili (date ISO, orari 'HH:MM')."""
+    return [
+        r[0], r[1], r[2].value, r[3].isoformat(),
+        r[4].strftime("%H:%M"), r[5].strftime("%H:%M"),
+        r[6], r[7], r[8], r[9], r[10], r[11],
+        r[12], r[13] if r[12] else None, r[14], bool(r[15]),
+    ]
+
+
+def _righe_virtuali(
+    db: Session,
+    data_dal: date,
+    data_al: date,
+    sede_id: Optional[int] = None,
+    aula_id: Optional[int] = None,
+    stati: Optional[list[StatoPrenotazione]] = None,
+) -> list[list]:
+    """Occorrenze da regola non ancora materializzate, nel formato di _serializza."""
+    stmt = (
+        select(RegolaRicorrenza, Prenotazione, Aula.nome, Aula.sede_id,
+               Corso.codice, Corso.titolo, Docente.cognome + " " + Docente.nome)
+        .join(Prenotazione, RegolaRicorrenza.prenotazione_id == Prenotazione.id)
+        .join(Aula, RegolaRicorrenza.aula_id == Aula.id)
+        .join(Corso, RegolaRicorrenza.corso_id == Corso.id)
+        .outerjoin(Docente, RegolaRicorrenza.docente_id == Docente.id)
+        .where(*filtro_regole_da_calcolare(data_dal, data_al))
+    )
+    if aula_id:
+        stmt = stmt.where(RegolaRicorrenza.aula_id == aula_id)
+    if sede_id:
+        stmt = stmt.where(Aula.sede_id == sede_id)
+    if stati:
+        stmt = stmt.where(Prenotazione.stato.in_(stati))
+
+    righe = []
+    for regola, pren, aula_nome, aula_sede_id, codice, titolo, docente in db.execute(stmt):
+        for giorno in occorrenze_nel_periodo(pren, regola, data_dal, data_al):
+            righe.append([
+                None, pren.id, pren.stato.value, giorno.isoformat(),
+                regola.ora_inizio.strftime("%H:%M"), regola.ora_fine.strftime("%H:%M"),
+                regola.aula_id, aula_nome, aula_sede_id,
+                regola.corso_id, codice, titolo,
+                regola.docente_id, docente if regola.docente_id else None, regola.note, False,
+            ])
+    return sorted(righe, key=_ordine)
+
+
+def _ordine(riga: list) -> tuple:
+    """Chiave di ORDER BY di query_calendario sulle righe serializzate."""
+    return riga[3], riga[4], riga[6], riga[0] or 0
+
+
+def _unisci(reali: Iterable[list], virtuali: list[list]) -> Iterator[list]:
+    return heapq.merge(reali, virtuali, key=_ordine)
+
+
+def righe_calendario(
+    db: Session,
+    data_dal: date,
+    data_al: date,
+    sede_id: Optional[int] = None,
+    aula_id: Optional[int] = None,
+    stati: Optional[list[StatoPrenotazione]] = None,
+) -> list[list]:
+    """
+    Slot non annullati e occorrenze da regola nella finestra richiesta, uno
+    per riga, con i valori nell'ordine di COLONNE e già serializzabili
+    (date ISO, orari 'HH:MM'). Solleva ValueError se l'intervallo non è valido.
+    """
+    stmt = query_calendario(data_dal, data_al, sede_id, aula_id, stati)
+    virtuali = _righe_virtuali(db, data_dal, data_al, sede_id, aula_id, stati)
+    return list(_unisci((_serializza(r) for r in db.execute(stmt)), virtuali))
+
+
+def stream_righe_calendario(
+    db: Session,
+    data_dal: date,
+    data_al: date,
+    sede_id: Optional[int] = None,
+    aula_id: Optional[int] = None,
+    stati: Optional[list[StatoPrenotazione]] = None,
+) -> Iterator[list]:
+    """
+    Come righe_calendario, ma le righe degli slot sono lette a lotti di
+    LOTTO_STREAMING da un cursore lato server (yield_per). Validazione e
+    occorrenze da regola sono calcolate subito, prima dell'apertura del
+    cursore: gli errori emergono prima che la risposta inizi.
+    """
+    stmt = query_calendario(data_dal, data_al, sede_id, aula_id, stati)
+    virtuali = _righe_virtuali(db, data_dal, data_al, sede_id, aula_id, stati)
+    cursore = db.execute(stmt.execution_options(yield_per=LOTTO_STREAMING))
+    return _unisci((_serializza(r) for r in cursore), virtuali)
@@ -3,195 +3,183 @@ Servizio Gestione Conflitti - Sistema Automatico
 Aggiornato: conflitti tracciati a livello di slot, non prenotazione intera.
 """
 
-from typing import List, Optional
-from datetime import date, time, datetime, timezone
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
-
-from backend.models import Prenotazione, SlotOrario, ConflittoPrenotazione, RichiestaPrenotazione
-from backend.models.enums import StatoPrenotazione, TipoConflitto, StatoRisoluzioneConflitto
+from collections import defaultdict
+from typing import Iterable, List, Optional
+from datetime import date, datetime, timezone
+from sqlalchemy.orm import Session, aliased, selectinload
+from sqlalchemy import (Select, and_, case, delete, exists, func, or_, insert, select, text, true,
+                        tuple_, update)
+
+from backend.models import (Aula, Corso, Docente, Prenotazione, SlotOrario, ConflittoPrenotazione,
+                            RichiestaPrenotazione, Utente)
+from backend.models.enums import (RuoloUtente, StatoPrenotazione, TipoConflitto,
+                                  StatoRisoluzioneConflitto)
+from backend.schemas.prenotazione import RisoluzioneBloccoInput
+from backend.services.occupazione_service import aggiorna_occupazione, blocca_aule, chiavi_slot
+from backend.services.intervalli import (IntervalloSlot, da_riga,
+                                         trova_sovrapposizioni)
+
+# Valori ammessi per GET /conflitti?expand=
+ESPANSIONI_CONFLITTI = ("slots", "aule", "corsi")
+CAMPI_SLOT_ESPANSI = ("id", "data", "ora_inizio", "ora_fine", "annullato", "note",
+                      "aula_id", "corso_id", "docente_id")
+
+# Azione di risoluzione → esito registrato sul conflitto
+ESITI_AZIONE = {
+    "mantieni_1":       StatoRisoluzioneConflitto.RISOLTO_MANTENUTA_1,
+    "mantieni_2":       StatoRisoluzioneConflitto.RISOLTO_MANTENUTA_2,
+    "elimina_entrambe": StatoRisoluzioneConflitto.RISOLTO_ELIMINATE_ENTRAMBE,
+}
+
+# Percentili (nearest-rank) della latenza di risoluzione in GET /conflitti/stats/summary
+PERCENTILI_LATENZA = (50, 90, 95)
+
+
+def adesso_utc() -> datetime:
+    """Istante corrente in UTC naive, come le altre colonne DateTime dei conflitti."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 
 class ConflittoService:
 
     @staticmethod
-    def check_time_overlap(
-        start1: time, end1: time,
-        start2: time, end2: time
-    ) -> bool:
-        def to_min(t: time) -> int:
-            return t.hour * 60 + t.minute
-        return to_min(start1) < to_min(end2) and to_min(start2) < to_min(end1)
-
-    @staticmethod
-    def find_conflicting_slots(
+    def detect_and_record_conflicts(
         db: Session,
-        aula_id: int,
-        data: date,
-        ora_inizio: time,
-        ora_fine: time,
-        exclude_booking_id: Optional[int] = None
-    ) -> List[tuple[Prenotazione, SlotOrario]]:
-        
-        print(f"🔍 FIND_CONFLICTING_SLOTS:")
-        print(f"  aula_id={aula_id}, data={data}")
-        print(f"  ora_inizio={ora_inizio}, ora_fine={ora_fine}")
-        print(f"  exclude_booking_id={exclude_booking_id}")
-        
-        query = (
-            db.query(Prenotazione, SlotOrario)
-            .join(SlotOrario, SlotOrario.prenotazione_id == Prenotazione.id)
+        prenotazione: Prenotazione,
+        slots: Optional[Iterable] = None
+    ) -> List[ConflittoPrenotazione]:
+        """
+        Rileva e registra TUTTI i conflitti per ogni slot della prenotazione.
+
+        Motore batch: il numero di query è costante qualunque sia il numero
+        di slot della prenotazione.
+        1. Una query carica tutti gli slot attivi per le chiavi (aula_id, data)
+           della prenotazione (compresi quelli della prenotazione stessa,
+           così i conflitti intra-prenotazione escono dallo stesso passaggio)
+        2. Una query recupera le coppie di slot già in conflitto attivo
+        3. Le nuove coppie vengono inserite con un unico INSERT multiplo
+
+        FIX PERMANENTE: per ogni slot si generano anche le coppie tra gli slot
+        che lo sovrappongono, purché si sovrappongano davvero tra loro.
+        Le sovrapposizioni di ogni gruppo (aula, data) escono da un unico
+        passaggio sweep-line su minuti interi (vedi services/intervalli.py).
+        """
+        db.flush()
+
+        slot_nuovi = [
+            s for s in (prenotazione.slots if slots is None else slots)
+            if not getattr(s, "annullato", False)
+        ]
+        chiavi = {(s.aula_id, s.data) for s in slot_nuovi}
+        if not chiavi:
+            return []
+
+        # ── 1. Tutti gli slot candidati in un'unica query ────────────────────
+        candidati = (
+            db.query(
+                SlotOrario.id,
+                SlotOrario.prenotazione_id,
+                SlotOrario.aula_id,
+                SlotOrario.data,
+                SlotOrario.ora_inizio,
+                SlotOrario.ora_fine,
+            )
+            .join(Prenotazione, SlotOrario.prenotazione_id == Prenotazione.id)
             .filter(
-                SlotOrario.aula_id == aula_id,      
-                SlotOrario.data == data,
+                tuple_(SlotOrario.aula_id, SlotOrario.data).in_(list(chiavi)),
                 SlotOrario.annullato == False,
                 Prenotazione.stato.in_([
                     StatoPrenotazione.CONFERMATA,
                     StatoPrenotazione.IN_ATTESA,
                 ])
             )
+            .all()
         )
-        if exclude_booking_id:
-            query = query.filter(Prenotazione.id != exclude_booking_id)
-
-        all_results = query.all()
-        print(f"  Trovati {len(all_results)} slot candidati:")
-        for pren, slot in all_results:
-            print(f"    - Pren {pren.id}, Slot {slot.id}: {slot.ora_inizio}-{slot.ora_fine}")
-
-        results = []
-        for pren, slot in all_results:
-            if ConflittoService.check_time_overlap(
-                ora_inizio, ora_fine,
-                slot.ora_inizio, slot.ora_fine
-            ):
-                results.append((pren, slot))
-                print(f"  ✓ OVERLAP con Pren {pren.id}, Slot {slot.id}")
-            else:
-                print(f"  ✗ NO overlap con Pren {pren.id}, Slot {slot.id}")
-        
-        print(f"  Totale conflitti trovati: {len(results)}")
-        return results
-
 
-    @staticmethod
-    def detect_and_record_conflicts(
-        db: Session,
-        prenotazione: Prenotazione
-    ) -> List[ConflittoPrenotazione]:
-        """
-        Rileva e registra TUTTI i conflitti per ogni slot della prenotazione.
-        
-        FIX PERMANENTE: quando trova N slot in conflitto (N>1), genera TUTTE
-        le coppie possibili, non solo quelle con il nuovo slot.
-        """
-        conflitti_creati = []
+        gruppi: dict[tuple, list[IntervalloSlot]] = defaultdict(list)
+        for c in candidati:
+            gruppi[(c.aula_id, c.data)].append(da_riga(c))
+
+        # ── Coppie in conflitto (sweep-line in memoria) ──────────────────────
+        coppie: dict[tuple[int, int], tuple[IntervalloSlot, IntervalloSlot]] = {}
+        for gruppo in gruppi.values():
+            sovrapposizioni = list(trova_sovrapposizioni(gruppo))
+            vicini_nuovi: dict[int, set[int]] = defaultdict(set)
+            for slot_a, slot_b in sovrapposizioni:
+                if slot_a.prenotazione_id == prenotazione.id:
+                    vicini_nuovi[slot_b.id].add(slot_a.id)
+                if slot_b.prenotazione_id == prenotazione.id:
+                    vicini_nuovi[slot_a.id].add(slot_b.id)
+            for slot_a, slot_b in sovrapposizioni:
+                coinvolge_nuovo = (
+                    prenotazione.id in (slot_a.prenotazione_id, slot_b.prenotazione_id)
+                    or vicini_nuovi[slot_a.id] & vicini_nuovi[slot_b.id]
+                )
+                if coinvolge_nuovo:
+                    chiave = (min(slot_a.id, slot_b.id), max(slot_a.id, slot_b.id))
+                    coppie[chiave] = (slot_a, slot_b)
+
+        if not coppie:
+            return []
+
+        # ── 2. Coppie già in conflitto attivo, in un'unica query ─────────────
+        slot_ids = {sid for coppia in coppie for sid in coppia}
+        esistenti = {
+            (min(s1, s2), max(s1, s2))
+            for s1, s2 in db.query(
+                ConflittoPrenotazione.slot_id_1,
+                ConflittoPrenotazione.slot_id_2,
+            ).filter(
+                ConflittoPrenotazione.stato_risoluzione == None,
+                or_(
+                    ConflittoPrenotazione.slot_id_1.in_(slot_ids),
+                    ConflittoPrenotazione.slot_id_2.in_(slot_ids),
+                )
+            ).all()
+        }
 
-        for slot in prenotazione.slots:
-            if slot.annullato:
+        # ── 3. Inserimento in blocco delle coppie mancanti ───────────────────
+        righe = []
+        for chiave, (slot_a, slot_b) in sorted(coppie.items()):
+            if chiave in esistenti:
                 continue
-
-            # ── Conflitti con altre prenotazioni ─────────────────────────────
-            coppie_in_conflitto = ConflittoService.find_conflicting_slots(
-                db,
-                slot.aula_id,
-                slot.data,
-                slot.ora_inizio,
-                slot.ora_fine,
-                exclude_booking_id=prenotazione.id
+            # Ordina per ID prenotazione (a parità, per ID slot)
+            if (slot_a.prenotazione_id, slot_a.id) > (slot_b.prenotazione_id, slot_b.id):
+                slot_a, slot_b = slot_b, slot_a
+            righe.append({
+                "prenotazione_id_1": slot_a.prenotazione_id,
+                "prenotazione_id_2": slot_b.prenotazione_id,
+                "slot_id_1": slot_a.id,
+                "slot_id_2": slot_b.id,
+                "tipo_conflitto": TipoConflitto.OVERLAP_ORARIO,
+            })
+
+        if not righe:
+            return []
+
+        db.execute(insert(ConflittoPrenotazione), righe)
+        conflitti_creati = (
+            db.query(ConflittoPrenotazione)
+            .filter(
+                ConflittoPrenotazione.stato_risoluzione == None,
+                tuple_(
+                    ConflittoPrenotazione.slot_id_1,
+                    ConflittoPrenotazione.slot_id_2,
+                ).in_([(r["slot_id_1"], r["slot_id_2"]) for r in righe])
             )
+            .all()
+        )
+
+        prenotazione.ha_conflitti_attivi = True
+        if prenotazione.richiesta:
+            prenotazione.richiesta.ha_conflitti = True
+        # Anche le prenotazioni esistenti dall'altro lato delle coppie
+        ConflittoService.ricalcola_flag_conflitti(
+            db,
+            {r[k] for r in righe for k in ("prenotazione_id_1", "prenotazione_id_2")}
+            - {prenotazione.id},
+        )
 
-            print(f"📍 DETECT_AND_RECORD per slot {slot.id} (pren {prenotazione.id}):")
-            print(f"   Trovate {len(coppie_in_conflitto)} coppie in conflitto")
-
-            # Raccogli tutti gli slot in conflitto (incluso quello nuovo)
-            tutti_slot_in_conflitto = [slot] + [conflicting_slot for _, conflicting_slot in coppie_in_conflitto]
-            
-            print(f"   tutti_slot_in_conflitto: {[s.id for s in tutti_slot_in_conflitto]}")
-            
-            # Genera TUTTE le coppie possibili
-            for i in range(len(tutti_slot_in_conflitto)):
-                for j in range(i + 1, len(tutti_slot_in_conflitto)):
-                    slot_a = tutti_slot_in_conflitto[i]
-                    slot_b = tutti_slot_in_conflitto[j]
-                    
-                    # Ordina per ID slot (minore sempre come slot_id_1)
-                    s1 = min(slot_a.id, slot_b.id)
-                    s2 = max(slot_a.id, slot_b.id)
-
-                    print(f"   Coppia slot {s1} <-> {s2}")
-
-                    # Verifica se esiste già UN CONFLITTO ATTIVO (non risolto)
-                    existing = db.query(ConflittoPrenotazione).filter(
-                        ConflittoPrenotazione.slot_id_1 == s1,
-                        ConflittoPrenotazione.slot_id_2 == s2,
-                        ConflittoPrenotazione.stato_risoluzione == None  # ← AGGIUNGI QUESTO
-                    ).first()
-
-                    print(f"     Existing? {existing.id if existing else 'NO'}")
-
-                    if not existing:
-                        # Ordina per ID prenotazione
-                        if slot_a.prenotazione_id < slot_b.prenotazione_id:
-                            id1, id2 = slot_a.prenotazione_id, slot_b.prenotazione_id
-                            sid1, sid2 = slot_a.id, slot_b.id
-                        else:
-                            id1, id2 = slot_b.prenotazione_id, slot_a.prenotazione_id
-                            sid1, sid2 = slot_b.id, slot_a.id
-
-                        print(f"     CREANDO conflitto: pren {id1}<->{id2}, slot {sid1}<->{sid2}")
-
-                        conflitto = ConflittoPrenotazione(
-                            prenotazione_id_1=id1,
-                            prenotazione_id_2=id2,
-                            slot_id_1=sid1,
-                            slot_id_2=sid2,
-                            tipo_conflitto=TipoConflitto.OVERLAP_ORARIO,
-                        )
-                        db.add(conflitto)
-                        conflitti_creati.append(conflitto)
-
-            # ── Conflitti intra-prenotazione (stessa prenotazione) ────────────
-            for altro_slot in prenotazione.slots:
-                if altro_slot.id == slot.id or altro_slot.annullato:
-                    continue
-                if altro_slot.aula_id != slot.aula_id:
-                    continue
-                if altro_slot.data != slot.data:
-                    continue
-                if not ConflittoService.check_time_overlap(
-                    slot.ora_inizio, slot.ora_fine,
-                    altro_slot.ora_inizio, altro_slot.ora_fine
-                ):
-                    continue
-
-                # Conflitto trovato — dedup per coppia di slot
-                s1 = min(slot.id, altro_slot.id)
-                s2 = max(slot.id, altro_slot.id)
-
-                existing = db.query(ConflittoPrenotazione).filter(
-                    ConflittoPrenotazione.slot_id_1 == s1,
-                    ConflittoPrenotazione.slot_id_2 == s2,
-                    ConflittoPrenotazione.stato_risoluzione == None  # ← AGGIUNGI QUESTO
-                ).first()
-                
-                if not existing:
-                    conflitto = ConflittoPrenotazione(
-                        prenotazione_id_1=prenotazione.id,
-                        prenotazione_id_2=prenotazione.id,
-                        slot_id_1=s1,
-                        slot_id_2=s2,
-                        tipo_conflitto=TipoConflitto.OVERLAP_ORARIO,
-                    )
-                    db.add(conflitto)
-                    conflitti_creati.append(conflitto)
-
-        if conflitti_creati:
-            prenotazione.ha_conflitti_attivi = True
-            if prenotazione.richiesta:
-                prenotazione.richiesta.ha_conflitti = True
-
-        print(f"✅ TOTALE CONFLITTI CREATI: {len(conflitti_creati)}")
         db.flush()
         return conflitti_creati
 
@@ -213,37 +201,209 @@ class ConflittoService:
             )
         return query.all()
 
+    @staticmethod
+    def query_lista(
+        utente: Utente,
+        sede_id: Optional[int] = None,
+        solo_attivi: bool = True,
+    ) -> Select:
+        """
+        SELECT dei conflitti visibili all'utente, eseguita come unica query.
+        OPERATIVO: solo conflitti con una propria prenotazione, tramite EXISTS
+        correlato su richiedente_id (nessun elenco di ID caricato in memoria).
+        COORDINAMENTO: tutti, filtrabili per sede dello slot_1.
+        Con solo_attivi l'accesso parte dagli indici (stato_risoluzione,
+        prenotazione_id_1/2) di conflitti_prenotazione.
+        """
+        query = select(ConflittoPrenotazione)
+        if solo_attivi:
+            query = query.where(ConflittoPrenotazione.stato_risoluzione == None)
+
+        if sede_id and utente.ruolo == RuoloUtente.COORDINAMENTO:
+            query = (
+                query
+                .join(SlotOrario, ConflittoPrenotazione.slot_id_1 == SlotOrario.id)
+                .join(Aula, SlotOrario.aula_id == Aula.id)
+                .where(Aula.sede_id == sede_id)
+            )
+
+        if utente.ruolo == RuoloUtente.OPERATIVO:
+            def mia(colonna):
+                return exists().where(Prenotazione.id == colonna,
+                                      Prenotazione.richiedente_id == utente.id)
+            query = query.where(or_(mia(ConflittoPrenotazione.prenotazione_id_1),
+                                    mia(ConflittoPrenotazione.prenotazione_id_2)))
+        return query
 
     @staticmethod
-    def _aggiorna_flag_conflitti(db: Session, prenotazione_id: int):
+    def espandi_query_lista(query: Select, espansioni: set[str]) -> Select:
         """
-        Ricalcola richiesta.ha_conflitti per una prenotazione dopo una risoluzione.
-        Se non ha più conflitti attivi, mette ha_conflitti = False.
+        Aggiunge alla SELECT di query_lista, per i due lati della coppia,
+        slot, prenotazione, richiedente e docente (più aula e corso se in
+        `espansioni`) con join verso righe singole: resta un solo statement
+        e una riga per conflitto. Colonne etichettate '<campo>_<lato>'.
         """
-        ha_ancora = db.query(ConflittoPrenotazione).filter(
-            or_(
-                ConflittoPrenotazione.prenotazione_id_1 == prenotazione_id,
-                ConflittoPrenotazione.prenotazione_id_2 == prenotazione_id,
-            ),
-            ConflittoPrenotazione.stato_risoluzione == None,
-        ).first() is not None
-
-        richiesta = db.query(RichiestaPrenotazione).filter(
-            RichiestaPrenotazione.prenotazione_id == prenotazione_id
-        ).first()
-        if richiesta:
-            richiesta.ha_conflitti = ha_ancora
+        lati = (
+            (1, ConflittoPrenotazione.slot_id_1, ConflittoPrenotazione.prenotazione_id_1),
+            (2, ConflittoPrenotazione.slot_id_2, ConflittoPrenotazione.prenotazione_id_2),
+        )
+        for lato, slot_id, prenotazione_id in lati:
+            s, p = aliased(SlotOrario), aliased(Prenotazione)
+            u, d = aliased(Utente), aliased(Docente)
+            query = (
+                query
+                .outerjoin(s, s.id == slot_id)
+                .join(p, p.id == prenotazione_id)
+                .outerjoin(u, u.id == p.richiedente_id)
+                .outerjoin(d, d.id == s.docente_id)
+            )
+            colonne = [getattr(s, c).label(f"{c}_{lato}") for c in CAMPI_SLOT_ESPANSI] + [
+                p.richiedente_id.label(f"richiedente_id_{lato}"),
+                p.data_creazione.label(f"data_creazione_prenotazione_{lato}"),
+                u.nome.label(f"richiedente_nome_{lato}"),
+                u.cognome.label(f"richiedente_cognome_{lato}"),
+                d.nome.label(f"docente_nome_{lato}"),
+                d.cognome.label(f"docente_cognome_{lato}"),
+            ]
+            if "aule" in espansioni:
+                a = aliased(Aula)
+                query = query.outerjoin(a, a.id == s.aula_id)
+                colonne += [a.nome.label(f"aula_nome_{lato}"),
+                            a.sede_id.label(f"aula_sede_id_{lato}")]
+            if "corsi" in espansioni:
+                c = aliased(Corso)
+                query = query.outerjoin(c, c.id == s.corso_id)
+                colonne += [c.codice.label(f"corso_codice_{lato}"),
+                            c.titolo.label(f"corso_titolo_{lato}")]
+            query = query.add_columns(*colonne)
+        return query
+
+    @staticmethod
+    def statistiche(db: Session, sede_id: Optional[int] = None) -> dict:
+        """
+        Totali e ripartizioni dei conflitti con un solo statement.
+        Una CTE porta sede, aula, tipo, settimana di rilevamento (lunedì) e
+        latenza di risoluzione in secondi; l'aggregato raggruppa per
+        sede/aula/tipo/settimana con somme condizionali per esito, e in
+        CROSS JOIN una riga con i percentili della latenza calcolati con
+        funzioni finestra. Le ripartizioni si ottengono sommando i gruppi.
+        La sede è quella dello slot_1 (come il filtro di query_lista): i
+        conflitti senza slot ricadono sotto sede/aula None.
+        """
+        cp = ConflittoPrenotazione
+        base = (
+            select(
+                Aula.sede_id.label("sede_id"),
+                SlotOrario.aula_id.label("aula_id"),
+                Aula.nome.label("aula_nome"),
+                cp.tipo_conflitto.label("tipo"),
+                cp.stato_risoluzione.label("esito"),
+                func.subdate(func.date(cp.rilevato_il), func.weekday(cp.rilevato_il)).label("settimana"),
+                func.timestampdiff(text("SECOND"), cp.rilevato_il, cp.risolto_il).label("latenza"),
+            )
+            .select_from(cp)
+            .outerjoin(SlotOrario, cp.slot_id_1 == SlotOrario.id)
+            .outerjoin(Aula, SlotOrario.aula_id == Aula.id)
+        )
+        if sede_id:
+            base = base.where(Aula.sede_id == sede_id)
+        base = base.cte("base")
+
+        esiti = list(StatoRisoluzioneConflitto)
+        chiavi = [base.c.sede_id, base.c.aula_id, base.c.aula_nome, base.c.tipo, base.c.settimana]
+        gruppi = (
+            select(
+                *chiavi,
+                func.count().label("totali"),
+                func.sum(case((base.c.esito == None, 1), else_=0)).label("attivi"),
+                *[func.sum(case((base.c.esito == e, 1), else_=0)).label(e.value) for e in esiti],
+            )
+            .group_by(*chiavi)
+            .subquery("gruppi")
+        )
+
+        # Nearest-rank: il primo valore con posizione ≥ p% dei campioni
+        ordinate = (
+            select(
+                base.c.latenza,
+                func.row_number().over(order_by=base.c.latenza).label("posizione"),
+                func.count().over().label("campioni"),
+            )
+            .where(base.c.latenza != None)
+            .subquery("ordinate")
+        )
+        percentili = select(
+            *[func.min(case((ordinate.c.posizione * 100 >= p * ordinate.c.campioni,
+                             ordinate.c.latenza))).label(f"p{p}")
+              for p in PERCENTILI_LATENZA],
+            func.avg(ordinate.c.latenza).label("media"),
+            func.max(ordinate.c.latenza).label("massima"),
+        ).subquery("percentili")
+
+        righe = db.execute(
+            select(gruppi, percentili).select_from(gruppi.join(percentili, true()))
+        ).all()
+
+        def _somma(chiave) -> dict:
+            per_chiave: dict = {}
+            for r in righe:
+                voce = per_chiave.setdefault(chiave(r), {"totali": 0, "attivi": 0})
+                voce["totali"] += r.totali
+                voce["attivi"] += int(r.attivi)
+            for voce in per_chiave.values():
+                voce["risolti"] = voce["totali"] - voce["attivi"]
+            return per_chiave
+
+        totali = sum(r.totali for r in righe)
+        attivi = sum(int(r.attivi) for r in righe)
+        risolti = totali - attivi
+        per_aula = _somma(lambda r: (r.aula_id, r.aula_nome, r.sede_id))
+        return {
+            "totali": totali,
+            "attivi": attivi,
+            "risolti": risolti,
+            "percentuale_risolti": (risolti / totali * 100) if totali > 0 else 0,
+            "per_sede": [
+                {"sede_id": k, **v}
+                for k, v in sorted(_somma(lambda r: r.sede_id).items(),
+                                   key=lambda kv: (kv[0] is None, kv[0] or 0))
+            ],
+            "per_aula": [
+                {"aula_id": k[0], "aula_nome": k[1], "sede_id": k[2], **v}
+                for k, v in sorted(per_aula.items(), key=lambda kv: (kv[0][0] is None, kv[0][0] or 0))
+            ],
+            "per_tipo": {
+                (k.value if k is not None else None): v["totali"]
+                for k, v in _somma(lambda r: r.tipo).items()
+            },
+            "per_esito": {
+                "ATTIVO": attivi,
+                **{e.value: sum(int(getattr(r, e.value)) for r in righe) for e in esiti},
+            },
+            "per_settimana": [
+                {"settimana": str(k), **v}
+                for k, v in sorted(_somma(lambda r: r.settimana).items(), key=lambda kv: str(kv[0]))
+            ],
+            "latenza_risoluzione_secondi": {
+                "media":   round(float(righe[0].media), 1) if righe and righe[0].media is not None
+                           else None,
+                **{f"p{p}": righe[0]._mapping[f"p{p}"] if righe else None
+                   for p in PERCENTILI_LATENZA},
+                "massima": righe[0].massima if righe else None,
+            },
+        }
 
-        pren = db.query(Prenotazione).filter(Prenotazione.id == prenotazione_id).first()
-        if pren:
-            pren.ha_conflitti_attivi = ha_ancora
 
     @staticmethod
     def _annulla_slot_e_cleanup(db: Session, pren: Prenotazione, slot_id: int):
         """
-        Annulla uno slot specifico. Se era l'ultimo slot attivo, elimina la prenotazione.
+        Annulla uno slot specifico. Se era l'ultimo slot attivo e la regola non
+        ha occorrenze da materializzare, elimina la prenotazione.
         Restituisce True se la prenotazione è stata eliminata.
         """
+        # Import locale: regole_service dipende da questo modulo
+        from backend.services.regole_service import ha_occorrenze_future
+
         slot = db.query(SlotOrario).filter(
             SlotOrario.id == slot_id,
             SlotOrario.prenotazione_id == pren.id,
@@ -253,7 +413,7 @@ class ConflittoService:
             db.flush()
 
         slot_attivi = [s for s in pren.slots if not s.annullato]
-        if not slot_attivi:
+        if not slot_attivi and not ha_occorrenze_future(pren):
             richiesta = db.query(RichiestaPrenotazione).filter(
                 RichiestaPrenotazione.prenotazione_id == pren.id
             ).first()
@@ -298,18 +458,17 @@ class ConflittoService:
         if conflitto.is_risolto:
             raise ValueError(f"Conflitto {conflitto_id} già risolto")
 
+        chiavi = chiavi_slot(
+            db.query(SlotOrario.aula_id, SlotOrario.data)
+            .filter(SlotOrario.id.in_([conflitto.slot_id_1, conflitto.slot_id_2]))
+            .all()
+        )
+        blocca_aule(db, (aula_id for aula_id, _ in chiavi))
+
         conflitto.risolto_da = risolto_da_id
-        conflitto.risolto_il    = datetime.now(timezone.utc).replace(tzinfo=None)
+        conflitto.risolto_il    = adesso_utc()
         conflitto.note_risoluzione = note
 
-        def elimina_pren(pren: Prenotazione):
-            richiesta = db.query(RichiestaPrenotazione).filter(
-                RichiestaPrenotazione.prenotazione_id == pren.id
-            ).first()
-            if richiesta:
-                db.delete(richiesta)
-            db.delete(pren)
-
         if azione == "mantieni_1":
             # Mantieni slot_1, annulla slot_2 (solo lo slot in conflitto)
             conflitto.stato_risoluzione = StatoRisoluzioneConflitto.RISOLTO_MANTENUTA_1
@@ -346,12 +505,210 @@ class ConflittoService:
             raise ValueError(f"Azione non valida: {azione}")
 
         # FIX: rimosso db.commit() — il commit è responsabilità esclusiva del router/caller.
-        # Ricalcola ha_conflitti su entrambe le prenotazioni (solo flush, niente commit)
-        ConflittoService._aggiorna_flag_conflitti(db, conflitto.prenotazione_id_1)
-        if db.query(Prenotazione).filter(
-            Prenotazione.id == conflitto.prenotazione_id_2
-        ).first():
-            ConflittoService._aggiorna_flag_conflitti(db, conflitto.prenotazione_id_2)
+        # Ricalcola ha_conflitti su entrambe le prenotazioni (quelle eliminate non
+        # corrispondono a nessuna riga dell'UPDATE)
+        ConflittoService.ricalcola_flag_conflitti(
+            db, {conflitto.prenotazione_id_1, conflitto.prenotazione_id_2}
+        )
+        aggiorna_occupazione(db, chiavi)
+
+        return conflitto
+
+    @staticmethod
+    def ricalcola_flag_conflitti(db: Session, prenotazione_ids: Iterable[int] | Select) -> None:
+        """
+        Ricalcola prenotazioni.ha_conflitti_attivi e richieste.ha_conflitti per
+        le prenotazioni indicate (ID o SELECT di ID) con due UPDATE ... EXISTS,
+        uno per tabella, qualunque sia il numero di prenotazioni. Gli EXISTS
+        sono separati per lato della coppia così da usare gli indici
+        (stato_risoluzione, prenotazione_id_1/2).
+        Esegue un flush delle modifiche pendenti; le istanze già caricate non
+        vengono aggiornate (synchronize_session=False): il commit le scade.
+        """
+        if not isinstance(prenotazione_ids, Select):
+            prenotazione_ids = sorted(set(prenotazione_ids))
+            if not prenotazione_ids:
+                return
         db.flush()
+        cp = ConflittoPrenotazione
+
+        def attivo(colonna):
+            return or_(
+                exists().where(cp.prenotazione_id_1 == colonna, cp.stato_risoluzione == None),
+                exists().where(cp.prenotazione_id_2 == colonna, cp.stato_risoluzione == None),
+            )
+
+        db.execute(
+            update(Prenotazione)
+            .where(Prenotazione.id.in_(prenotazione_ids))
+            .values(ha_conflitti_attivi=attivo(Prenotazione.id))
+            .execution_options(synchronize_session=False)
+        )
+        db.execute(
+            update(RichiestaPrenotazione)
+            .where(RichiestaPrenotazione.prenotazione_id.in_(prenotazione_ids))
+            .values(ha_conflitti=attivo(RichiestaPrenotazione.prenotazione_id))
+            .execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def risolvi_in_blocco(db: Session, risolto_da_id: int, dati: RisoluzioneBloccoInput) -> dict:
+        """
+        Risolve più conflitti nella transazione del chiamante (nessun commit).
+
+        Con `azioni` ogni decisione è applicata come farebbe resolve_conflict,
+        nell'ordine ricevuto; se un conflitto non esiste o è già risolto viene
+        sollevato ValueError e nulla è modificato; lo stesso vale per un
+        conflitto indicato più di una volta. Con `politica` si decidono
+        i conflitti attivi filtrati per sede e data dello slot_1, in ordine di
+        ID: un conflitto il cui slot risulta già annullato (anche da una
+        decisione precedente dello stesso blocco) è registrato con l'esito
+        corrispondente senza annullare altro.
+
+        Le scritture sono per insiemi: un UPDATE degli slot, un UPDATE dei
+        conflitti per esito, l'eliminazione delle prenotazioni rimaste senza
+        slot attivi, un solo ricalcolo dei flag e del riepilogo occupazione.
+        """
+        cp = ConflittoPrenotazione
+        s1, s2 = aliased(SlotOrario), aliased(SlotOrario)
+        p1, p2 = aliased(Prenotazione), aliased(Prenotazione)
+        query = (
+            select(
+                cp.id, cp.stato_risoluzione,
+                cp.prenotazione_id_1, cp.prenotazione_id_2, cp.slot_id_1, cp.slot_id_2,
+                p1.data_creazione.label("creata_1"), p2.data_creazione.label("creata_2"),
+                s1.corso_id.label("corso_1"), s2.corso_id.label("corso_2"),
+                s1.annullato.label("annullato_1"), s2.annullato.label("annullato_2"),
+                s1.aula_id.label("aula_1"), s2.aula_id.label("aula_2"),
+                s1.data.label("data_1"), s2.data.label("data_2"),
+            )
+            .select_from(cp)
+            .join(p1, p1.id == cp.prenotazione_id_1)
+            .join(p2, p2.id == cp.prenotazione_id_2)
+            .outerjoin(s1, s1.id == cp.slot_id_1)
+            .outerjoin(s2, s2.id == cp.slot_id_2)
+            .order_by(cp.id)
+            .with_for_update(of=cp)
+        )
+
+        if dati.azioni is not None:
+            richieste = {a.conflitto_id: a.azione for a in dati.azioni}
+            if len(richieste) < len(dati.azioni):
+                visti = defaultdict(int)
+                for a in dati.azioni:
+                    visti[a.conflitto_id] += 1
+                raise ValueError(f"Conflitti ripetuti: {sorted(i for i, n in visti.items() if n > 1)}")
+            righe = {r.id: r for r in db.execute(query.where(cp.id.in_(richieste))).all()}
+            mancanti = sorted(set(richieste) - set(righe))
+            if mancanti:
+                raise ValueError(f"Conflitti non trovati: {mancanti}")
+            risolti = sorted(i for i, r in righe.items() if r.stato_risoluzione is not None)
+            if risolti:
+                raise ValueError(f"Conflitti già risolti: {risolti}")
+            decisioni = [(righe[i], a) for i, a in richieste.items()]
+        else:
+            query = query.where(cp.stato_risoluzione == None)
+            if dati.sede_id:
+                query = query.join(Aula, Aula.id == s1.aula_id).where(Aula.sede_id == dati.sede_id)
+            if dati.data_dal:
+                query = query.where(s1.data >= dati.data_dal)
+            if dati.data_al:
+                query = query.where(s1.data <= dati.data_al)
+            rango = {c: i for i, c in enumerate(dati.corsi_prioritari)}
+
+            def azione_politica(r) -> str:
+                if dati.politica == "mantieni_corso_prioritario":
+                    r1 = rango.get(r.corso_1, len(rango))
+                    r2 = rango.get(r.corso_2, len(rango))
+                    if r1 != r2:
+                        return "mantieni_1" if r1 < r2 else "mantieni_2"
+                piu_vecchia_1 = (r.creata_1, r.prenotazione_id_1) <= (r.creata_2, r.prenotazione_id_2)
+                return "mantieni_1" if piu_vecchia_1 else "mantieni_2"
+
+            decisioni = [(r, azione_politica(r)) for r in db.execute(query).all()]
+
+        # ── Decisioni → slot da annullare ed esito per conflitto ─────────────
+        annullati = set()
+        for r, _ in decisioni:
+            annullati.update(s for s, a in ((r.slot_id_1, r.annullato_1),
+                                            (r.slot_id_2, r.annullato_2)) if s and a)
+        da_annullare: dict[int, tuple[int, int, date]] = {}
+        esiti: dict[StatoRisoluzioneConflitto, list[int]] = defaultdict(list)
+        for r, azione in decisioni:
+            lati = {1: (r.slot_id_1, r.prenotazione_id_1, r.aula_1, r.data_1),
+                    2: (r.slot_id_2, r.prenotazione_id_2, r.aula_2, r.data_2)}
+            gia = {lato for lato, (slot_id, *_) in lati.items() if slot_id in annullati}
+            if dati.politica and gia:
+                azione = ("elimina_entrambe" if gia == {1, 2}
+                          else "mantieni_1" if gia == {2} else "mantieni_2")
+            else:
+                perdenti = {"mantieni_1": (2,), "mantieni_2": (1,), "elimina_entrambe": (1, 2)}[azione]
+                for lato in perdenti:
+                    slot_id, prenotazione_id, aula_id, data_slot = lati[lato]
+                    if slot_id:
+                        annullati.add(slot_id)
+                        da_annullare[slot_id] = (prenotazione_id, aula_id, data_slot)
+            esiti[ESITI_AZIONE[azione]].append(r.id)
+
+        # ── Scritture per insiemi ────────────────────────────────────────────
+        slot_annullati = 0
+        if da_annullare:
+            blocca_aule(db, (aula_id for _, aula_id, _ in da_annullare.values()))
+            slot_annullati = db.execute(
+                update(SlotOrario)
+                .where(SlotOrario.id.in_(da_annullare), SlotOrario.annullato == False)
+                .values(annullato=True)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+
+        risolto_il = adesso_utc()
+        for esito, conflitto_ids in esiti.items():
+            db.execute(
+                update(cp)
+                .where(cp.id.in_(conflitto_ids))
+                .values(stato_risoluzione=esito, risolto_da=risolto_da_id,
+                        risolto_il=risolto_il, note_risoluzione=dati.note)
+                .execution_options(synchronize_session=False)
+            )
+
+        # Prenotazioni rimaste senza slot attivi né occorrenze da materializzare:
+        # eliminate come in _annulla_slot_e_cleanup (le cascate ORM rimuovono
+        # slot e conflitti)
+        from backend.services.regole_service import ha_occorrenze_future
+
+        toccate = {p for p, _, _ in da_annullare.values()}
+        da_eliminare = []
+        if toccate:
+            da_eliminare = [pren for pren in db.scalars(
+                select(Prenotazione)
+                .where(
+                    Prenotazione.id.in_(toccate),
+                    ~exists().where(SlotOrario.prenotazione_id == Prenotazione.id,
+                                    SlotOrario.annullato == False),
+                )
+                .options(selectinload(Prenotazione.slots),
+                         selectinload(Prenotazione.regola),
+                         selectinload(Prenotazione.attrezzature_richieste),
+                         selectinload(Prenotazione.conflitti_come_pren1),
+                         selectinload(Prenotazione.conflitti_come_pren2))
+            ).all() if not ha_occorrenze_future(pren)]
+        vuote = [pren.id for pren in da_eliminare]
+        if vuote:
+            db.execute(delete(RichiestaPrenotazione)
+                       .where(RichiestaPrenotazione.prenotazione_id.in_(vuote))
+                       .execution_options(synchronize_session=False))
+            for pren in da_eliminare:
+                db.delete(pren)
+            db.flush()
 
-        return conflitto
\ No newline at end of file
+        coinvolte = {p for r, _ in decisioni for p in (r.prenotazione_id_1, r.prenotazione_id_2)}
+        ConflittoService.ricalcola_flag_conflitti(db, coinvolte - set(vuote))
+        aggiorna_occupazione(db, {(a, d) for _, a, d in da_annullare.values()})
+
+        return {
+            "risolti":                sum(len(v) for v in esiti.values()),
+            "per_esito":              {e.value: len(v) for e, v in esiti.items()},
+            "conflitti":              sorted(i for v in esiti.values() for i in v),
+            "slot_annullati":         slot_annullati,
+            "prenotazioni_eliminate": sorted(vuote),
+        }
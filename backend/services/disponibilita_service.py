@@ -0,0 +1,126 @@
+"""
+Servizio Disponibilità - calcolo degli intervalli liberi delle aule.
+Gli intervalli occupati di ogni giorno vengono fusi e sottratti dall'orario
+di apertura; la risposta è una lista compatta di intervalli per giorno.
+"""
+
+from collections import defaultdict
+from datetime import date, time, timedelta
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from backend.config import settings
+from backend.models import Aula, Prenotazione, SlotOrario
+from backend.models.enums import StatoPrenotazione
+from backend.services.intervalli import a_minuti, da_minuti, sottrai_intervalli
+from backend.services.regole_service import occorrenze_virtuali
+
+# Stati che occupano un'aula (allineati allo storico endpoint slot-liberi)
+STATI_OCCUPANTI = [
+    StatoPrenotazione.CONFERMATA,
+    StatoPrenotazione.IN_ATTESA,
+    StatoPrenotazione.CONFLITTO,
+]
+
+MAX_GIORNI = 366
+
+
+def aule_della_sede(db: Session, sede_id: int) -> list[int]:
+    """ID delle aule attive di una sede."""
+    return [
+        r[0] for r in db.query(Aula.id)
+        .filter(Aula.sede_id == sede_id, Aula.attiva == 1)
+        .order_by(Aula.id)
+        .all()
+    ]
+
+
+def occupazione_per_giorno(
+    db: Session,
+    aula_ids: list[int],
+    data_dal: date,
+    data_al: date,
+) -> dict[tuple[int, date], list[tuple[int, int]]]:
+    """
+    Intervalli occupati (in minuti) per (aula_id, data), letti con un'unica
+    query sull'indice coprente di slot_orari.
+    """
+    occupati: dict[tuple[int, date], list[tuple[int, int]]] = defaultdict(list)
+    righe = (
+        db.query(SlotOrario.aula_id, SlotOrario.data,
+                 SlotOrario.ora_inizio, SlotOrario.ora_fine)
+        .join(Prenotazione, SlotOrario.prenotazione_id == Prenotazione.id)
+        .filter(
+            SlotOrario.aula_id.in_(aula_ids),
+            SlotOrario.data >= data_dal,
+            SlotOrario.data <= data_al,
+            SlotOrario.annullato == False,
+            Prenotazione.stato.in_(STATI_OCCUPANTI),
+        )
+        .all()
+    )
+    for r in righe:
+        occupati[(r.aula_id, r.data)].append((a_minuti(r.ora_inizio), a_minuti(r.ora_fine)))
+    return occupati
+
+
+def occupazione_con_regole(
+    db: Session,
+    aula_ids: list[int],
+    data_dal: date,
+    data_al: date,
+) -> dict[tuple[int, date], list[tuple[int, int]]]:
+    """Come occupazione_per_giorno, più le occorrenze da regola non ancora materializzate."""
+    occupati = occupazione_per_giorno(db, aula_ids, data_dal, data_al)
+    for v in occorrenze_virtuali(db, aula_ids, data_dal, data_al, STATI_OCCUPANTI):
+        occupati[(v.aula_id, v.data)].append((v.inizio, v.fine))
+    return occupati
+
+
+def calcola_slot_liberi(
+    db: Session,
+    aula_ids: list[int],
+    data_dal: date,
+    data_al: date,
+    durata_minima: int = 0,
+    ora_apertura: Optional[time] = None,
+    ora_chiusura: Optional[time] = None,
+) -> list[dict]:
+    """
+    Intervalli liberi per aula e per giorno nel range richiesto.
+
+    Returns:
+        [{"aula_id": 1, "giorni": [{"data": date, "liberi": [["08:00", "10:00"], ...]}]}]
+        I giorni senza intervalli liberi sufficienti vengono omessi.
+
+    Raises:
+        ValueError: Se il range di date o l'orario di apertura non sono validi
+    """
+    if data_al < data_dal:
+        raise ValueError("data_al deve essere successiva o uguale a data_dal")
+    if (data_al - data_dal).days >= MAX_GIORNI:
+        raise ValueError(f"Intervallo massimo consentito: {MAX_GIORNI} giorni")
+
+    apertura = a_minuti(ora_apertura or settings.orario_apertura)
+    chiusura = a_minuti(ora_chiusura or settings.orario_chiusura)
+    if chiusura <= apertura:
+        raise ValueError("L'orario di chiusura deve essere successivo all'apertura")
+
+    occupati = occupazione_con_regole(db, aula_ids, data_dal, data_al) if aula_ids else {}
+    giorni = [data_dal + timedelta(days=i) for i in range((data_al - data_dal).days + 1)]
+
+    risultato = []
+    for aula_id in aula_ids:
+        giorni_aula = []
+        for giorno in giorni:
+            liberi = sottrai_intervalli(
+                apertura, chiusura, occupati.get((aula_id, giorno), []), durata_minima
+            )
+            if liberi:
+                giorni_aula.append({
+                    "data": giorno,
+                    "liberi": [[da_minuti(i), da_minuti(f)] for i, f in liberi],
+                })
+        risultato.append({"aula_id": aula_id, "giorni": giorni_aula})
+    return risultato
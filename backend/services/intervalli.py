@@ -0,0 +1,110 @@
+"""
+Algoritmi su intervalli orari condivisi tra rilevamento e rigenerazione conflitti.
+Gli orari vengono convertiti una sola volta in minuti interi dalla mezzanotte.
+"""
+
+from datetime import date, time
+from typing import Iterable, Iterator, NamedTuple
+
+
+class IntervalloSlot(NamedTuple):
+    """Slot ridotto all'essenziale per il calcolo delle sovrapposizioni."""
+    id:              int
+    prenotazione_id: int
+    aula_id:         int
+    data:            date
+    inizio:          int   # minuti dalla mezzanotte
+    fine:            int   # minuti dalla mezzanotte
+
+
+def a_minuti(t: time) -> int:
+    """Converte un datetime.time in minuti dalla mezzanotte."""
+    return t.hour * 60 + t.minute
+
+
+def da_riga(riga) -> IntervalloSlot:
+    """
+    Costruisce un IntervalloSlot da un oggetto/riga con gli attributi
+    id, prenotazione_id, aula_id, data, ora_inizio, ora_fine.
+    """
+    return IntervalloSlot(
+        riga.id, riga.prenotazione_id, riga.aula_id, riga.data,
+        a_minuti(riga.ora_inizio), a_minuti(riga.ora_fine),
+    )
+
+
+def trova_sovrapposizioni(
+    intervalli: Iterable[IntervalloSlot],
+) -> Iterator[tuple[IntervalloSlot, IntervalloSlot]]:
+    """
+    Sweep-line: restituisce tutte e sole le coppie di intervalli che si
+    sovrappongono (estremi esclusi: 9-10 e 10-11 non sono in conflitto).
+
+    Gli intervalli devono appartenere alla stessa aula e allo stesso giorno.
+    Costo O(n log n + k), con k = numero di coppie restituite.
+    """
+    attivi: list[IntervalloSlot] = []
+    for corrente in sorted(intervalli, key=lambda i: (i.inizio, i.fine, i.id)):
+        if corrente.fine <= corrente.inizio:
+            continue
+        # Scarta gli intervalli già terminati: quelli rimasti iniziano prima
+        # (o insieme) e finiscono dopo l'inizio del corrente → si sovrappongono
+        attivi = [a for a in attivi if a.fine > corrente.inizio]
+        for attivo in attivi:
+            yield attivo, corrente
+        attivi.append(corrente)
+
+
+def unisci_intervalli(intervalli: Iterable[tuple[int, int]]) -> list[tuple[int, int]]:
+    """Fonde gli intervalli (inizio, fine) sovrapposti o adiacenti."""
+    uniti: list[tuple[int, int]] = []
+    for inizio, fine in sorted(intervalli):
+        if uniti and inizio <= uniti[-1][1]:
+            uniti[-1] = (uniti[-1][0], max(uniti[-1][1], fine))
+        else:
+            uniti.append((inizio, fine))
+    return uniti
+
+
+def sottrai_intervalli(
+    apertura: int,
+    chiusura: int,
+    occupati: Iterable[tuple[int, int]],
+    durata_minima: int = 0,
+) -> list[tuple[int, int]]:
+    """
+    Intervalli liberi in [apertura, chiusura] al netto degli occupati,
+    scartando quelli più corti di `durata_minima` minuti.
+    """
+    liberi: list[tuple[int, int]] = []
+    cursore = apertura
+    for inizio, fine in unisci_intervalli(occupati):
+        if fine <= cursore:
+            continue
+        if inizio >= chiusura:
+            break
+        if inizio > cursore:
+            liberi.append((cursore, inizio))
+        cursore = max(cursore, fine)
+    if cursore < chiusura:
+        liberi.append((cursore, chiusura))
+    return [(i, f) for i, f in liberi if f - i >= max(durata_minima, 1)]
+
+
+def da_minuti(minuti: int) -> str:
+    """Formatta minuti dalla mezzanotte come 'HH:MM'."""
+    return f"{minuti // 60:02d}:{minuti % 60:02d}"
+
+
+def picco_concorrenza(intervalli: Iterable[tuple[int, int]]) -> int:
+    """
+    Massimo numero di intervalli (inizio, fine) contemporanei.
+    A parità di istante le fine precedono gli inizi: 9-10 e 10-11 valgono 1.
+    """
+    validi = [(inizio, fine) for inizio, fine in intervalli if fine > inizio]
+    eventi = sorted([(i, 1) for i, _ in validi] + [(f, -1) for _, f in validi])
+    attivi = picco = 0
+    for _, delta in eventi:
+        attivi += delta
+        picco = max(picco, attivi)
+    return picco
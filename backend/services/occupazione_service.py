@@ -0,0 +1,157 @@
+"""
+Servizio Occupazione - manutenzione del riepilogo occupazione_giornaliera.
+Ogni scrittura sugli slot ricalcola soltanto le coppie (aula, giorno)
+toccate a partire dagli slot confermati, così il riepilogo non può
+divergere da slot_orari.
+
+Concorrenza: chi scrive gli slot di un'aula ne blocca prima la riga
+(blocca_aule), quindi i ricalcoli della stessa aula sono serializzati.
+Il ricalcolo legge gli slot con una lettura bloccante (vede l'ultimo
+stato confermato, non lo snapshot REPEATABLE READ) e scrive le righe con
+un upsert: le coppie rimaste senza slot restano a zero invece di essere
+cancellate, così non si prendono gap lock sul riepilogo.
+"""
+
+from datetime import date, timedelta
+from itertools import groupby
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, func, insert, select, tuple_
+from sqlalchemy.dialects.mysql import insert as insert_mysql
+from sqlalchemy.orm import Session
+
+from backend.models import Aula, OccupazioneGiornaliera, Prenotazione, SlotOrario
+from backend.models.enums import StatoPrenotazione
+from backend.services.intervalli import a_minuti, picco_concorrenza
+
+# Stati conteggiati nel riepilogo (allineati al default della saturazione)
+STATI_RIEPILOGO = [StatoPrenotazione.CONFERMATA]
+
+Chiave = tuple[int, date]
+
+DIMENSIONE_LOTTO = 500
+GIORNI_PER_BLOCCO = 31
+
+
+def chiavi_slot(slots: Iterable) -> set[Chiave]:
+    """Coppie (aula_id, data) degli slot indicati."""
+    return {(s.aula_id, s.data) for s in slots}
+
+
+def blocca_aule(db: Session, aula_ids: Iterable[int]) -> None:
+    """
+    Blocca in scrittura le righe delle aule indicate (SELECT … FOR UPDATE,
+    in ordine di ID per non invertire l'ordine tra transazioni). Va chiamata
+    prima di scrivere gli slot di quelle aule; ripeterla nella stessa
+    transazione non attende.
+    """
+    ids = sorted(set(aula_ids))
+    if ids:
+        db.execute(select(Aula.id).where(Aula.id.in_(ids)).order_by(Aula.id).with_for_update())
+
+
+def _query_slot():
+    return (
+        select(SlotOrario.aula_id, SlotOrario.data,
+               SlotOrario.ora_inizio, SlotOrario.ora_fine)
+        .join(Prenotazione, SlotOrario.prenotazione_id == Prenotazione.id)
+        .where(SlotOrario.annullato == False,
+               Prenotazione.stato.in_(STATI_RIEPILOGO))
+        .order_by(SlotOrario.aula_id, SlotOrario.data)
+    )
+
+
+def _aggrega(righe) -> list[dict]:
+    """Righe del riepilogo da slot ordinati per (aula_id, data)."""
+    risultato = []
+    for (aula_id, giorno), gruppo in groupby(righe, key=lambda r: (r.aula_id, r.data)):
+        intervalli = [(a_minuti(r.ora_inizio), a_minuti(r.ora_fine)) for r in gruppo]
+        risultato.append({
+            "aula_id":           aula_id,
+            "data":              giorno,
+            "minuti_prenotati":  sum(max(f - i, 0) for i, f in intervalli),
+            "numero_slot":       len(intervalli),
+            "picco_concorrenza": picco_concorrenza(intervalli),
+        })
+    return risultato
+
+
+def aggiorna_occupazione(db: Session, chiavi: Iterable[Chiave]) -> None:
+    """
+    Ricalcola il riepilogo per le coppie (aula_id, data) indicate.
+    Blocca le aule coinvolte, esegue un flush delle modifiche pendenti e
+    scrive con INSERT … ON DUPLICATE KEY UPDATE; il commit resta al chiamante.
+    """
+    chiavi = sorted(set(chiavi))
+    if not chiavi:
+        return
+    blocca_aule(db, (aula_id for aula_id, _ in chiavi))
+    db.flush()
+    for i in range(0, len(chiavi), DIMENSIONE_LOTTO):
+        lotto = chiavi[i:i + DIMENSIONE_LOTTO]
+        calcolate = {
+            (r["aula_id"], r["data"]): r for r in _aggrega(db.execute(
+                _query_slot()
+                .where(tuple_(SlotOrario.aula_id, SlotOrario.data).in_(lotto))
+                .with_for_update(read=True, of=SlotOrario)
+            ))
+        }
+        righe = [
+            calcolate.get((aula_id, giorno)) or {
+                "aula_id": aula_id, "data": giorno,
+                "minuti_prenotati": 0, "numero_slot": 0, "picco_concorrenza": 0,
+            }
+            for aula_id, giorno in lotto
+        ]
+        upsert = insert_mysql(OccupazioneGiornaliera).values(righe)
+        db.execute(upsert.on_duplicate_key_update(
+            minuti_prenotati=upsert.inserted.minuti_prenotati,
+            numero_slot=upsert.inserted.numero_slot,
+            picco_concorrenza=upsert.inserted.picco_concorrenza,
+        ))
+
+
+def ricostruisci_occupazione(
+    db: Session,
+    dal: Optional[date] = None,
+    al: Optional[date] = None,
+) -> int:
+    """
+    Ricostruisce il riepilogo nel periodo indicato (default: tutti gli slot),
+    a blocchi di GIORNI_PER_BLOCCO giorni con un commit per blocco.
+    Restituisce il numero di righe scritte.
+    """
+    minimo, massimo = db.execute(select(func.min(SlotOrario.data), func.max(SlotOrario.data))).one()
+    dal = dal or minimo
+    al = al or massimo
+    if dal is None or al is None:
+        return 0
+
+    scritte = 0
+    inizio = dal
+    while inizio <= al:
+        fine = min(inizio + timedelta(days=GIORNI_PER_BLOCCO - 1), al)
+        db.execute(
+            delete(OccupazioneGiornaliera).where(
+                OccupazioneGiornaliera.data >= inizio,
+                OccupazioneGiornaliera.data <= fine,
+            )
+        )
+        righe = _aggrega(db.execute(
+            _query_slot().where(SlotOrario.data >= inizio, SlotOrario.data <= fine)
+        ))
+        if righe:
+            db.execute(insert(OccupazioneGiornaliera), righe)
+        db.commit()
+        scritte += len(righe)
+        inizio = fine + timedelta(days=1)
+    return scritte
+
+
+def inizializza_occupazione(db: Session) -> None:
+    """Popola il riepilogo al primo avvio, se è vuoto ma esistono slot."""
+    if db.execute(select(OccupazioneGiornaliera.aula_id).limit(1)).first():
+        return
+    if not db.execute(select(SlotOrario.id).limit(1)).first():
+        return
+    print(f"🛠️  Riepilogo occupazione popolato: {ricostruisci_occupazione(db)} righe")
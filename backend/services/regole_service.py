@@ -0,0 +1,195 @@
+"""
+Servizio Regole - materializzazione su richiesta delle prenotazioni massive.
+Con orizzonte_ricorrenze_giorni > 0 una prenotazione massiva crea gli slot
+solo fino all'orizzonte e conserva la regola in regole_ricorrenza.
+Le letture (calendario, disponibilità, statistiche, anteprima) calcolano
+le occorrenze successive in memoria senza scrivere (occorrenze_virtuali).
+Le scritture (nuove prenotazioni, modifica slot, avvio) le inseriscono in
+slot_orari per le sole aule coinvolte: da quel momento sono slot ordinari,
+annullabili e modificabili come gli altri, e passano per il rilevamento
+conflitti e il riepilogo occupazione.
+"""
+
+from datetime import date, timedelta
+from itertools import dropwhile, takewhile
+from typing import Iterable, Optional
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from backend.config import settings
+from backend.models import Prenotazione, RegolaRicorrenza, SlotOrario
+from backend.models.enums import StatoPrenotazione
+from backend.services.conflitti_service import ConflittoService
+from backend.services.intervalli import IntervalloSlot, a_minuti, da_riga
+from backend.services.occupazione_service import aggiorna_occupazione, blocca_aule
+from backend.services.ricorrenze import CalendarioChiusure, itera_date_ricorrenza
+
+
+def limite_materializzazione(data_inizio: date, data_fine: date) -> date:
+    """
+    Ultimo giorno da materializzare alla creazione: data_fine, oppure
+    l'orizzonte contato da oggi (o da data_inizio, se successiva).
+    """
+    orizzonte = settings.orizzonte_ricorrenze_giorni
+    if orizzonte <= 0:
+        return data_fine
+    return min(data_fine, max(date.today(), data_inizio) + timedelta(days=orizzonte))
+
+
+def inserisci_occorrenze(
+    db: Session,
+    prenotazione_id: int,
+    modello: dict,
+    date_occorrenze: list[date],
+) -> list[IntervalloSlot]:
+    """
+    Inserisce uno slot per data con un unico INSERT multiplo e restituisce
+    gli slot della prenotazione nel periodo inserito come IntervalloSlot.
+    `modello` contiene aula_id, corso_id, docente_id, note, ora_inizio, ora_fine.
+    """
+    if not date_occorrenze:
+        return []
+    db.execute(insert(SlotOrario), [
+        {**modello, "prenotazione_id": prenotazione_id, "data": d, "annullato": False}
+        for d in date_occorrenze
+    ])
+    return [
+        da_riga(r) for r in db.execute(
+            select(SlotOrario.id, SlotOrario.prenotazione_id, SlotOrario.aula_id,
+                   SlotOrario.data, SlotOrario.ora_inizio, SlotOrario.ora_fine)
+            .where(SlotOrario.prenotazione_id == prenotazione_id,
+                   SlotOrario.data >= date_occorrenze[0],
+                   SlotOrario.data <= date_occorrenze[-1],
+                   SlotOrario.annullato == False)
+            .order_by(SlotOrario.data, SlotOrario.id)
+        )
+    ]
+
+
+def _occorrenze(prenotazione: Prenotazione, regola: RegolaRicorrenza) -> Iterable[date]:
+    """Occorrenze della regola successive a materializzata_fino (pigre)."""
+    giorni = [int(g) for g in (prenotazione.giorni_settimana or "").split(",") if g]
+    tutte = itera_date_ricorrenza(
+        prenotazione.data_inizio_range,
+        prenotazione.data_fine_range,
+        prenotazione.tipo_ricorrenza,
+        giorni,
+        prenotazione.intervallo or 1,
+        CalendarioChiusure.da_impostazioni() if regola.salta_chiusure else None,
+    )
+    return dropwhile(lambda d: d <= regola.materializzata_fino, tutte)
+
+
+def ha_occorrenze_future(prenotazione: Prenotazione) -> bool:
+    """True se la regola della prenotazione ha ancora occorrenze da materializzare."""
+    regola = prenotazione.regola
+    return regola is not None and next(iter(_occorrenze(prenotazione, regola)), None) is not None
+
+
+def filtro_regole_da_calcolare(data_dal: date, data_al: date) -> list:
+    """Regole con occorrenze non ancora materializzate tra data_dal e data_al."""
+    return [
+        RegolaRicorrenza.materializzata_fino < data_al,
+        RegolaRicorrenza.materializzata_fino < Prenotazione.data_fine_range,
+        Prenotazione.data_fine_range >= data_dal,
+    ]
+
+
+def occorrenze_nel_periodo(
+    prenotazione: Prenotazione,
+    regola: RegolaRicorrenza,
+    data_dal: date,
+    data_al: date,
+) -> list[date]:
+    """Occorrenze non ancora materializzate della regola tra data_dal e data_al."""
+    return [d for d in takewhile(lambda d: d <= data_al, _occorrenze(prenotazione, regola))
+            if d >= data_dal]
+
+
+def occorrenze_virtuali(
+    db: Session,
+    aula_ids: Iterable[int],
+    data_dal: date,
+    data_al: date,
+    stati: Iterable[StatoPrenotazione],
+) -> list[IntervalloSlot]:
+    """
+    Occorrenze non ancora materializzate delle regole sulle aule indicate,
+    calcolate in memoria senza scrivere (id = 0: non esiste ancora uno slot).
+    """
+    da_calcolare = (
+        db.query(RegolaRicorrenza, Prenotazione)
+        .join(Prenotazione, RegolaRicorrenza.prenotazione_id == Prenotazione.id)
+        .filter(
+            RegolaRicorrenza.aula_id.in_(list(aula_ids)),
+            *filtro_regole_da_calcolare(data_dal, data_al),
+            Prenotazione.stato.in_(list(stati)),
+        )
+        .all()
+    )
+    risultato = []
+    for regola, prenotazione in da_calcolare:
+        inizio, fine = a_minuti(regola.ora_inizio), a_minuti(regola.ora_fine)
+        for giorno in occorrenze_nel_periodo(prenotazione, regola, data_dal, data_al):
+            risultato.append(IntervalloSlot(0, prenotazione.id, regola.aula_id,
+                                            giorno, inizio, fine))
+    return risultato
+
+
+def espandi_regole(db: Session, fino_a: date, aula_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Materializza fino a `fino_a` le occorrenze delle regole non ancora
+    espanse (delle sole `aula_ids`, se indicate), registrando conflitti e
+    riepilogo per i nuovi slot. Va chiamata solo dai percorsi di scrittura:
+    le letture usano occorrenze_virtuali.
+    Le regole vengono bloccate (SELECT … FOR UPDATE) così due richieste
+    concorrenti non inseriscono le stesse occorrenze; prima si bloccano le
+    aule, nello stesso ordine degli altri percorsi di scrittura. Il commit
+    resta al chiamante. Restituisce il numero di slot creati.
+    """
+    if aula_ids is None:
+        aula_ids = db.scalars(
+            select(RegolaRicorrenza.aula_id).distinct()
+            .join(Prenotazione, RegolaRicorrenza.prenotazione_id == Prenotazione.id)
+            .where(RegolaRicorrenza.materializzata_fino < fino_a,
+                   RegolaRicorrenza.materializzata_fino < Prenotazione.data_fine_range)
+        ).all()
+    aula_ids = list(aula_ids)
+    if not aula_ids:
+        return 0
+    blocca_aule(db, aula_ids)
+
+    query = (
+        db.query(RegolaRicorrenza, Prenotazione)
+        .join(Prenotazione, RegolaRicorrenza.prenotazione_id == Prenotazione.id)
+        .filter(
+            RegolaRicorrenza.materializzata_fino < fino_a,
+            RegolaRicorrenza.materializzata_fino < Prenotazione.data_fine_range,
+        )
+    )
+    da_espandere = query.filter(RegolaRicorrenza.aula_id.in_(aula_ids)).with_for_update().all()
+
+    creati = 0
+    for regola, prenotazione in da_espandere:
+        limite = min(fino_a, prenotazione.data_fine_range)
+        nuove = list(takewhile(lambda d: d <= limite, _occorrenze(prenotazione, regola)))
+        regola.materializzata_fino = limite
+        if not nuove:
+            continue
+
+        slots = inserisci_occorrenze(db, prenotazione.id, {
+            "aula_id":    regola.aula_id,
+            "corso_id":   regola.corso_id,
+            "docente_id": regola.docente_id,
+            "note":       regola.note,
+            "ora_inizio": regola.ora_inizio,
+            "ora_fine":   regola.ora_fine,
+        }, nuove)
+        ConflittoService.detect_and_record_conflicts(db, prenotazione, slots)
+        aggiorna_occupazione(db, {(regola.aula_id, d) for d in nuove})
+        creati += len(nuove)
+
+    if da_espandere:
+        db.flush()
+    return creati
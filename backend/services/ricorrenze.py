@@ -0,0 +1,126 @@
+"""
+Generazione delle date di una prenotazione ricorrente.
+Le date sono calcolate aritmeticamente (si salta direttamente al giorno
+successivo valido) e prodotte in modo pigro: anche intervalli molto ampi
+non occupano memoria finché non vengono consumati.
+"""
+
+import calendar
+import math
+from datetime import date, timedelta
+from typing import Container, Iterable, Iterator, Optional
+
+from backend.config import settings
+from backend.models.enums import TipoRicorrenza
+
+
+class CalendarioChiusure:
+    """
+    Giorni di chiusura: date puntuali più festività ricorrenti ('MM-DD').
+    Supporta l'operatore `in` su oggetti date.
+    """
+
+    def __init__(self, giorni: Iterable[date] = (), ricorrenti: Iterable[str] = ()):
+        self.giorni = set(giorni)
+        self.ricorrenti = set(ricorrenti)
+
+    def __contains__(self, giorno: date) -> bool:
+        return giorno in self.giorni or giorno.strftime("%m-%d") in self.ricorrenti
+
+    @classmethod
+    def da_impostazioni(cls) -> "CalendarioChiusure":
+        """Calendario configurato in Settings (giorni_chiusura, festivita_ricorrenti)."""
+        return cls(settings.giorni_chiusura, settings.festivita_ricorrenti)
+
+
+def _settimanale(inizio: date, fine: date, giorni: list[int], passo_settimane: int) -> Iterator[date]:
+    lunedi = inizio - timedelta(days=inizio.weekday())
+    passo = timedelta(weeks=passo_settimane)
+    while lunedi <= fine:
+        for g in giorni:
+            giorno = lunedi + timedelta(days=g - 1)
+            if inizio <= giorno <= fine:
+                yield giorno
+        lunedi += passo
+
+
+def _giornaliera(inizio: date, fine: date, giorni: list[int], passo_giorni: int) -> Iterator[date]:
+    if not giorni:
+        giorno = inizio
+        passo = timedelta(days=passo_giorni)
+        while giorno <= fine:
+            yield giorno
+            giorno += passo
+        return
+    # Con il filtro sui giorni lo schema si ripete ogni mcm(passo, 7) giorni:
+    # gli scarti validi si calcolano una volta e si avanza di ciclo in ciclo
+    ciclo = math.lcm(passo_giorni, 7)
+    scarti = [timedelta(days=s) for s in range(0, ciclo, passo_giorni)
+              if (inizio + timedelta(days=s)).isoweekday() in giorni]
+    if not scarti:
+        return
+    base = inizio
+    while base <= fine:
+        for scarto in scarti:
+            giorno = base + scarto
+            if giorno > fine:
+                return
+            yield giorno
+        base += timedelta(days=ciclo)
+
+
+def _mensile(inizio: date, fine: date, passo_mesi: int) -> Iterator[date]:
+    # Stesso giorno del mese di `inizio`; i mesi che non lo hanno vengono saltati
+    mesi = inizio.year * 12 + inizio.month - 1
+    while True:
+        anno, mese = divmod(mesi, 12)
+        mese += 1
+        if date(anno, mese, 1) > fine:
+            return
+        if inizio.day <= calendar.monthrange(anno, mese)[1]:
+            giorno = date(anno, mese, inizio.day)
+            if giorno <= fine:
+                yield giorno
+        mesi += passo_mesi
+
+
+def itera_date_ricorrenza(
+    data_inizio: date,
+    data_fine: date,
+    tipo: TipoRicorrenza,
+    giorni_settimana: Optional[list[int]] = None,
+    intervallo: int = 1,
+    chiusure: Optional[Container[date]] = None,
+) -> Iterator[date]:
+    """
+    Date della ricorrenza in ordine crescente, senza duplicati.
+    isoweekday(): 1=lunedì … 7=domenica
+
+    GIORNALIERA:   ogni `intervallo` giorni (solo nei giorni_settimana, se indicati)
+    SETTIMANALE:   ogni `intervallo` settimane nei giorni_settimana
+    BISETTIMANALE: come SETTIMANALE, a settimane alterne (passo 2 × intervallo)
+    MENSILE:       ogni `intervallo` mesi, stesso giorno del mese di data_inizio
+
+    Le settimane sono contate dal lunedì della settimana di data_inizio.
+    Le date contenute in `chiusure` (es. CalendarioChiusure) vengono saltate.
+    I parametri sono validati subito; le date sono prodotte su richiesta.
+    """
+    if intervallo < 1:
+        raise ValueError("intervallo deve essere almeno 1")
+    giorni = sorted(set(giorni_settimana or []))
+
+    if tipo == TipoRicorrenza.GIORNALIERA:
+        date_generate = _giornaliera(data_inizio, data_fine, giorni, intervallo)
+    elif tipo in (TipoRicorrenza.SETTIMANALE, TipoRicorrenza.BISETTIMANALE):
+        if not giorni:
+            raise ValueError("giorni_settimana obbligatorio per ricorrenze settimanali")
+        passo = intervallo * (2 if tipo == TipoRicorrenza.BISETTIMANALE else 1)
+        date_generate = _settimanale(data_inizio, data_fine, giorni, passo)
+    elif tipo == TipoRicorrenza.MENSILE:
+        date_generate = _mensile(data_inizio, data_fine, intervallo)
+    else:
+        raise ValueError(f"Tipo di ricorrenza non gestito: {tipo}")
+
+    if chiusure is None:
+        return date_generate
+    return (giorno for giorno in date_generate if giorno not in chiusure)
@@ -0,0 +1,250 @@
+"""
+Servizio Statistiche - saturazione delle aule calcolata in SQL.
+Per gli slot confermati minuti e conteggi si leggono dal riepilogo
+occupazione_giornaliera (una riga per aula e giorno); con altri stati si
+aggregano direttamente su slot_orari a partire da ora_inizio/ora_fine.
+Il picco di concorrenza tra più aule usa una somma cumulativa (funzione
+finestra) sugli eventi di inizio/fine degli slot. Le occorrenze delle
+regole ricorrenti non ancora materializzate si aggiungono in memoria.
+"""
+
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, func, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from backend.config import settings
+from backend.models import Aula, OccupazioneGiornaliera, Prenotazione, Sede, SlotOrario
+from backend.models.enums import StatoPrenotazione
+from backend.services.disponibilita_service import MAX_GIORNI
+from backend.services.intervalli import a_minuti, picco_concorrenza
+from backend.services.occupazione_service import STATI_RIEPILOGO
+from backend.services.regole_service import occorrenze_virtuali
+
+GRUPPI = ("sede", "aula", "giorno", "settimana", "mese")
+
+
+def _chiave_sql(gruppo: str, aula_id, data):
+    """Espressione SQL della chiave di raggruppamento sulle colonne indicate."""
+    return {
+        "sede":      Aula.sede_id,
+        "aula":      aula_id,
+        "giorno":    data,
+        "settimana": func.subdate(data, func.weekday(data)),
+        "mese":      func.date_format(data, "%Y-%m"),
+    }[gruppo]
+
+
+def _chiave_data(d: date, gruppo: str) -> str:
+    """Chiave temporale calcolata in Python, coerente con _chiave_sql."""
+    if gruppo == "settimana":
+        return (d - timedelta(days=d.weekday())).isoformat()
+    if gruppo == "mese":
+        return d.strftime("%Y-%m")
+    return d.isoformat()
+
+
+def _partizione(gruppo: str) -> list:
+    """Colonne entro cui misurare la concorrenza (sempre per singolo giorno)."""
+    if gruppo == "aula":
+        return [SlotOrario.aula_id, SlotOrario.data]
+    if gruppo == "sede":
+        return [Aula.sede_id, SlotOrario.data]
+    return [SlotOrario.data]
+
+
+def calcola_saturazione(
+    db: Session,
+    data_dal: date,
+    data_al: date,
+    gruppo: str = "aula",
+    sede_id: Optional[int] = None,
+    aula_id: Optional[int] = None,
+    stati: Optional[list[StatoPrenotazione]] = None,
+) -> list[dict]:
+    """
+    Saturazione per gruppo nel periodo richiesto.
+
+    Ogni riga contiene `chiave`, `numero_slot`, `minuti_prenotati`,
+    `minuti_disponibili` (orario di apertura × giorni di apertura × aule),
+    `percentuale` e `picco_concorrenza`. Per i gruppi sede/aula compaiono
+    anche le aule/sedi senza prenotazioni; per quelli temporali tutti i
+    periodi della finestra. Solleva ValueError su parametri non validi.
+    """
+    if gruppo not in GRUPPI:
+        raise ValueError(f"Raggruppamento non valido: {gruppo}")
+    if data_al < data_dal:
+        raise ValueError("data_al deve essere successiva o uguale a data_dal")
+    if (data_al - data_dal).days >= MAX_GIORNI:
+        raise ValueError(f"Intervallo massimo consentito: {MAX_GIORNI} giorni")
+
+    # ── Aule in ambito (base dei minuti disponibili) ─────────────────────────
+    query_aule = db.query(Aula.id, Aula.nome, Aula.sede_id, Sede.nome)\
+                   .join(Sede, Aula.sede_id == Sede.id)\
+                   .filter(Aula.attiva == 1)
+    if sede_id:
+        query_aule = query_aule.filter(Aula.sede_id == sede_id)
+    if aula_id:
+        query_aule = query_aule.filter(Aula.id == aula_id)
+    aule = query_aule.order_by(Aula.sede_id, Aula.id).all()
+
+    minuti_giorno = a_minuti(settings.orario_chiusura) - a_minuti(settings.orario_apertura)
+    giorni_per_chiave: dict[str, int] = {}
+    d = data_dal
+    while d <= data_al:
+        k = _chiave_data(d, gruppo)
+        giorni_per_chiave.setdefault(k, 0)
+        if d.isoweekday() in settings.giorni_apertura:
+            giorni_per_chiave[k] += 1
+        d += timedelta(days=1)
+    giorni_apertura = sum(giorni_per_chiave.values())
+
+    righe: dict[str, dict] = {}
+    if gruppo == "aula":
+        for a in aule:
+            righe[str(a[0])] = {"aula_id": a[0], "aula_nome": a[1], "sede_id": a[2],
+                                "minuti_disponibili": giorni_apertura * minuti_giorno}
+    elif gruppo == "sede":
+        for a in aule:
+            riga = righe.setdefault(str(a[2]), {"sede_id": a[2], "sede_nome": a[3],
+                                                "minuti_disponibili": 0})
+            riga["minuti_disponibili"] += giorni_apertura * minuti_giorno
+    else:
+        for k, giorni in giorni_per_chiave.items():
+            righe[k] = {"minuti_disponibili": giorni * minuti_giorno * len(aule)}
+
+    # ── Filtro comune sugli slot ─────────────────────────────────────────────
+    stati = stati or [StatoPrenotazione.CONFERMATA]
+    filtro = and_(
+        SlotOrario.data >= data_dal,
+        SlotOrario.data <= data_al,
+        SlotOrario.annullato == False,
+        Prenotazione.stato.in_(stati),
+        *([Aula.sede_id == sede_id] if sede_id else []),
+        *([SlotOrario.aula_id == aula_id] if aula_id else []),
+    )
+
+    def _da_slot(*colonne):
+        return (
+            select(*colonne)
+            .select_from(SlotOrario)
+            .join(Prenotazione, SlotOrario.prenotazione_id == Prenotazione.id)
+            .join(Aula, SlotOrario.aula_id == Aula.id)
+            .where(filtro)
+        )
+
+    usa_riepilogo = set(stati) == set(STATI_RIEPILOGO)
+    if usa_riepilogo:
+        # Riepilogo giornaliero: O(giorni × aule) righe invece di tutti gli slot
+        og = OccupazioneGiornaliera
+        chiave = _chiave_sql(gruppo, og.aula_id, og.data)
+        totali = db.execute(
+            select(chiave.label("chiave"),
+                   func.sum(og.numero_slot).label("numero_slot"),
+                   func.sum(og.minuti_prenotati).label("minuti"),
+                   func.max(og.picco_concorrenza).label("picco"))
+            .select_from(og)
+            .join(Aula, og.aula_id == Aula.id)
+            .where(og.data >= data_dal, og.data <= data_al, og.numero_slot > 0,
+                   *([Aula.sede_id == sede_id] if sede_id else []),
+                   *([og.aula_id == aula_id] if aula_id else []))
+            .group_by(chiave)
+        ).all()
+    else:
+        chiave = _chiave_sql(gruppo, SlotOrario.aula_id, SlotOrario.data)
+        minuti = (func.time_to_sec(SlotOrario.ora_fine) - func.time_to_sec(SlotOrario.ora_inizio)) / 60
+        totali = db.execute(
+            _da_slot(chiave.label("chiave"), func.count().label("numero_slot"),
+                     func.coalesce(func.sum(minuti), 0).label("minuti"),
+                     literal(None).label("picco"))
+            .group_by(chiave)
+        ).all()
+
+    # ── Picco di concorrenza: +1 all'inizio, -1 alla fine, somma cumulativa ──
+    # Per aula il riepilogo lo contiene già; tra più aule serve il dettaglio slot
+    picchi = {}
+    if not (usa_riepilogo and gruppo == "aula"):
+        chiave = _chiave_sql(gruppo, SlotOrario.aula_id, SlotOrario.data)
+        partizione = _partizione(gruppo)
+        eventi = union_all(
+            _da_slot(chiave.label("chiave"), *partizione,
+                     SlotOrario.ora_inizio.label("istante"), literal(1).label("delta")),
+            _da_slot(chiave.label("chiave"), *partizione,
+                     SlotOrario.ora_fine.label("istante"), literal(-1).label("delta")),
+        ).subquery()
+        # A parità di istante le uscite (-1) precedono gli ingressi: 9-10 e 10-11 non si sovrappongono
+        cumulata = select(
+            eventi.c.chiave,
+            func.sum(eventi.c.delta).over(
+                partition_by=[eventi.c[c.key] for c in partizione],
+                order_by=[eventi.c.istante, eventi.c.delta],
+            ).label("attivi"),
+        ).subquery()
+        picchi = {
+            str(k): v for k, v in db.execute(
+                select(cumulata.c.chiave, func.max(cumulata.c.attivi)).group_by(cumulata.c.chiave)
+            ).all()
+        }
+
+    for t in totali:
+        riga = righe.setdefault(str(t.chiave), {"minuti_disponibili": 0})
+        riga["numero_slot"] = int(t.numero_slot)
+        riga["minuti_prenotati"] = int(t.minuti)
+        riga["picco_concorrenza"] = int(picchi.get(str(t.chiave), t.picco) or 0)
+
+    # ── Occorrenze da regola non ancora materializzate ───────────────────────
+    virtuali = occorrenze_virtuali(db, [a[0] for a in aule], data_dal, data_al, stati)
+    if virtuali:
+        sede_di = {a[0]: a[2] for a in aule}
+
+        def chiave_di(aula_id: int, d: date) -> str:
+            if gruppo == "aula":
+                return str(aula_id)
+            if gruppo == "sede":
+                return str(sede_di[aula_id])
+            return _chiave_data(d, gruppo)
+
+        def partizione_di(aula_id: int, d: date) -> tuple:
+            if gruppo == "aula":
+                return aula_id, d
+            if gruppo == "sede":
+                return sede_di[aula_id], d
+            return (d,)
+
+        # Il picco va ricalcolato nelle partizioni toccate, insieme agli slot reali
+        intervalli: dict[tuple, list[tuple[int, int]]] = defaultdict(list)
+        chiave_partizione: dict[tuple, str] = {}
+        for v in virtuali:
+            p = partizione_di(v.aula_id, v.data)
+            intervalli[p].append((v.inizio, v.fine))
+            chiave_partizione[p] = chiave_di(v.aula_id, v.data)
+            riga = righe.setdefault(chiave_di(v.aula_id, v.data), {"minuti_disponibili": 0})
+            riga["numero_slot"] = riga.get("numero_slot", 0) + 1
+            riga["minuti_prenotati"] = riga.get("minuti_prenotati", 0) + v.fine - v.inizio
+
+        giorni = sorted({v.data for v in virtuali})
+        for r in db.execute(_da_slot(SlotOrario.aula_id, SlotOrario.data,
+                                     SlotOrario.ora_inizio, SlotOrario.ora_fine)
+                            .where(SlotOrario.data.in_(giorni))):
+            p = partizione_di(r.aula_id, r.data)
+            if p in intervalli:
+                intervalli[p].append((a_minuti(r.ora_inizio), a_minuti(r.ora_fine)))
+        for p, lista in intervalli.items():
+            riga = righe[chiave_partizione[p]]
+            riga["picco_concorrenza"] = max(riga.get("picco_concorrenza", 0),
+                                            picco_concorrenza(lista))
+
+    risultato = []
+    for k in sorted(righe, key=lambda k: (int(k),) if gruppo in ("sede", "aula") else (k,)):
+        riga = righe[k]
+        riga.setdefault("numero_slot", 0)
+        riga.setdefault("minuti_prenotati", 0)
+        riga.setdefault("picco_concorrenza", 0)
+        disponibili = riga["minuti_disponibili"]
+        riga["percentuale"] = (
+            round(riga["minuti_prenotati"] / disponibili * 100, 1) if disponibili else 0.0
+        )
+        risultato.append({"chiave": k, **riga})
+    return risultato
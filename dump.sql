@@ -207,7 +207,7 @@ CREATE TABLE `conflitti_prenotazione` (
   `slot_id_2` int(11) DEFAULT NULL,
   `tipo_conflitto` enum('OVERLAP_ORARIO','DOPPIA_PRENOTAZIONE','ALTRO') NOT NULL,
   `rilevato_il` datetime NOT NULL,
-  `stato_risoluzione` enum('RISOLTO_MANTENUTA_1','RISOLTO_MANTENUTA_2','RISOLTO_ELIMINATE_ENTRAMBE') DEFAULT NULL,
+  `stato_risoluzione` enum('RISOLTO_MANTENUTA_1','RISOLTO_MANTENUTA_2','RISOLTO_ELIMINATE_ENTRAMBE','CHIUSO_AUTOMATICAMENTE') DEFAULT NULL,
   `risolto_il` datetime DEFAULT NULL,
   `risolto_da` int(11) DEFAULT NULL,
   `note_risoluzione` text DEFAULT NULL,
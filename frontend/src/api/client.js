@@ -6,7 +6,7 @@ function getToken() {
   return localStorage.getItem('ice_token')
 }
 
-async function request(method, path, body = null, params = null) {
+async function request(method, path, body = null, params = null, conHeaders = false) {
   const headers = { 'Content-Type': 'application/json' }
   const token = getToken()
   if (token) headers['Authorization'] = `Bearer ${token}`
@@ -43,6 +43,7 @@ async function request(method, path, body = null, params = null) {
 
     // 204 No Content
     if (res.status === 204) return null
+    if (conHeaders) return { dati: await res.json(), headers: res.headers }
     return res.json()
 
   } catch (error) {
@@ -63,6 +64,12 @@ export const apiPut    = (path, body)          => request('PUT',    path, body)
 export const apiPatch  = (path, body)          => request('PATCH',  path, body)
 export const apiDelete = (path)                => request('DELETE', path)
 
+/** GET paginato (keyset): restituisce { dati, cursore } — cursore null all'ultima pagina */
+export async function apiGetPagina(path, params) {
+  const { dati, headers } = await request('GET', path, null, params, true)
+  return { dati, cursore: headers.get('X-Next-Cursor') }
+}
+
 /** Scarica un blob (CSV, PDF) */
 export async function apiDownload(path, filename, params = null) {
   const headers = {}
@@ -2,21 +2,47 @@
 // API — Prenotazioni
 // ─────────────────────────────────────────────────────────────────────────────
 
-import { apiGet, apiPost, apiPatch, apiDelete } from './client'
+import { apiGet, apiGetPagina, apiPost, apiPatch, apiDelete } from './client'
+
+// Dimensione massima di pagina accettata da GET /prenotazioni
+const LIMITE_PAGINA = 500
 
 /**
- * Lista prenotazioni con filtri opzionali.
- * @param {{ sede_id?, corso_id?, stato?, data_dal?, data_al? }} params
+ * Lista completa delle prenotazioni con filtri opzionali: il backend
+ * restituisce pagine limitate, qui si segue X-Next-Cursor fino all'ultima.
+ * @param {{ sede_id?, corso_id?, stato?, data_dal?, data_al?,
+ *           fields?, include_slots?, solo_slot_nel_range? }} params
  */
 export async function getPrenotazioni(params = {}) {
-  const qs = new URLSearchParams()
-  if (params.sede_id)  qs.set('sede_id',  params.sede_id)
-  if (params.corso_id) qs.set('corso_id', params.corso_id)
-  if (params.stato)    qs.set('stato',    params.stato)
-  if (params.data_dal) qs.set('data_dal', params.data_dal)
-  if (params.data_al)  qs.set('data_al',  params.data_al)
-  const query = qs.toString() ? `?${qs}` : ''
-  return apiGet(`/prenotazioni/${query}`)
+  const filtri = {
+    sede_id:  params.sede_id  || null,
+    corso_id: params.corso_id || null,
+    stato:    params.stato    || null,
+    data_dal: params.data_dal || null,
+    data_al:  params.data_al  || null,
+    fields:   params.fields   || null,
+    include_slots:       params.include_slots,
+    solo_slot_nel_range: params.solo_slot_nel_range,
+  }
+  const tutte = []
+  let cursore = null
+  do {
+    const pagina = await getPrenotazioniPagina(filtri, LIMITE_PAGINA, cursore)
+    tutte.push(...pagina.dati)
+    cursore = pagina.cursore
+  } while (cursore)
+  return tutte
+}
+
+/**
+ * Una pagina di prenotazioni (paginazione keyset).
+ * @param {object} params  stessi filtri di getPrenotazioni
+ * @param {number} limite
+ * @param {string|null} cursore  valore restituito dalla pagina precedente
+ * @returns {Promise<{ dati: Array, cursore: string|null }>}
+ */
+export async function getPrenotazioniPagina(params = {}, limite = 50, cursore = null) {
+  return apiGetPagina('/prenotazioni/', { ...params, limite, cursore })
 }
 
 /**
@@ -37,12 +63,22 @@ export async function creaPrenotazione(payload) {
 
 /**
  * Crea Prenotazione massiva.
- * @param {{ aula_id, corso_id, data_inizio, data_fine, ora_inizio, ora_fine, tipo_ricorrenza, giorni_settimana?, note? }} payload
+ * @param {{ aula_id, corso_id, data_inizio, data_fine, ora_inizio, ora_fine, tipo_ricorrenza, giorni_settimana?, intervallo?, salta_chiusure?, note? }} payload
  */
 export async function creaPrenotazioneMassiva(payload) {
   return apiPost('/prenotazioni/massiva', payload)
 }
 
+/**
+ * Anteprima conflitti di una prenotazione singola o massiva, senza salvarla.
+ * Stesso payload di creaPrenotazione / creaPrenotazioneMassiva.
+ * @returns {Promise<{ tipo, aula_id, date_totali, date_in_conflitto,
+ *           date: Array<{ data, ora_inizio, ora_fine, conflitti, orari_liberi, aule_libere }> }>}
+ */
+export async function anteprimaPrenotazione(payload) {
+  return apiPost('/prenotazioni/anteprima', payload)
+}
+
 /**
  * Dettaglio singola prenotazione.
  */
@@ -73,19 +109,39 @@ export async function cancellaPrenotazione(id) {
 }
 
 /**
- * Slot occupati per un'aula in un range di date.
+ * Intervalli liberi per giorno di un'aula: [{ data, liberi: [['08:00', '10:00'], …] }].
+ * @param {{ durata_minima?, ora_apertura?, ora_chiusura? }} opzioni
  */
-export async function getSlotLiberi(aulaId, dataDal, dataAl) {
-  return apiGet(`/prenotazioni/slot-liberi/${aulaId}?data_dal=${dataDal}&data_al=${dataAl}`)
+export async function getSlotLiberi(aulaId, dataDal, dataAl, opzioni = {}) {
+  return apiGet(`/prenotazioni/slot-liberi/${aulaId}`, {
+    data_dal: dataDal, data_al: dataAl, ...opzioni,
+  })
 }
 
 /**
- * Calendario (usa lista prenotazioni con range date).
+ * Intervalli liberi di tutte le aule di una sede: [{ aula_id, giorni: [...] }].
+ * @param {{ durata_minima?, ora_apertura?, ora_chiusura? }} opzioni
  */
-export async function getCalendario(dataInizio, dataFine, sedeId = null) {
-  const params = { data_dal: dataInizio, data_al: dataFine }
-  if (sedeId) params.sede_id = sedeId
-  return getPrenotazioni(params)
+export async function getSlotLiberiSede(sedeId, dataDal, dataAl, opzioni = {}) {
+  return apiGet('/prenotazioni/slot-liberi', {
+    sede_id: sedeId, data_dal: dataDal, data_al: dataAl, ...opzioni,
+  })
+}
+
+/**
+ * Feed calendario: slot già uniti ad aula, corso e docente, ordinati per
+ * data, ora di inizio e aula. Il formato compatto { colonne, righe } viene
+ * convertito in una lista di oggetti.
+ * @param {{ aulaId? }} opzioni
+ */
+export async function getCalendario(dataInizio, dataFine, sedeId = null, opzioni = {}) {
+  const { colonne, righe } = await apiGet('/calendario/', {
+    data_dal: dataInizio,
+    data_al:  dataFine,
+    sede_id:  sedeId || null,
+    aula_id:  opzioni.aulaId || null,
+  })
+  return righe.map(r => Object.fromEntries(colonne.map((c, i) => [c, r[i]])))
 }
 
 /**
@@ -103,6 +159,7 @@ export async function getConflitti(params = {}) {
   const qs = new URLSearchParams()
   if (params.sede_id !== undefined)     qs.set('sede_id',     params.sede_id)
   if (params.solo_attivi !== undefined) qs.set('solo_attivi', params.solo_attivi)
+  if (params.expand)                    qs.set('expand',      params.expand)  // es. 'slots,aule,corsi'
   const query = qs.toString() ? `?${qs}` : ''
   return apiGet(`/conflitti/${query}`)
 }
@@ -117,6 +174,17 @@ export async function risolviConflitto(id, azione, note = '') {
   return apiPost(`/conflitti/${id}/risolvi?${qs}`)
 }
 
+/**
+ * Risoluzione in blocco, in un'unica transazione.
+ * @param {object} payload - { azioni: [{ conflitto_id, azione }] } oppure
+ *   { politica: 'mantieni_meno_recente' | 'mantieni_corso_prioritario',
+ *     sede_id, data_dal, data_al, corsi_prioritari }
+ *   (con la politica servono la sede oppure data_dal e data_al)
+ */
+export async function risolviConflittiInBlocco(payload) {
+  return apiPost('/conflitti/risolvi', payload)
+}
+
 export async function getStatsConflitti(sedeId = null) {
   const query = sedeId ? `?sede_id=${sedeId}` : ''
   return apiGet(`/conflitti/stats/summary${query}`)
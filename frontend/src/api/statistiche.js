@@ -0,0 +1,16 @@
+// ─────────────────────────────────────────────────────────────────────────────
+// API — Statistiche
+// ─────────────────────────────────────────────────────────────────────────────
+
+import { apiGet } from './client'
+
+/**
+ * Saturazione aule aggregata lato server.
+ * Righe: { chiave, numero_slot, minuti_prenotati, minuti_disponibili,
+ *          percentuale, picco_concorrenza, ... }
+ * @param {{ data_dal, data_al, gruppo?: 'sede'|'aula'|'giorno'|'settimana'|'mese',
+ *           sede_id?, aula_id? }} params
+ */
+export async function getSaturazione(params) {
+  return apiGet('/statistiche/saturazione', params)
+}
@@ -4,41 +4,49 @@ import { getConflitti } from '@/api/prenotazioni'
 export function useConflittiAlert() {
     const alertConflitti = ref(null)
 
+    function mostraAlert(numeroConflitti, tipo) {
+        if (numeroConflitti === 0) return
+        const msgTipo = tipo === 'massiva' ? 'prenotazioni ricorrenti' : 'prenotazione'
+        const conflittoTesto = numeroConflitti > 1
+            ? `sono stati rilevati ${numeroConflitti} conflitti`
+            : 'è stato rilevato 1 conflitto'
+        const gestireTesto = numeroConflitti > 1 ? 'gestirli' : 'gestirlo'
+
+        alertConflitti.value = {
+            tipo: 'warning',
+            msg: `Attenzione: la tua ${msgTipo} è stata creata ma ${conflittoTesto} con altre prenotazioni. Vai alla sezione "Mie Prenotazioni" per ${gestireTesto}.`
+        }
+    }
+
     /**
      * Verifica se la prenotazione appena creata ha generato conflitti
-     * @param {number} prenotazioneId - ID della prenotazione appena creata
+     * @param {object|number} prenotazione - Risposta della creazione (con conflitti_rilevati)
+     *                                        oppure ID della prenotazione
      * @param {string} tipo - 'singola' o 'massiva'
      * @returns {Promise<{hasConflitti: boolean, numeroConflitti: number}>}
      */
-    async function verificaConflittiNuovaPrenotazione(prenotazioneId, tipo = 'singola') {
+    async function verificaConflittiNuovaPrenotazione(prenotazione, tipo = 'singola') {
+        // La risposta di creazione riporta già i conflitti: nessuna richiesta aggiuntiva
+        if (Array.isArray(prenotazione?.conflitti_rilevati)) {
+            const numeroConflitti = prenotazione.conflitti_rilevati.length
+            mostraAlert(numeroConflitti, tipo)
+            return { hasConflitti: numeroConflitti > 0, numeroConflitti }
+        }
+
+        const prenotazioneId = typeof prenotazione === 'object' ? prenotazione?.id : prenotazione
         try {
             // Carica tutti i conflitti attivi
             const conflitti = await getConflitti({ solo_attivi: true })
             const listaConflitti = Array.isArray(conflitti) ? conflitti : (conflitti?.items || [])
 
             // Trova conflitti che coinvolgono questa prenotazione
-            const conflittiPrenotazione = listaConflitti.filter(cf =>
+            const numeroConflitti = listaConflitti.filter(cf =>
                 cf.prenotazione_id_1 === prenotazioneId ||
                 cf.prenotazione_id_2 === prenotazioneId
-            )
-
-            const numeroConflitti = conflittiPrenotazione.length
-            const hasConflitti = numeroConflitti > 0
-
-            if (hasConflitti) {
-                const msgTipo = tipo === 'massiva' ? 'prenotazioni ricorrenti' : 'prenotazione'
-                const conflittoTesto = numeroConflitti > 1
-                    ? `sono stati rilevati ${numeroConflitti} conflitti`
-                    : 'è stato rilevato 1 conflitto'
-                const gestireTesto = numeroConflitti > 1 ? 'gestirli' : 'gestirlo'
-
-                alertConflitti.value = {
-                    tipo: 'warning',
-                    msg: `Attenzione: la tua ${msgTipo} è stata creata ma ${conflittoTesto} con altre prenotazioni. Vai alla sezione "Mie Prenotazioni" per ${gestireTesto}.`
-                }
-            }
+            ).length
 
-            return { hasConflitti, numeroConflitti }
+            mostraAlert(numeroConflitti, tipo)
+            return { hasConflitti: numeroConflitti > 0, numeroConflitti }
         } catch (error) {
             console.warn('Errore verifica conflitti:', error)
             return { hasConflitti: false, numeroConflitti: 0 }
@@ -54,4 +62,4 @@ export function useConflittiAlert() {
         verificaConflittiNuovaPrenotazione,
         resetAlert
     }
-}
\ No newline at end of file
+}
@@ -14,3 +14,21 @@ ALTER DATABASE planning_aule CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
 --     ('Asti'),
 --     ('Novara'),
 --     ('Biella');
+
+-- ── Indice coprente per ricerche conflitti / disponibilità su slot_orari ─────
+-- Le tabelle nascono da SQLAlchemy (che crea già l'indice); questo blocco serve
+-- per applicarlo a mano su installazioni esistenti ed è idempotente:
+-- MySQL 8.0 non supporta CREATE INDEX IF NOT EXISTS, quindi si controlla
+-- information_schema. ALGORITHM=INPLACE, LOCK=NONE: nessun blocco delle scritture.
+SET @sql_indice_slot := IF(
+    EXISTS (SELECT 1 FROM information_schema.tables
+            WHERE table_schema = DATABASE() AND table_name = 'slot_orari')
+    AND NOT EXISTS (SELECT 1 FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = 'slot_orari'
+              AND index_name = 'ix_slot_orari_aula_data_annullato'),
+    'ALTER TABLE slot_orari ADD INDEX ix_slot_orari_aula_data_annullato (aula_id, data, annullato, ora_inizio, ora_fine), ALGORITHM=INPLACE, LOCK=NONE',
+    'DO 0'
+);
+PREPARE stmt_indice_slot FROM @sql_indice_slot;
+EXECUTE stmt_indice_slot;
+DEALLOCATE PREPARE stmt_indice_slot;
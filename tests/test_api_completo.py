@@ -6,6 +6,7 @@ Utilizzo:
     pytest tests/test_api_completo.py -v
 """
 
+import json
 import os
 import pytest
 import httpx
@@ -19,6 +20,7 @@ PASSWORD_OP = os.getenv("SMOOTH_PASSWORD_OP", os.getenv("SMOKE_PASSWORD_OP", PAS
 AULA_ID_A   = int(os.getenv("TEST_AULA_A",  "1"))
 AULA_ID_B   = int(os.getenv("TEST_AULA_B",  "2"))
 CORSO_ID    = int(os.getenv("TEST_CORSO_ID", "1"))
+DOCENTE_ID  = int(os.getenv("TEST_DOCENTE_ID", "1"))
 SEDE_ID     = int(os.getenv("TEST_SEDE_ID",  "1"))
 
 DOMANI = (date.today() + timedelta(days=1)).isoformat()
@@ -138,6 +140,49 @@ class TestUtenti:
         })
         assert r.status_code == 400
 
+    def test_disattivazione_immediata_con_cache(self, coord):
+        """Il token di un utente disattivato va respinto subito, non alla scadenza della cache."""
+        email = "test.cache.utenti@test.it"
+        r = coord.post("/utenti/", json={
+            "nome": "Cache", "cognome": "Utenti", "email": email,
+            "password": "password123", "ruolo": "OPERATIVO", "sede_id": SEDE_ID,
+        })
+        if r.status_code == 409:
+            pytest.skip("Utente test già esistente nel DB")
+        uid = ok(r, "POST /utenti/ cache")["id"]
+        utente = _login(email, "password123")
+        try:
+            ok(utente.get("/auth/me"), "GET /auth/me (carica la cache)")
+            ok(utente.get("/auth/me"), "GET /auth/me (dalla cache)")
+            assert coord.delete(f"/utenti/{uid}").status_code == 200
+            assert utente.get("/auth/me").status_code == 403
+        finally:
+            utente.close()
+
+    def test_metriche_cache_utenti(self, coord, operativo):
+        data = ok(coord.get("/sistema/metriche"), "GET /sistema/metriche")
+        cache = data["cache_utenti"]
+        assert cache["hit"] + cache["miss"] > 0
+        assert 0 <= cache["hit_ratio"] <= 1
+        assert operativo.get("/sistema/metriche").status_code == 403
+
+    def test_metriche_pool_hash(self, coord):
+        # Il login delle fixture è già passato dal pool bcrypt
+        pool = ok(coord.get("/sistema/metriche"), "GET /sistema/metriche")["pool_hash"]
+        assert pool["workers"] >= 1
+        assert pool["completati"] > 0
+        assert pool["in_coda"] >= 0 and pool["coda_massima"] >= 1
+
+    def test_metriche_pool_db(self, coord):
+        pool_db = ok(coord.get("/sistema/metriche"), "GET /sistema/metriche")["pool_db"]
+        for motore in ("sincrono", "asincrono"):
+            stato = pool_db[motore]
+            assert stato["pool_size"] >= 1
+            assert 0 <= stato["in_uso"] <= stato["pool_size"] + stato["max_overflow"]
+            assert stato["attesa_massima_ms"] >= stato["attesa_media_ms"] >= 0
+        # Il login delle fixture è passato dal pool sincrono
+        assert pool_db["sincrono"]["checkout"] > 0
+
     def test_operativo_non_puo_creare_utenti(self, operativo):
         r = operativo.post("/utenti/", json={
             "nome": "X", "cognome": "Y",
@@ -237,6 +282,28 @@ class TestSlotLiberi:
         data = r.json()
         assert isinstance(data, list)
 
+    def test_slot_liberi_intervalli_per_giorno(self, coord):
+        data = ok(coord.get(f"/prenotazioni/slot-liberi/{AULA_ID_A}",
+                            params={"data_dal": DOMANI, "data_al": DOMANI,
+                                    "durata_minima": 30}),
+                  "GET slot-liberi durata_minima")
+        for giorno in data:
+            assert giorno["data"] == DOMANI
+            for inizio, fine in giorno["liberi"]:
+                assert inizio < fine
+
+    def test_slot_liberi_sede(self, coord):
+        data = ok(coord.get("/prenotazioni/slot-liberi",
+                            params={"sede_id": SEDE_ID, "data_dal": DOMANI, "data_al": TRA_7}),
+                  "GET slot-liberi sede")
+        assert isinstance(data, list)
+        assert all("aula_id" in a and "giorni" in a for a in data)
+
+    def test_slot_liberi_range_invertito(self, coord):
+        r = coord.get(f"/prenotazioni/slot-liberi/{AULA_ID_A}",
+                      params={"data_dal": TRA_7, "data_al": DOMANI})
+        assert r.status_code == 400
+
     def test_slot_liberi_aula_inesistente(self, coord):
         r = coord.get("/prenotazioni/slot-liberi/99999",
                       params={"data_dal": DOMANI, "data_al": TRA_7})
@@ -255,6 +322,39 @@ class TestPrenotazioniFiltri:
         data = ok(coord.get(f"/prenotazioni/?corso_id={CORSO_ID}"), "filtro corso")
         assert isinstance(data, list)
 
+    def test_paginazione_keyset(self, coord):
+        r = coord.get("/prenotazioni/", params={"limite": 2})
+        pagina1 = ok(r, "pagina 1")
+        assert len(pagina1) <= 2
+        cursore = r.headers.get("X-Next-Cursor")
+        if cursore:
+            pagina2 = ok(coord.get("/prenotazioni/", params={"limite": 2, "cursore": cursore}),
+                         "pagina 2")
+            assert not {p["id"] for p in pagina1} & {p["id"] for p in pagina2}
+
+    def test_pagina_predefinita_limitata(self, coord):
+        r = coord.get("/prenotazioni/", params={"fields": "id"})
+        pagina = ok(r, "pagina predefinita")
+        assert len(pagina) <= 100
+        if len(pagina) == 100:
+            assert r.headers.get("X-Next-Cursor")
+        assert coord.get("/prenotazioni/", params={"limite": 501}).status_code == 422
+
+    def test_proiezione_campi(self, coord):
+        data = ok(coord.get("/prenotazioni/", params={"fields": "id,stato", "limite": 5}),
+                  "fields=id,stato")
+        assert all(set(p) == {"id", "stato"} for p in data)
+
+    def test_slot_limitati_al_range(self, coord):
+        data = ok(coord.get("/prenotazioni/", params={
+            "data_dal": DOMANI, "data_al": TRA_7, "solo_slot_nel_range": True,
+        }), "solo_slot_nel_range")
+        for p in data:
+            assert all(DOMANI <= s["data"] <= TRA_7 for s in p["slots"])
+
+    def test_cursore_non_valido(self, coord):
+        assert coord.get("/prenotazioni/", params={"cursore": "???"}).status_code == 400
+
     def test_filtro_combinato(self, coord):
         data = ok(coord.get(
             f"/prenotazioni/?sede_id={SEDE_ID}&data_dal={DOMANI}&data_al={TRA_14}"
@@ -264,8 +364,9 @@ class TestPrenotazioniFiltri:
     def test_dettaglio_prenotazione(self, coord):
         # Crea una prenotazione e verifica il dettaglio
         r = coord.post("/prenotazioni/singola", json={
-            "aula_id":  AULA_ID_A,
-            "corso_id": CORSO_ID,
+            "aula_id":    AULA_ID_A,
+            "corso_id":   CORSO_ID,
+            "docente_id": DOCENTE_ID,
             "slot": {"data": TRA_14, "ora_inizio": "10:00", "ora_fine": "12:00"},
         })
         pren_id = ok(r, "crea per dettaglio")["id"]
@@ -277,6 +378,60 @@ class TestPrenotazioniFiltri:
         coord.delete(f"/prenotazioni/{pren_id}")
 
 
+# ─── Calendario ───────────────────────────────────────────────────────────────
+
+class TestCalendario:
+    def test_feed_compatto(self, coord):
+        data = ok(coord.get("/calendario/",
+                            params={"data_dal": DOMANI, "data_al": TRA_14, "sede_id": SEDE_ID}),
+                  "GET /calendario")
+        colonne = data["colonne"]
+        assert {"slot_id", "aula_nome", "corso_titolo", "docente_nome", "ha_conflitti"} <= set(colonne)
+        righe = [dict(zip(colonne, r)) for r in data["righe"]]
+        chiavi = [(r["data"], r["ora_inizio"], r["aula_id"]) for r in righe]
+        assert chiavi == sorted(chiavi)
+        assert all(r["sede_id"] == SEDE_ID for r in righe)
+
+    def test_feed_ndjson_filtro_aula(self, coord):
+        r = coord.get("/calendario/", params={"data_dal": DOMANI, "data_al": TRA_14,
+                                              "aula_id": AULA_ID_A, "formato": "ndjson"})
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("application/x-ndjson")
+        for riga in r.text.splitlines():
+            assert json.loads(riga)["aula_id"] == AULA_ID_A
+
+    def test_feed_range_invertito(self, coord):
+        r = coord.get("/calendario/", params={"data_dal": TRA_14, "data_al": DOMANI})
+        assert r.status_code == 400
+
+
+# ─── Statistiche ──────────────────────────────────────────────────────────────
+
+class TestStatistiche:
+    def test_saturazione_per_aula(self, coord):
+        data = ok(coord.get("/statistiche/saturazione",
+                            params={"data_dal": DOMANI, "data_al": TRA_14, "sede_id": SEDE_ID}),
+                  "GET saturazione aula")
+        assert data["gruppo"] == "aula"
+        for r in data["righe"]:
+            assert r["sede_id"] == SEDE_ID
+            assert r["minuti_prenotati"] >= 0 and r["picco_concorrenza"] >= 0
+            assert 0 <= r["percentuale"]
+
+    def test_saturazione_per_mese(self, coord):
+        data = ok(coord.get("/statistiche/saturazione",
+                            params={"data_dal": DOMANI, "data_al": TRA_14, "gruppo": "mese"}),
+                  "GET saturazione mese")
+        chiavi = [r["chiave"] for r in data["righe"]]
+        assert chiavi == sorted(chiavi)
+        assert DOMANI[:7] in chiavi
+
+    def test_saturazione_gruppo_non_valido(self, coord):
+        r = coord.get("/statistiche/saturazione",
+                      params={"data_dal": DOMANI, "data_al": TRA_14, "gruppo": "anno"})
+        assert r.status_code == 422
+
+
 # ─── Conflitti — copertura completa ───────────────────────────────────────────
 
 class TestConflittiCompleto:
@@ -293,12 +448,47 @@ class TestConflittiCompleto:
         data = ok(coord.get("/conflitti/?solo_attivi=false"), "GET /conflitti/ tutti")
         assert isinstance(data, list)
 
+    def test_lista_conflitti_paginata(self, coord):
+        tutti = ok(coord.get("/conflitti/", params={"solo_attivi": False}), "tutti")
+        r = coord.get("/conflitti/", params={"solo_attivi": False, "limite": 2})
+        pagina1 = ok(r, "pagina 1")
+        assert [c["id"] for c in pagina1] == [c["id"] for c in tutti][:2]
+        cursore = r.headers.get("X-Next-Cursor")
+        assert (cursore is not None) == (len(tutti) > 2)
+        if cursore:
+            pagina2 = ok(coord.get("/conflitti/", params={
+                "solo_attivi": False, "limite": 2, "cursore": cursore,
+            }), "pagina 2")
+            assert [c["id"] for c in pagina2] == [c["id"] for c in tutti][2:4]
+        assert coord.get("/conflitti/", params={"cursore": "???"}).status_code == 400
+
+    def test_lista_conflitti_operativo_solo_proprie(self, operativo):
+        io = ok(operativo.get("/auth/me"), "GET /auth/me")["id"]
+        mie = {p["id"] for p in ok(operativo.get("/prenotazioni/", params={
+            "fields": "id,richiedente_id"}), "prenotazioni") if p["richiedente_id"] == io}
+        data = ok(operativo.get("/conflitti/"), "GET /conflitti/ operativo")
+        assert all({c["prenotazione_id_1"], c["prenotazione_id_2"]} & mie for c in data)
+
+    def test_lista_conflitti_expand(self, coord):
+        data = ok(coord.get("/conflitti/", params={"expand": "slots,aule,corsi",
+                                                   "solo_attivi": False}),
+                  "GET /conflitti/?expand")
+        for c in data:
+            for lato in ("slot_1", "slot_2"):
+                assert {"ora_inizio", "richiedente_id", "aula", "corso"} <= set(c[lato])
+        r = coord.get("/conflitti/", params={"expand": "boh"})
+        assert r.status_code == 400
+
     def test_statistiche_conflitti(self, coord):
         data = ok(coord.get("/conflitti/stats/summary"), "GET /conflitti/stats/summary")
         assert "totali" in data
         assert "attivi" in data
         assert "risolti" in data
         assert "percentuale_risolti" in data
+        assert sum(s["totali"] for s in data["per_sede"]) == data["totali"]
+        assert sum(data["per_esito"].values()) == data["totali"]
+        assert data["per_esito"]["ATTIVO"] == data["attivi"]
+        assert {"media", "p50", "p90", "p95", "massima"} <= set(data["latenza_risoluzione_secondi"])
 
     def test_statistiche_conflitti_filtro_sede(self, coord):
         data = ok(coord.get(f"/conflitti/stats/summary?sede_id={SEDE_ID}"),
@@ -322,12 +512,12 @@ class TestConflittiCompleto:
         ]:
             data_test = (date.today() + timedelta(days=20)).isoformat()
             r1 = coord.post("/prenotazioni/singola", json={
-                "aula_id": AULA_ID_A, "corso_id": CORSO_ID,
+                "aula_id": AULA_ID_A, "corso_id": CORSO_ID, "docente_id": DOCENTE_ID,
                 "slot": {"data": data_test, "ora_inizio": ora_a,
                          "ora_fine": str(int(ora_a[:2]) + 3).zfill(2) + ":00"},
             })
             r2 = coord.post("/prenotazioni/singola", json={
-                "aula_id": AULA_ID_A, "corso_id": CORSO_ID,
+                "aula_id": AULA_ID_A, "corso_id": CORSO_ID, "docente_id": DOCENTE_ID,
                 "slot": {"data": data_test, "ora_inizio": ora_b,
                          "ora_fine": str(int(ora_b[:2]) + 3).zfill(2) + ":00"},
             })
@@ -349,6 +539,68 @@ class TestConflittiCompleto:
             for pid in pren_ids:
                 coord.delete(f"/prenotazioni/{pid}")
 
+    def test_risoluzione_in_blocco(self, coord):
+        data_test = (date.today() + timedelta(days=21)).isoformat()
+        pren_ids = set()
+        for ora_inizio, ora_fine in [("08:00", "10:00"), ("09:00", "11:00")]:
+            p = ok(coord.post("/prenotazioni/singola", json={
+                "aula_id": AULA_ID_A, "corso_id": CORSO_ID, "docente_id": DOCENTE_ID,
+                "slot": {"data": data_test, "ora_inizio": ora_inizio, "ora_fine": ora_fine},
+            }), "crea prenotazione")
+            pren_ids.add(p["id"])
+
+        conflitti = ok(coord.get("/conflitti/?solo_attivi=true"), "conflitti")
+        ids = [c["id"] for c in conflitti
+               if {c["prenotazione_id_1"], c["prenotazione_id_2"]} <= pren_ids]
+        assert coord.post("/conflitti/risolvi", json={}).status_code == 422
+        r = coord.post("/conflitti/risolvi", json={"azioni": [
+            {"conflitto_id": 99999999, "azione": "mantieni_1"}]})
+        assert r.status_code == 400
+        # Politica senza sede né periodo
+        r = coord.post("/conflitti/risolvi", json={"politica": "mantieni_meno_recente"})
+        assert r.status_code == 422
+        if ids:
+            r = coord.post("/conflitti/risolvi", json={"azioni": [
+                {"conflitto_id": ids[0], "azione": "mantieni_1"},
+                {"conflitto_id": ids[0], "azione": "mantieni_2"}]})
+            assert r.status_code == 400
+
+        data = ok(coord.post("/conflitti/risolvi", json={
+            "azioni": [{"conflitto_id": i, "azione": "mantieni_1"} for i in ids],
+            "note": "test blocco",
+        }), "POST /conflitti/risolvi")
+        assert data["risolti"] == len(ids)
+        attivi = {c["id"] for c in ok(coord.get("/conflitti/?solo_attivi=true"), "conflitti")}
+        assert not attivi & set(ids)
+
+        for pid in pren_ids:
+            coord.delete(f"/prenotazioni/{pid}")
+
+    def test_flag_conflitti_dopo_risoluzione(self, coord):
+        data_test = (date.today() + timedelta(days=22)).isoformat()
+        prima, seconda = (
+            ok(coord.post("/prenotazioni/singola", json={
+                "aula_id": AULA_ID_A, "corso_id": CORSO_ID, "docente_id": DOCENTE_ID,
+                "slot": {"data": data_test, "ora_inizio": ora_inizio, "ora_fine": ora_fine},
+            }), "crea prenotazione")["id"]
+            for ora_inizio, ora_fine in [("08:00", "10:00"), ("09:00", "11:00")]
+        )
+
+        def ha_conflitti(pid):
+            richiesta = ok(coord.get(f"/prenotazioni/{pid}"), "GET /prenotazioni/{id}")["richiesta"]
+            return richiesta and richiesta["ha_conflitti"]
+
+        # Anche la prenotazione già esistente risulta in conflitto
+        assert ha_conflitti(prima)
+        cf = next(c for c in ok(coord.get("/conflitti/?solo_attivi=true"), "conflitti")
+                  if {c["prenotazione_id_1"], c["prenotazione_id_2"]} == {prima, seconda})
+        azione = "mantieni_1" if cf["prenotazione_id_1"] == prima else "mantieni_2"
+        ok(coord.post(f"/conflitti/{cf['id']}/risolvi?azione={azione}"), "risolvi")
+        assert not ha_conflitti(prima)
+
+        for pid in (prima, seconda):
+            coord.delete(f"/prenotazioni/{pid}")
+
 
 # ─── Corsi ────────────────────────────────────────────────────────────────────
 
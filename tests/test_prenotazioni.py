@@ -11,6 +11,7 @@ Requisiti: server uvicorn attivo su localhost:8000
 import os
 import pytest
 import httpx
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
 
 BASE_URL  = os.getenv("SMOKE_BASE_URL", "http://localhost:8000/api/v1")
@@ -23,6 +24,7 @@ PASSWORD_OP    = os.getenv("SMOKE_PASSWORD_OP",    PASSWORD)
 AULA_ID_A = int(os.getenv("TEST_AULA_A", "1"))
 AULA_ID_B = int(os.getenv("TEST_AULA_B", "2"))
 CORSO_ID  = int(os.getenv("TEST_CORSO_ID", "1"))
+DOCENTE_ID = int(os.getenv("TEST_DOCENTE_ID", "1"))
 
 DOMANI = (date.today() + timedelta(days=1)).isoformat()
 TRA_2  = (date.today() + timedelta(days=2)).isoformat()
@@ -62,8 +64,9 @@ def ok(r: httpx.Response, label: str):
 
 def crea_singola(client, aula_id, data, ora_inizio="08:00", ora_fine="13:00", note=""):
     return client.post("/prenotazioni/singola", json={
-        "aula_id":  aula_id,
-        "corso_id": CORSO_ID,
+        "aula_id":    aula_id,
+        "corso_id":   CORSO_ID,
+        "docente_id": DOCENTE_ID,
         "slot": {
             "data":       data,
             "ora_inizio": ora_inizio,
@@ -79,6 +82,7 @@ def crea_massiva(client, aula_id, data_inizio, data_fine,
     return client.post("/prenotazioni/massiva", json={
         "aula_id":          aula_id,
         "corso_id":         CORSO_ID,
+        "docente_id":       DOCENTE_ID,
         "data_inizio":      data_inizio,
         "data_fine":        data_fine,
         "ora_inizio":       ora_inizio,
@@ -162,6 +166,35 @@ class TestPrenotazioneMassiva:
         assert len(data["slots"]) >= 2
         coord.delete(f"/prenotazioni/{data['id']}")
 
+    def test_crea_massiva_intervallo(self, coord):
+        """Ogni 3 giorni su 9 giorni consecutivi: esattamente 3 slot."""
+        inizio = date.today() + timedelta(days=60)
+        r = coord.post("/prenotazioni/massiva", json={
+            "aula_id":          AULA_ID_A,
+            "corso_id":         CORSO_ID,
+            "docente_id":       DOCENTE_ID,
+            "data_inizio":      inizio.isoformat(),
+            "data_fine":        (inizio + timedelta(days=8)).isoformat(),
+            "ora_inizio":       "08:00",
+            "ora_fine":         "09:00",
+            "tipo_ricorrenza":  "giornaliera",
+            "intervallo":       3,
+        })
+        data = ok(r, "crea massiva intervallo")
+        assert sorted(s["data"] for s in data["slots"]) == [
+            (inizio + timedelta(days=n)).isoformat() for n in (0, 3, 6)
+        ]
+        coord.delete(f"/prenotazioni/{data['id']}")
+
+    def test_massiva_settimanale_senza_giorni_422(self, coord):
+        r = coord.post("/prenotazioni/massiva", json={
+            "aula_id": AULA_ID_A, "corso_id": CORSO_ID, "docente_id": DOCENTE_ID,
+            "data_inizio": DOMANI, "data_fine": TRA_7,
+            "ora_inizio": "08:00", "ora_fine": "09:00",
+            "tipo_ricorrenza": "settimanale", "giorni_settimana": [],
+        })
+        assert r.status_code == 422
+
     def test_annulla_slot_singolo(self, coord):
         r = crea_massiva(coord, AULA_ID_A, DOMANI, TRA_7)
         data = ok(r, "crea per annulla slot")
@@ -277,6 +310,21 @@ class TestConflitti:
         coord.delete(f"/prenotazioni/{p1['id']}")
         coord.delete(f"/prenotazioni/{p2['id']}")
 
+    def test_conflitti_nella_risposta_di_creazione(self, coord):
+        """La creazione restituisce i conflitti rilevati senza bisogno di GET /conflitti."""
+        p1 = ok(crea_singola(coord, AULA_ID_A, TRA_3, "08:00", "10:00"), "crea p1")
+        assert p1["conflitti_rilevati"] == []
+        p2 = ok(crea_singola(coord, AULA_ID_A, TRA_3, "09:00", "11:00"), "crea p2")
+
+        assert p2["prenotazioni_in_conflitto"] == [p1["id"]]
+        conflitto = p2["conflitti_rilevati"][0]
+        assert {conflitto["slot_id_1"], conflitto["slot_id_2"]} == {
+            p1["slots"][0]["id"], p2["slots"][0]["id"]
+        }
+
+        coord.delete(f"/prenotazioni/{p1['id']}")
+        coord.delete(f"/prenotazioni/{p2['id']}")
+
     def test_modifica_slot_chiude_conflitto(self, coord):
         """Dopo modifica dello slot in orario diverso, il conflitto deve chiudersi."""
         r1 = crea_singola(coord, AULA_ID_A, TRA_2, "08:00", "13:00")
@@ -304,6 +352,28 @@ class TestConflitti:
         coord.delete(f"/prenotazioni/{p1['id']}")
         coord.delete(f"/prenotazioni/{p2['id']}")
 
+    def test_rilevamento_batch_sovrapposizione_e_adiacenza(self, coord):
+        """
+        Una massiva su più giorni rileva insieme i conflitti di tutti i suoi
+        slot: basta un minuto di sovrapposizione, gli slot adiacenti
+        (fine = inizio) non sono in conflitto.
+        """
+        inizio = date.today() + timedelta(days=35)
+        giorni = [(inizio + timedelta(days=i)).isoformat() for i in range(3)]
+        sovrapposte = [ok(crea_singola(coord, AULA_ID_B, g, "09:00", "10:01"), "crea sovrapposta")["id"]
+                       for g in giorni]
+        adiacenti = [ok(crea_singola(coord, AULA_ID_B, g, "11:00", "12:00"), "crea adiacente")["id"]
+                     for g in giorni]
+
+        massiva = ok(crea_massiva(coord, AULA_ID_B, giorni[0], giorni[-1], "10:00", "11:00",
+                                  tipo="giornaliera", giorni=list(range(1, 8))), "crea massiva")
+        assert len(massiva["slots"]) == len(giorni)
+        assert sorted(massiva["prenotazioni_in_conflitto"]) == sorted(sovrapposte)
+        assert len(massiva["conflitti_rilevati"]) == len(giorni)
+
+        for pid in [massiva["id"], *sovrapposte, *adiacenti]:
+            coord.delete(f"/prenotazioni/{pid}")
+
     def test_risolvi_conflitto_mantieni_1(self, coord):
         r1 = crea_singola(coord, AULA_ID_A, TRA_3, "08:00", "13:00")
         r2 = crea_singola(coord, AULA_ID_A, TRA_3, "10:00", "15:00")
@@ -341,6 +411,56 @@ class TestConflitti:
             coord.delete(f"/prenotazioni/{pid}")
 
 
+# ─── Anteprima ────────────────────────────────────────────────────────────────
+
+def minuti(hhmm: str) -> int:
+    ore, mins = hhmm.split(":")
+    return int(ore) * 60 + int(mins)
+
+
+class TestAnteprima:
+    def test_anteprima_rileva_conflitto_senza_scrivere(self, coord):
+        p1 = ok(crea_singola(coord, AULA_ID_A, TRA_14, "08:00", "10:00"), "crea p1 anteprima")
+        n_conflitti = len(ok(coord.get("/conflitti/?solo_attivi=true"), "conflitti prima"))
+
+        r = coord.post("/prenotazioni/anteprima", json={
+            "aula_id":    AULA_ID_A,
+            "corso_id":   CORSO_ID,
+            "docente_id": DOCENTE_ID,
+            "slot": {"data": TRA_14, "ora_inizio": "09:00", "ora_fine": "11:00"},
+        })
+        esito = ok(r, "anteprima singola")
+        assert esito["date_totali"] == 1
+        assert esito["date_in_conflitto"] == 1
+        giorno = esito["date"][0]
+        assert giorno["conflitti"][0]["prenotazione_id"] == p1["id"]
+        # Orari liberi nella stessa aula, lunghi almeno quanto la richiesta
+        assert giorno["orari_liberi"]
+        assert all(minuti(f) - minuti(i) >= 120 for i, f in giorno["orari_liberi"])
+
+        # Nessuna scrittura: niente nuovi conflitti
+        assert len(ok(coord.get("/conflitti/?solo_attivi=true"), "conflitti dopo")) == n_conflitti
+        coord.delete(f"/prenotazioni/{p1['id']}")
+
+    def test_anteprima_massiva_senza_conflitti(self, coord):
+        inizio = date.today() + timedelta(days=90)
+        r = coord.post("/prenotazioni/anteprima", json={
+            "aula_id":          AULA_ID_B,
+            "corso_id":         CORSO_ID,
+            "docente_id":       DOCENTE_ID,
+            "data_inizio":      inizio.isoformat(),
+            "data_fine":        (inizio + timedelta(days=6)).isoformat(),
+            "ora_inizio":       "19:00",
+            "ora_fine":         "20:00",
+            "tipo_ricorrenza":  "giornaliera",
+        })
+        esito = ok(r, "anteprima massiva")
+        assert esito["date_totali"] == 7
+        assert [d["data"] for d in esito["date"]] == [
+            (inizio + timedelta(days=n)).isoformat() for n in range(7)
+        ]
+
+
 # ─── Filtri API ───────────────────────────────────────────────────────────────
 
 class TestFiltri:
@@ -363,6 +483,47 @@ class TestFiltri:
         assert r.status_code == 404
 
 
+# ─── Riepilogo occupazione ────────────────────────────────────────────────────
+
+def minuti_aula(client, aula_id, data):
+    r = client.get("/statistiche/saturazione", params={
+        "data_dal": data, "data_al": data, "gruppo": "aula", "aula_id": aula_id,
+    })
+    righe = ok(r, "saturazione aula")["righe"]
+    return righe[0]["minuti_prenotati"] if righe else 0
+
+
+class TestOccupazione:
+    def test_riepilogo_segue_creazione_modifica_eliminazione(self, coord):
+        prima = minuti_aula(coord, AULA_ID_B, TRA_14)
+
+        data = ok(crea_singola(coord, AULA_ID_B, TRA_14, "14:00", "16:00"), "crea per riepilogo")
+        assert minuti_aula(coord, AULA_ID_B, TRA_14) == prima + 120
+
+        slot_id = data["slots"][0]["id"]
+        ok(coord.patch(f"/prenotazioni/{data['id']}/slots/{slot_id}",
+                       json={"ora_fine": "15:00"}), "modifica per riepilogo")
+        assert minuti_aula(coord, AULA_ID_B, TRA_14) == prima + 60
+
+        coord.delete(f"/prenotazioni/{data['id']}")
+        assert minuti_aula(coord, AULA_ID_B, TRA_14) == prima
+
+    def test_riepilogo_con_creazioni_concorrenti(self, coord):
+        """Prenotazioni create in parallelo sulla stessa aula e giorno: nessun errore, riepilogo esatto."""
+        giorno = (date.today() + timedelta(days=40)).isoformat()
+        prima = minuti_aula(coord, AULA_ID_B, giorno)
+        orari = [(f"{h:02d}:00", f"{h + 1:02d}:00") for h in range(8, 14)]
+
+        with ThreadPoolExecutor(max_workers=len(orari)) as pool:
+            risposte = list(pool.map(lambda o: crea_singola(coord, AULA_ID_B, giorno, *o), orari))
+        create = [ok(r, "crea concorrente") for r in risposte]
+        assert minuti_aula(coord, AULA_ID_B, giorno) == prima + 60 * len(orari)
+
+        for p in create:
+            coord.delete(f"/prenotazioni/{p['id']}")
+        assert minuti_aula(coord, AULA_ID_B, giorno) == prima
+
+
 # ─── Permessi OPERATIVO ───────────────────────────────────────────────────────
 
 class TestPermessi: